@@ -0,0 +1,100 @@
+import os
+import random
+import string
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI
+
+"""
+Per-message send() versus send_many() bundling for a game tick of small messages.
+
+Sends TICKS ticks of MSGS_PER_TICK messages of 50-100 bytes (the sizes sender.py generates, 3 in 4 reliable)
+and counts sendto calls, bytes put on the wire and the time spent in the send calls, then waits until the
+receiver has every reliable message. The receiver reads while the ticks are sent, like a game loop would: a
+receiver that does not read closes its receive window after recv_window messages and the sender is throttled to
+one window probe at a time.
+
+Usage: python benchmarks/bundling.py [ticks] [msgs_per_tick]
+"""
+
+
+class CountingSocket:
+    def __init__(self, sock):
+        self.sock = sock
+        self.datagrams = 0
+        self.bytes = 0
+
+    def sendto(self, data, addr):
+        self.datagrams += 1
+        self.bytes += len(data)
+        return self.sock.sendto(data, addr)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def gen_tick(rng: random.Random, n: int):
+    chars = string.ascii_letters + string.digits
+    return [("".join(rng.choice(chars) for _ in range(rng.randint(50, 100))).encode(), rng.random() < 0.75)
+            for _ in range(n)]
+
+
+def run(mode: str, ticks: int, per_tick: int, port: int):
+    rng = random.Random(3103)
+    workload = [gen_tick(rng, per_tick) for _ in range(ticks)]
+    reliable = sum(r for tick in workload for _, r in tick)
+
+    tx = GameNetAPI(("127.0.0.1", port), ("127.0.0.1", port + 1), retransmission_timeout_ms=100, gap_skip_timeout_ms=400)
+    rx = GameNetAPI(("127.0.0.1", port + 1), ("127.0.0.1", port), retransmission_timeout_ms=100, gap_skip_timeout_ms=400)
+    tx.sock = CountingSocket(tx.sock)
+    tx.start()
+    rx.start()
+
+    got = [0]
+
+    def receiver():
+        while got[0] < reliable:
+            msgs = rx.recv(timeout_ms=500)
+            if not msgs and not tx.running:
+                break
+            got[0] += sum(1 for m in msgs if m[0] == 0)
+
+    reader = threading.Thread(target=receiver, daemon=True)
+    reader.start()
+
+    send_time = 0.0
+    for tick in workload:
+        t0 = time.perf_counter()
+        if mode == "send":
+            for payload, is_reliable in tick:
+                tx.send(payload, is_reliable)
+        else:
+            tx.send_many(tick)
+        send_time += time.perf_counter() - t0
+        time.sleep(0.002)
+
+    reader.join(5.0)
+    result = (tx.sock.datagrams, tx.sock.bytes, send_time, got[0], reliable)
+    for api in (tx, rx):
+        api.running = False
+        with api.retx_cv:
+            api.retx_cv.notify_all()
+        api.sock.close()
+    return result
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per_tick = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(f"{'mode':<10} {'datagrams':>10} {'wire bytes':>11} {'send ms':>9} {'reliable delivered':>19}")
+    for port, mode in ((9300, "send"), (9302, "send_many")):
+        datagrams, wire, send_time, got, reliable = run(mode, ticks, per_tick, port)
+        print(f"{mode:<10} {datagrams:>10} {wire:>11} {send_time * 1000:>9.1f} {got:>12}/{reliable}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import multiprocessing
+import os
+import statistics
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gamenet_api
+import gamenet_codec
+import gamenet_stream
+from gamenet_api import GameNetAPI
+from gamenet_codec import CLOCK_EPOCH_S, TS_MASK, ts_diff
+from gamenet_netem import Link, NetworkEmulator
+
+"""
+Clock offset estimation: one-way latency measured across two clocks that disagree, raw against corrected.
+
+A sends to B through the in-process network emulator, DELAY_MS +- JITTER_MS one way in both directions. B runs in
+a child process whose clock is off from A's and runs fast by one of SKEWS (every module's now_ms replaced), as
+another host's would be; "wrap" starts B's 32-bit clock 5 s before it wraps. Every TICK_S A sends one reliable
+and one unreliable message stamped with time.perf_counter() (CLOCK_MONOTONIC, shared by both processes), which
+gives the true one-way latency of every message. Modes:
+  probe : B only receives, so nothing of B's is ACKed and B estimates A's clock from clock probes
+  ack   : B also sends a reliable message every tick, and estimates from the ACKs of those
+Reported: the true offset of B's clock at the end, the error of A's estimate (B - A, from A's ACKs) and of B's
+(A - B), the true drift and B's estimate of it, then what B measured: raw latency (receive timestamp minus send
+timestamp, the two clocks' difference in it) p50, corrected latency (what recv() and the stats report) p50, its
+error against the true latency p50 and p99 (absolute), and reli_jitter. Times in ms.
+
+Usage: python benchmarks/clock.py [--seconds S]
+"""
+
+PORT = 10040
+DELAY_MS = 20
+JITTER_MS = 5
+TICK_S = 0.01
+STAMP = struct.Struct("!d")
+SKEWS = (("+250 ms", 250, 0), ("-3 s +200 ppm", -3000, 200), ("wrap +100 ppm", None, 100))
+MODES = ("probe", "ack")
+
+
+def skewed_clock(offset_ms, ppm: float):
+    # B's now_ms: A's clock off by offset_ms (None: 5 s before the 32-bit wrap) and running ppm fast
+    start = (time.monotonic() + CLOCK_EPOCH_S) * 1000
+    if offset_ms is None:
+        offset_ms = TS_MASK + 1 - (int(start) & TS_MASK) - 5000
+
+    def now_ms() -> int:
+        real = (time.monotonic() + CLOCK_EPOCH_S) * 1000
+        return int(real + offset_ms + (real - start) * ppm / 1e6) & TS_MASK
+
+    def true_offset() -> float:
+        real = (time.monotonic() + CLOCK_EPOCH_S) * 1000
+        return offset_ms + (real - start) * ppm / 1e6
+
+    return now_ms, true_offset
+
+
+def peer(conn, offset_ms, ppm: float, mode: str, seconds: float, port: int):
+    # child process: B, on its own clock
+    now_ms, true_offset = skewed_clock(offset_ms, ppm)
+    for module in (gamenet_codec, gamenet_api, gamenet_stream):
+        module.now_ms = now_ms
+    emulator = NetworkEmulator()
+    emulator.start()
+    b = GameNetAPI(("127.0.0.1", port + 1), ("127.0.0.1", port), gap_skip_timeout_ms=5000)
+    b.print_metrics = lambda report: None
+    b.sock = emulator.wrap(b.sock, Link(delay_ms=DELAY_MS, jitter_ms=JITTER_MS, seed=port + 1))
+    b.start()
+    conn.send("ready")
+    raw, corrected, error = [], [], []
+    deadline = time.monotonic() + seconds + 1
+    next_tick = time.monotonic()
+    while time.monotonic() < deadline:
+        for ch, _, ts, payload, recv_ts, latency, *_ in b.recv(timeout_ms=5):
+            sent_at, = STAMP.unpack_from(payload)
+            true = (time.perf_counter() - sent_at) * 1000
+            raw.append(ts_diff(recv_ts, ts))
+            corrected.append(latency)
+            error.append(abs(latency - true))
+        if mode == "ack" and time.monotonic() >= next_tick:
+            b.send(b"b" * 32)
+            next_tick += TICK_S
+    metrics = b.get_metrics()
+    b.running = False
+    with b.retx_cv:
+        b.retx_cv.notify_all()
+    b.writer.close()
+    b.sock.close()
+    emulator.close()
+    error.sort()
+    conn.send({
+        "true_offset": true_offset(),
+        "offset": metrics["clock_offset_ms"],
+        "drift": metrics["clock_drift_ppm"],
+        "raw": statistics.median(raw),
+        "corrected": statistics.median(corrected),
+        "error_p50": error[len(error) // 2],
+        "error_p99": error[int(len(error) * 0.99)],
+        "jitter": metrics["reli_jitter_ms"],
+    })
+
+
+def run(offset_ms, ppm: float, mode: str, seconds: float, port: int) -> dict:
+    ctx = multiprocessing.get_context("fork")
+    conn, child_conn = ctx.Pipe()
+    child = ctx.Process(target=peer, args=(child_conn, offset_ms, ppm, mode, seconds, port))
+    child.start()
+    conn.recv()
+    emulator = NetworkEmulator()
+    emulator.start()
+    a = GameNetAPI(("127.0.0.1", port), ("127.0.0.1", port + 1), gap_skip_timeout_ms=5000)
+    a.print_metrics = lambda report: None
+    a.sock = emulator.wrap(a.sock, Link(delay_ms=DELAY_MS, jitter_ms=JITTER_MS, seed=port))
+    a.start()
+    pad = bytes(32 - STAMP.size)
+    next_tick = time.monotonic()
+    end = next_tick + seconds
+    while time.monotonic() < end:
+        a.send(STAMP.pack(time.perf_counter()) + pad)
+        a.send(STAMP.pack(time.perf_counter()) + pad, reliable=False)
+        a.recv(timeout_ms=0)
+        next_tick += TICK_S
+        pause = next_tick - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+    metrics = a.get_metrics()
+    r = conn.recv()
+    child.join()
+    a.running = False
+    with a.retx_cv:
+        a.retx_cv.notify_all()
+    a.writer.close()
+    a.sock.close()
+    emulator.close()
+    r["a_offset"] = metrics["clock_offset_ms"]
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description="one-way latency across skewed clocks, raw vs corrected")
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.seconds:.0f} s per run, one reliable + one unreliable message per {TICK_S * 1000:.0f} ms, "
+          f"{DELAY_MS} +- {JITTER_MS} ms one way; times in ms")
+    print(f"{'B clock':<14} {'mode':<5} {'offset':>11} {'A err':>6} {'B err':>6} {'ppm':>4} {'B ppm':>6} "
+          f"{'raw p50':>12} {'corr p50':>8} {'err p50':>7} {'err p99':>7} {'jitter':>6}")
+    port = PORT
+    for name, offset_ms, ppm in SKEWS:
+        for mode in MODES:
+            r = run(offset_ms, ppm, mode, args.seconds, port)
+            port += 2
+            # on the 32-bit clock an offset is only known modulo the wrap
+            true = (r["true_offset"] + 2 ** 31) % 2 ** 32 - 2 ** 31
+            # A estimates B - A, B estimates A - B
+            a_err = r["a_offset"] - true if r["a_offset"] is not None else float("nan")
+            b_err = -r["offset"] - true if r["offset"] is not None else float("nan")
+            print(f"{name:<14} {mode:<5} {true:>11.1f} {a_err:>6.2f} {b_err:>6.2f} {ppm:>4} {-r['drift']:>6.0f} "
+                  f"{r['raw']:>12.0f} {r['corrected']:>8.1f} {r['error_p50']:>7.2f} {r['error_p99']:>7.2f} "
+                  f"{r['jitter']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import timeit
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_codec import CH_RELIABLE, HEADER_SIZE, build_packet, restamp, parse_packet, now_ms
+
+"""
+Encode/decode micro-benchmarks for the packet codec, 16 B to 1400 B payloads.
+
+  legacy encode : the old _build_packet (to_bytes per field, four concatenations)
+  encode        : gamenet_codec.build_packet
+  retx legacy   : what a retransmission used to cost, a full re-encode
+  retx restamp  : patching timestamp + CRC of the cached frame
+  legacy decode : the old _parse_packet (slices + concatenation for the CRC)
+  decode        : gamenet_codec.parse_packet on bytes, and on a memoryview (rx path)
+
+Usage: python benchmarks/codec.py [iterations]
+"""
+
+SIZES = [16, 64, 256, 512, 1024, 1400]
+
+
+def legacy_build(chan: int, seq: int, payload: bytes) -> bytes:
+    timestamp = now_ms()
+    head_without_crc = chan.to_bytes(1, "big") + seq.to_bytes(2, "big") + timestamp.to_bytes(4, "big")
+    crc = zlib.crc32(head_without_crc + payload) & 0xFFFFFFFF
+    header = head_without_crc + crc.to_bytes(4, "big")
+    return header + payload
+
+
+def legacy_parse(data: bytes):
+    if len(data) < HEADER_SIZE:
+        raise ValueError("packet is too small (packet size < header size)")
+    ch = int.from_bytes(data[0:1], "big")
+    seq = int.from_bytes(data[1:3], "big")
+    timestamp = int.from_bytes(data[3:7], "big")
+    crc = int.from_bytes(data[7:11], "big")
+    payload = data[11:]
+    if zlib.crc32(data[0:7] + payload) & 0xFFFFFFFF != crc:
+        raise ValueError("bad crc")
+    return ch, seq, timestamp, payload
+
+
+def ns_per_op(fn, iterations: int) -> float:
+    return min(timeit.repeat(fn, number=iterations, repeat=3)) / iterations * 1e9
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    cols = ["legacy encode", "encode", "retx legacy", "retx restamp", "legacy decode", "decode", "decode view"]
+    print(f"{'payload':>8} " + " ".join(f"{c:>14}" for c in cols) + "   (ns/op)")
+    for size in SIZES:
+        payload = os.urandom(size)
+        frame = build_packet(CH_RELIABLE, 1234, payload)
+        wire = bytes(frame)
+        view = memoryview(bytearray(wire))
+        results = [
+            ns_per_op(lambda: legacy_build(CH_RELIABLE, 1234, payload), iterations),
+            ns_per_op(lambda: build_packet(CH_RELIABLE, 1234, payload), iterations),
+            ns_per_op(lambda: legacy_build(CH_RELIABLE, 1234, payload), iterations),
+            ns_per_op(lambda: restamp(frame, now_ms(), payload), iterations),
+            ns_per_op(lambda: legacy_parse(wire), iterations),
+            ns_per_op(lambda: parse_packet(wire), iterations),
+            ns_per_op(lambda: parse_packet(view), iterations),
+        ]
+        assert parse_packet(bytes(frame))[3] == payload
+        print(f"{size:>8} " + " ".join(f"{r:>14.0f}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
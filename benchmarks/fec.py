@@ -0,0 +1,146 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE, CH_UNRELIABLE, CH_FEC, RELIABLE_CHANNELS
+from gamenet_metrics import Histogram
+from gamenet_netem import Link, NetworkEmulator
+
+"""
+Forward error correction: latency and delivery of a lossy link with and without parity, against the bandwidth
+the parity costs.
+
+A GameNetAPI pair talks through the in-process network emulator, DELAY_MS one way and --loss in both directions
+(ACKs and parity are lost too). Every TICK_S the sender sends one reliable and one unreliable message of
+PAYLOAD_BYTES. Variants:
+  no fec      : what the protocol did so far, a reliable loss costs a retransmission timeout
+  fec k=4     : a parity packet after every 4 messages of each channel, fixed (fec_adaptive=False)
+  fec k<=8    : up to 8 per parity, adaptive: the group shrinks while losses still need retransmissions
+Reported: reliable latency (send() to recv(), same process clock) p50/p99/max, unreliable PDR and latency p50,
+reliable retransmissions, messages the receiver rebuilt from parity, and the sender's wire bytes (headers
+included) relative to no fec. The receiver's gap skip is long enough that every reliable message arrives.
+
+Usage: python benchmarks/fec.py [--loss P [P ...]] [--ticks N]
+"""
+
+PORT = 10000
+DELAY_MS = 20
+TICK_S = 0.005
+PAYLOAD_BYTES = 64
+STAMP = struct.Struct("!d")
+VARIANTS = (
+    ("no fec", None, False),
+    ("fec k=4", {CH_RELIABLE: 4, CH_UNRELIABLE: 4}, False),
+    ("fec k<=8", {CH_RELIABLE: 8, CH_UNRELIABLE: 8}, True),
+)
+
+
+class CountingLink(Link):
+    # counts what the sender puts on the wire, and the reliable datagrams that repeat a seq (retransmissions)
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.bytes = 0
+        self.parity = 0
+        self.retx = 0
+        self.seen = set()
+
+    def plan(self, data: bytes, now: float):
+        self.bytes += len(data)
+        if data[0] == CH_FEC:
+            self.parity += 1
+        elif data[0] in RELIABLE_CHANNELS:
+            seq = int.from_bytes(data[1:3], "big")
+            if seq in self.seen:
+                self.retx += 1
+            self.seen.add(seq)
+        return super().plan(data, now)
+
+
+def run(fec, adaptive: bool, loss: float, ticks: int, port: int) -> dict:
+    emulator = NetworkEmulator()
+    emulator.start()
+    a_addr = ("127.0.0.1", port)
+    b_addr = ("127.0.0.1", port + 1)
+    tx = GameNetAPI(a_addr, b_addr, fec=fec, fec_adaptive=adaptive)
+    rx = GameNetAPI(b_addr, a_addr, gap_skip_timeout_ms=5000)
+    rx.print_metrics = lambda report: None
+    link = CountingLink(loss=loss, delay_ms=DELAY_MS, seed=port)
+    tx.sock = emulator.wrap(tx.sock, link)
+    rx.sock = emulator.wrap(rx.sock, Link(loss=loss, delay_ms=DELAY_MS, seed=port + 1))
+    tx.start()
+    rx.start()
+    latency = {CH_RELIABLE: Histogram(), CH_UNRELIABLE: Histogram()}
+
+    def receiver():
+        while rx.running:
+            for ch, _, _, payload, *_ in rx.recv(timeout_ms=50):
+                sent_at, = STAMP.unpack_from(payload)
+                latency[ch].record(int((time.perf_counter() - sent_at) * 1e6))
+
+    reader = threading.Thread(target=receiver, daemon=True)
+    reader.start()
+    pad = bytes(PAYLOAD_BYTES - STAMP.size)
+    next_tick = time.monotonic()
+    for _ in range(ticks):
+        tx.send(STAMP.pack(time.perf_counter()) + pad)
+        tx.send(STAMP.pack(time.perf_counter()) + pad, reliable=False)
+        next_tick += TICK_S
+        pause = next_tick - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+    deadline = time.monotonic() + 5
+    while latency[CH_RELIABLE].total < ticks and time.monotonic() < deadline:
+        time.sleep(0.05)
+    tx_metrics = tx.get_metrics()
+    rx_metrics = rx.get_metrics()
+    tx.running = False
+    rx.running = False
+    with tx.retx_cv:
+        tx.retx_cv.notify_all()
+    reader.join()
+    for api in (tx, rx):
+        if api.writer is not None:
+            api.writer.close()
+        api.sock.close()
+    emulator.close()
+    return {
+        "reliable": latency[CH_RELIABLE].percentiles(scale=1000),
+        "unreliable": latency[CH_UNRELIABLE].percentiles(scale=1000),
+        "bytes": link.bytes,
+        "retx": link.retx,
+        "parity": link.parity,
+        "recovered": rx_metrics["fec_recovered"],
+        "group": tx_metrics["fec_group_reliable"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="latency, delivery and overhead of FEC on a lossy link")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.05, 0.15], help="loss rate, both directions")
+    parser.add_argument("--ticks", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{args.ticks} reliable + {args.ticks} unreliable messages of {PAYLOAD_BYTES} B, one each per "
+          f"{TICK_S * 1000:.0f} ms, {DELAY_MS} ms one way; latency in ms")
+    print(f"{'loss':>5} {'variant':<9} {'R p50':>6} {'R p99':>7} {'R max':>7} {'U PDR':>6} {'U p50':>6} "
+          f"{'retx':>5} {'rebuilt':>7} {'k end':>5} {'wire':>6}")
+    port = PORT
+    for loss in args.loss:
+        base_bytes = None
+        for name, fec, adaptive in VARIANTS:
+            r = run(fec, adaptive, loss, args.ticks, port)
+            port += 2
+            base_bytes = base_bytes or r["bytes"]
+            rel, unrel = r["reliable"], r["unreliable"]
+            print(f"{loss:>5.0%} {name:<9} {rel['p50']:>6.1f} {rel['p99']:>7.1f} {rel['max']:>7.1f} "
+                  f"{unrel['count'] / args.ticks:>6.1%} {unrel['p50']:>6.1f} {r['retx']:>5} {r['recovered']:>7} "
+                  f"{r['group'] or '-':>5} {r['bytes'] / base_bytes:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE, HEADER_SIZE
+from gamenet_netem import Link, NetworkEmulator
+
+"""
+Delivery time of large reliable messages, fragmented (fragment=True, the default) against the previous behavior of
+sending every message as one datagram (fragment=False).
+
+A GameNetAPI pair talks through the in-process network emulator: BANDWIDTH_BPS bottleneck, DELAY_MS one way, and
+--loss applied per IP packet in both directions. A datagram larger than one IP packet is fragmented by IP and
+lost if any of its IP_PAYLOAD sized pieces is (IpLink), which is what the one-datagram path pays on a real
+network. Per size, --messages messages go out one at a time; each is timed from send() until the receiver's
+recv() returns it, up to TIMEOUT_S (the first message that misses it ends the row, the rest count as lost).
+datagrams: reliable datagrams sent, one per fragment, retransmissions not counted.
+
+A UDP datagram carries at most UDP_MAX_PAYLOAD bytes, so unfragmented the protocol cannot send any message of
+64 KiB or more: sendto() fails with EMSGSIZE and the message never arrives. Those rows say so instead of running;
+the 60 KiB row is the largest size both variants can send.
+
+Usage: python benchmarks/fragmentation.py [--loss P [P ...]] [--messages N]
+"""
+
+PORT = 9980
+DELAY_MS = 10
+BANDWIDTH_BPS = 100e6
+QUEUE_MS = 2000
+IP_PAYLOAD = 1480  # 1500 byte Ethernet MTU less the IPv4 header
+UDP_HEADER = 8
+UDP_MAX_PAYLOAD = 65507
+TIMEOUT_S = 10.0
+SIZES = (60 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024)
+
+
+class IpLink(Link):
+    # loss applies per IP packet: a datagram spanning several of them is lost with any one
+    def plan(self, data: bytes, now: float):
+        pieces = -(-(len(data) + UDP_HEADER) // IP_PAYLOAD)
+        if pieces > 1 and self.rng.random() >= (1 - self.loss) ** (pieces - 1):
+            self.sent += 1
+            self.lost += 1
+            return []
+        return super().plan(data, now)
+
+
+def link(loss: float, seed: int) -> IpLink:
+    return IpLink(loss=loss, delay_ms=DELAY_MS, bandwidth_bps=BANDWIDTH_BPS, queue_ms=QUEUE_MS, seed=seed)
+
+
+def run(size: int, fragment: bool, loss: float, messages: int, port: int) -> dict:
+    emulator = NetworkEmulator()
+    emulator.start()
+    a_addr = ("127.0.0.1", port)
+    b_addr = ("127.0.0.1", port + 1)
+    a = GameNetAPI(a_addr, b_addr, fragment=fragment, max_rto_ms=500)
+    # one message at a time, nothing is ever worth skipping
+    b = GameNetAPI(b_addr, a_addr, gap_skip_timeout_ms=int(TIMEOUT_S * 2000))
+    b.print_metrics = lambda report: None
+    a.sock = emulator.wrap(a.sock, link(loss, port))
+    b.sock = emulator.wrap(b.sock, link(loss, port + 1))
+    a.start()
+    b.start()
+    arrived = {}
+    cv = threading.Condition()
+
+    def receiver():
+        while b.running:
+            for ch, seq, _, payload, *_ in b.recv(timeout_ms=50):
+                if ch == CH_RELIABLE:
+                    with cv:
+                        arrived[seq] = (time.perf_counter(), len(payload))
+                        cv.notify()
+
+    rx = threading.Thread(target=receiver, daemon=True)
+    rx.start()
+    times = []
+    for _ in range(messages):
+        payload = os.urandom(size)
+        t0 = time.perf_counter()
+        seq = a.send(payload)
+        with cv:
+            cv.wait_for(lambda: seq in arrived, TIMEOUT_S)
+            got = arrived.get(seq)
+        if got is None or got[1] != size:
+            # a message still in flight would hold up the next one: the rest of the row counts as lost
+            break
+        times.append((got[0] - t0) * 1000)
+    metrics = a.get_metrics()
+    a.running = False
+    b.running = False
+    with a.retx_cv:
+        a.retx_cv.notify_all()
+    rx.join()
+    for api in (a, b):
+        if api.writer is not None:
+            api.writer.close()
+        api.sock.close()
+    emulator.close()
+    times.sort()
+    return {"times": times, "sent": metrics["reli_packets_send"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="large message delivery time, fragmented vs one datagram")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.01, 0.15], help="loss per IP packet")
+    parser.add_argument("--messages", type=int, default=5, help="messages per size and variant")
+    args = parser.parse_args()
+
+    print(f"{BANDWIDTH_BPS / 1e6:.0f} Mbit/s, {DELAY_MS} ms one way, {args.messages} messages per row, "
+          f"timeout {TIMEOUT_S:.0f} s; times in ms from send() to recv()")
+    print(f"{'loss':>5} {'size':>9} {'variant':<10} {'mean':>8} {'p50':>8} {'max':>8} {'lost':>5} {'datagrams':>10}")
+    port = PORT
+    for loss in args.loss:
+        for size in SIZES:
+            for name, fragment in (("one dgram", False), ("fragments", True)):
+                label = f"{loss:>5.0%} {size // 1024:>6} KiB {name:<10}"
+                if not fragment and HEADER_SIZE + size > UDP_MAX_PAYLOAD:
+                    print(f"{label} exceeds the UDP datagram limit, cannot be sent")
+                    continue
+                r = run(size, fragment, loss, args.messages, port)
+                port += 2
+                t = r["times"]
+                if t:
+                    print(f"{label} {sum(t) / len(t):>8.1f} {t[len(t) // 2]:>8.1f} {t[-1]:>8.1f} "
+                          f"{args.messages - len(t):>5} {r['sent']:>10}")
+                else:
+                    print(f"{label} {'-':>8} {'-':>8} {'-':>8} {args.messages:>5} {r['sent']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE
+from gamenet_codec import U16
+
+"""
+Worst-case delivery delay when a reliable packet is lost and the sender then goes quiet.
+
+The sender puts [messages] reliable messages on the wire, every transmission of seq LOST (first send and all
+retransmissions) is dropped, and nothing else is sent afterwards. Everything behind the hole can only reach the
+app through the gap skip. Reports how long the held-back messages took from send() to recv() for a few
+gap_skip_timeout_ms values. "arrival" is the old behaviour, where the skip was only checked when another
+reliable packet arrived: with a quiet sender the messages never come out.
+
+Exits non-zero unless the timer driven skip delivers every held-back message within gap_skip_timeout_ms +
+SLACK_MS of its send().
+
+Usage: python benchmarks/gap_skip.py [messages]
+"""
+
+LOST = 3
+QUIET_S = 2.0
+SLACK_MS = 50  # scheduling and loopback delay on top of the gap timeout
+
+
+class DropSeqSocket:
+    # drops every reliable datagram carrying seq LOST
+    def __init__(self, sock):
+        self.sock = sock
+
+    def sendto(self, data, addr):
+        if data[0] == CH_RELIABLE and U16.unpack_from(data, 1)[0] == LOST:
+            return len(data)
+        return self.sock.sendto(data, addr)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+class ArrivalGapGameNetAPI(GameNetAPI):
+    # the skip is only checked when a reliable packet arrives, never from the rx loop's timer
+    def _skip_gap(self):
+        pass
+
+    def _handle_reliable_rx(self, seq: int, ts_ms: int, payload: bytes, latency: int, arrival_ms: int,
+                            ch: int = CH_RELIABLE) -> bool:
+        accepted = super()._handle_reliable_rx(seq, ts_ms, payload, latency, arrival_ms, ch)
+        GameNetAPI._skip_gap(self)
+        return accepted
+
+
+def run(cls, gap_ms: int, messages: int, port: int):
+    tx = GameNetAPI(("127.0.0.1", port), ("127.0.0.1", port + 1), gap_skip_timeout_ms=gap_ms)
+    rx = cls(("127.0.0.1", port + 1), ("127.0.0.1", port), gap_skip_timeout_ms=gap_ms)
+    tx.sock = DropSeqSocket(tx.sock)
+    tx.start()
+    rx.start()
+
+    sent_at = {}
+    for i in range(messages):
+        sent_at[tx.send(b"m" * 32)] = time.perf_counter()
+
+    delays = []
+    deadline = time.monotonic() + QUIET_S
+    while len(delays) < messages - 1 - LOST and time.monotonic() < deadline:
+        for msg in rx.recv(timeout_ms=50):
+            if msg[0] == CH_RELIABLE and msg[1] > LOST:
+                delays.append((time.perf_counter() - sent_at[msg[1]]) * 1000)
+
+    for api in (tx, rx):
+        api.running = False
+        with api.retx_cv:
+            api.retx_cv.notify_all()
+        api.sock.close()
+    return delays
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    held_back = messages - 1 - LOST
+    print(f"{'skip':<8} {'gap_skip ms':>11} {'delivered':>10} {'worst ms':>9} {'median ms':>10}")
+    port = 9700
+    failed = False
+    for gap_ms in (100, 200, 400):
+        for name, cls in (("arrival", ArrivalGapGameNetAPI), ("timer", GameNetAPI)):
+            delays = sorted(run(cls, gap_ms, messages, port))
+            port += 2
+            worst = f"{delays[-1]:.1f}" if len(delays) == held_back else f">{QUIET_S * 1000:.0f}"
+            median = f"{delays[len(delays) // 2]:.1f}" if delays else "-"
+            print(f"{name:<8} {gap_ms:>11} {len(delays):>6}/{held_back:<3} {worst:>9} {median:>10}")
+            if cls is GameNetAPI and (len(delays) < held_back or delays[-1] > gap_ms + SLACK_MS):
+                failed = True
+    if failed:
+        print(f"FAIL: timer skip did not deliver every held-back message within gap_skip_timeout_ms + {SLACK_MS} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
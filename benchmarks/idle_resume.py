@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE
+from gamenet_server import GameNetServer, SWEEP_INTERVAL_S
+
+"""
+Regression check: a client that goes quiet long enough for the server to expire its session, then sends again.
+
+The client sends [messages] reliable messages (more than recv_window, so its seq is past the window of a stream
+starting at 0), waits until the idle sweep has dropped its session, sends one more and close()s. The server must
+deliver the late message and ACK it, or close() never returns.
+
+Exits non-zero if the late message is not delivered or close() does not finish within CLOSE_TIMEOUT_S.
+
+Usage: python benchmarks/idle_resume.py [messages]
+"""
+
+IDLE_TIMEOUT_S = 1.0
+CLOSE_TIMEOUT_S = 5.0
+PORT = 9800
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 1100
+    server = GameNetServer(("127.0.0.1", PORT), idle_timeout_s=IDLE_TIMEOUT_S)
+    client = GameNetAPI(("127.0.0.1", PORT + 1), ("127.0.0.1", PORT))
+    client.print_metrics = lambda report: None
+    server.start()
+    client.start()
+
+    received = []
+    done = threading.Event()
+
+    def receiver():
+        while not done.is_set():
+            for addr, ch, seq, ts, payload, _ in server.recv(timeout_ms=50):
+                if ch == CH_RELIABLE:
+                    received.append(payload)
+
+    rx = threading.Thread(target=receiver, daemon=True)
+    rx.start()
+
+    for i in range(messages):
+        client.send(b"m%d" % i)
+    deadline = time.monotonic() + CLOSE_TIMEOUT_S
+    while len(received) < messages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    first = len(received)
+
+    time.sleep(IDLE_TIMEOUT_S + SWEEP_INTERVAL_S + 0.5)
+    expired = server.get_metrics()["sessions_closed"]
+    client.send(b"late")
+
+    closer = threading.Thread(target=client.close, daemon=True)
+    t0 = time.monotonic()
+    closer.start()
+    closer.join(CLOSE_TIMEOUT_S)
+    close_s = time.monotonic() - t0
+    time.sleep(0.1)
+    done.set()
+    rx.join()
+    server.close()
+
+    late = b"late" in received
+    print(f"delivered before idle  {first}/{messages}")
+    print(f"sessions expired       {expired}")
+    print(f"late message delivered {late}")
+    print(f"close()                {'hung' if closer.is_alive() else f'{close_s * 1000:.0f} ms'}")
+    if first < messages or not expired or not late or closer.is_alive():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import platform
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE, CH_UNRELIABLE
+from gamenet_metrics import Histogram
+from gamenet_netem import Link, NetworkEmulator
+
+"""
+Scenario suite: GameNetAPI pairs over the in-process network emulator (gamenet_netem.py).
+
+Every scenario connects a fresh sender/receiver pair through two emulated links (data and ACK direction) and
+streams game-like traffic: RATE messages per second in TICK_S ticks, a RELIABLE_SHARE of them reliable, each
+PAYLOAD bytes carrying its index and send time (monotonic ns, so latency is measured in microseconds from send()
+to recv()). After the run the sender close()s, which waits until every reliable message is ACKed.
+
+Per scenario and channel: messages sent and delivered, PDR, goodput and p50/p90/p99/p99.9/max latency; plus
+how long the send phase took (longer than --seconds when send() blocked on the window) and the final drain,
+and the link counters. Results go to stdout and, with --out, to a JSON file tagged with the git commit.
+--compare BASE.json prints the same run next to a stored one.
+
+Usage: python benchmarks/netem_suite.py [--seconds S] [--rate R] [--scenario NAME ...] [--out FILE]
+                                        [--compare FILE]
+"""
+
+TICK_S = 0.01
+RELIABLE_SHARE = 0.5
+PAYLOAD = 64
+PORT = 7400
+DRAIN_S = 0.5
+STAMP = struct.Struct("!IQ")  # message index, send time (monotonic ns)
+
+# name -> link parameters, applied to both directions
+SCENARIOS = {
+    "clean": {},
+    "lan": {"delay_ms": 1, "jitter_ms": 1},
+    "wan": {"delay_ms": 20, "jitter_ms": 5, "loss": 0.01},
+    "lossy": {"delay_ms": 10, "jitter_ms": 5, "loss": 0.1},
+    "reorder": {"delay_ms": 10, "reorder": 0.1, "reorder_ms": 15},
+    "dup_corrupt": {"delay_ms": 5, "duplicate": 0.05, "corrupt": 0.02},
+    "narrow": {"delay_ms": 10, "bandwidth_bps": 1_000_000, "queue_ms": 100},
+}
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def run(index: int, params: dict, seconds: float, rate: float, seed: int) -> dict:
+    emulator = NetworkEmulator()
+    emulator.start()
+    a_addr = ("127.0.0.1", PORT + 2 * index)
+    b_addr = ("127.0.0.1", PORT + 2 * index + 1)
+    a = GameNetAPI(a_addr, b_addr)
+    b = GameNetAPI(b_addr, a_addr)
+    b.print_metrics = lambda report: None  # the suite reports its own numbers
+    forward = Link(seed=seed, **params)
+    backward = Link(seed=seed + 1, **params)
+    a.sock = emulator.wrap(a.sock, forward)
+    b.sock = emulator.wrap(b.sock, backward)
+    a.start()
+    b.start()
+
+    latency = {CH_RELIABLE: Histogram(), CH_UNRELIABLE: Histogram()}
+    seen = {CH_RELIABLE: set(), CH_UNRELIABLE: set()}
+    last_delivery = [0.0]
+
+    def receiver():
+        while b.running:
+            for ch, _, _, payload, *_ in b.recv(timeout_ms=50):
+                now = time.monotonic_ns()
+                idx, sent_ns = STAMP.unpack_from(payload)
+                if idx in seen[ch]:
+                    continue
+                seen[ch].add(idx)
+                latency[ch].record((now - sent_ns) // 1000)
+                last_delivery[0] = now / 1e9
+
+    rx = threading.Thread(target=receiver, daemon=True)
+    rx.start()
+
+    sent = {CH_RELIABLE: 0, CH_UNRELIABLE: 0}
+    filler = bytes(PAYLOAD - STAMP.size)
+    per_tick = rate * TICK_S
+    credit = 0.0
+    idx = 0
+    t0 = time.monotonic()
+    end = t0 + seconds
+    next_tick = t0
+    while next_tick < end:
+        credit += per_tick
+        while credit >= 1:
+            credit -= 1
+            # spread the reliable messages evenly over the stream
+            reliable = int((idx + 1) * RELIABLE_SHARE) > int(idx * RELIABLE_SHARE)
+            a.send(STAMP.pack(idx, time.monotonic_ns()) + filler, reliable=reliable)
+            sent[CH_RELIABLE if reliable else CH_UNRELIABLE] += 1
+            idx += 1
+        next_tick += TICK_S
+        pause = next_tick - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+    send_s = time.monotonic() - t0
+    a.close()
+    close_s = time.monotonic() - t0 - send_s
+    time.sleep(DRAIN_S)
+    b.running = False
+    rx.join()
+    b.sock.close()
+    emulator.close()
+
+    elapsed = max(last_delivery[0] - t0, send_s)
+    result = {
+        "params": params,
+        "send_s": round(send_s, 3),
+        "close_s": round(close_s, 3),
+        "links": {"forward": forward.stats(), "backward": backward.stats()},
+    }
+    for ch, label in ((CH_RELIABLE, "reliable"), (CH_UNRELIABLE, "unreliable")):
+        delivered = len(seen[ch])
+        result[label] = {
+            "sent": sent[ch],
+            "delivered": delivered,
+            "pdr": delivered / sent[ch] if sent[ch] else None,
+            "goodput_msgs_s": delivered / elapsed,
+            "goodput_bytes_s": delivered * PAYLOAD / elapsed,
+            "latency_ms": latency[ch].percentiles(scale=1000),
+        }
+    return result
+
+
+def fmt(v, spec=".2f") -> str:
+    return "-" if v is None else format(v, spec)
+
+
+def print_results(results: dict, base: dict = None):
+    print(f"{'scenario':<12} {'channel':<10} {'pdr%':>7} {'msgs/s':>8} {'p50ms':>7} {'p99ms':>7} {'p99.9ms':>8} "
+          f"{'maxms':>8} {'send_s':>7} {'close_s':>7}" + ("   vs base p99 / pdr" if base else ""))
+    for name, res in results.items():
+        for label in ("reliable", "unreliable"):
+            r = res[label]
+            lat = r["latency_ms"]
+            line = (f"{name:<12} {label:<10} {fmt(r['pdr'] and r['pdr'] * 100):>7} {r['goodput_msgs_s']:>8.0f} "
+                    f"{fmt(lat['p50']):>7} {fmt(lat['p99']):>7} {fmt(lat['p99.9']):>8} {fmt(lat['max']):>8} "
+                    f"{res['send_s']:>7.2f} {res['close_s']:>7.2f}")
+            old = base.get(name, {}).get(label) if base else None
+            if old:
+                line += f"   {fmt(old['latency_ms']['p99'])} / {fmt(old['pdr'] and old['pdr'] * 100)}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GameNetAPI scenario benchmarks over an emulated network")
+    parser.add_argument("--seconds", type=float, default=3.0, help="send phase per scenario")
+    parser.add_argument("--rate", type=float, default=1000.0, help="messages per second")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="run only these")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON file of an earlier run to print next to this one")
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    results = {}
+    for i, name in enumerate(SCENARIOS):
+        if name in names:
+            results[name] = run(i, SCENARIOS[name], args.seconds, args.rate, args.seed)
+
+    base = None
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)["scenarios"]
+    print_results(results, base)
+
+    if args.out:
+        doc = {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "config": {"seconds": args.seconds, "rate": args.rate, "seed": args.seed, "tick_s": TICK_S,
+                       "reliable_share": RELIABLE_SHARE, "payload": PAYLOAD},
+            "scenarios": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
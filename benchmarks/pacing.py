@@ -0,0 +1,143 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE, CH_UNRELIABLE, RELIABLE_CHANNELS
+from gamenet_metrics import Histogram
+from gamenet_netem import Link, NetworkEmulator
+
+"""
+Send pacing: jitter and self-inflicted loss of bursty ticks through a shallow bottleneck, unpaced against paced.
+
+A GameNetAPI pair talks through the in-process network emulator: BANDWIDTH_BPS bottleneck with QUEUE_MS of
+buffer, DELAY_MS one way, no random loss, so every loss is the sender overflowing the bottleneck queue. Every
+TICK_S the sender sends a burst of --reliable reliable messages and --state unreliable state updates of
+PAYLOAD_BYTES each (every update supersedes the previous one), on average well below the bottleneck rate. The
+burst itself does not fit in the queue. Variants:
+  unpaced   : every datagram and retransmission hits the wire at once, as before; the scheduler's priority
+              classes and superseding still apply
+  paced     : pacing_rate_bps=BANDWIDTH_BPS, the configured bottleneck
+  auto      : pacing_rate_bps="auto", estimated from the delivery rate
+Reported: the receiver's reli_jitter/unreli_jitter (ms), reliable latency (send() to recv(), same process clock)
+p50/p99, datagrams the bottleneck queue dropped, reliable retransmissions, state updates delivered, and the
+ones the scheduler dropped as superseded before they were sent.
+
+Usage: python benchmarks/pacing.py [--ticks N] [--reliable N] [--state N]
+"""
+
+PORT = 10020
+DELAY_MS = 20
+BANDWIDTH_BPS = 2e6
+QUEUE_MS = 20
+TICK_S = 0.05
+PAYLOAD_BYTES = 200
+STAMP = struct.Struct("!d")
+VARIANTS = (("unpaced", None), ("paced", BANDWIDTH_BPS), ("auto", "auto"))
+
+
+class CountingLink(Link):
+    # counts reliable datagrams that repeat a seq (retransmissions)
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.retx = 0
+        self.seen = set()
+
+    def plan(self, data: bytes, now: float):
+        if data[0] in RELIABLE_CHANNELS:
+            seq = int.from_bytes(data[1:3], "big")
+            if seq in self.seen:
+                self.retx += 1
+            self.seen.add(seq)
+        return super().plan(data, now)
+
+
+def run(rate, ticks: int, reliable: int, state: int, port: int) -> dict:
+    emulator = NetworkEmulator()
+    emulator.start()
+    a_addr = ("127.0.0.1", port)
+    b_addr = ("127.0.0.1", port + 1)
+    tx = GameNetAPI(a_addr, b_addr, pacing_rate_bps=rate)
+    rx = GameNetAPI(b_addr, a_addr, gap_skip_timeout_ms=5000)
+    rx.print_metrics = lambda report: None
+    link = CountingLink(delay_ms=DELAY_MS, bandwidth_bps=BANDWIDTH_BPS, queue_ms=QUEUE_MS, seed=port)
+    tx.sock = emulator.wrap(tx.sock, link)
+    rx.sock = emulator.wrap(rx.sock, Link(delay_ms=DELAY_MS, seed=port + 1))
+    tx.start()
+    rx.start()
+    latency = {CH_RELIABLE: Histogram(), CH_UNRELIABLE: Histogram()}
+
+    def receiver():
+        while rx.running:
+            for ch, _, _, payload, *_ in rx.recv(timeout_ms=50):
+                sent_at, = STAMP.unpack_from(payload)
+                latency[ch].record(int((time.perf_counter() - sent_at) * 1e6))
+
+    reader = threading.Thread(target=receiver, daemon=True)
+    reader.start()
+    pad = bytes(PAYLOAD_BYTES - STAMP.size)
+    next_tick = time.monotonic()
+    for _ in range(ticks):
+        for _ in range(reliable):
+            tx.send(STAMP.pack(time.perf_counter()) + pad)
+        for _ in range(state):
+            tx.send(STAMP.pack(time.perf_counter()) + pad, reliable=False)
+        next_tick += TICK_S
+        pause = next_tick - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+    deadline = time.monotonic() + 5
+    while latency[CH_RELIABLE].total < ticks * reliable and time.monotonic() < deadline:
+        time.sleep(0.05)
+    tx_metrics = tx.get_metrics()
+    rx_metrics = rx.get_metrics()
+    tx.running = False
+    rx.running = False
+    with tx.retx_cv:
+        tx.retx_cv.notify_all()
+    reader.join()
+    for api in (tx, rx):
+        if api.writer is not None:
+            api.writer.close()
+        api.sock.close()
+    emulator.close()
+    return {
+        "reli_jitter": rx_metrics["reli_jitter_ms"],
+        "unreli_jitter": rx_metrics["unreli_jitter_ms"],
+        "reliable": latency[CH_RELIABLE].percentiles(scale=1000),
+        "state": latency[CH_UNRELIABLE].total,
+        "queue_dropped": link.queue_dropped,
+        "retx": link.retx,
+        "superseded": tx_metrics["send_superseded"],
+        "rate": tx_metrics["pacing_rate_bps"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="jitter and queue loss of bursty ticks, unpaced vs paced")
+    parser.add_argument("--ticks", type=int, default=500)
+    parser.add_argument("--reliable", type=int, default=24, help="reliable messages per tick")
+    parser.add_argument("--state", type=int, default=4, help="unreliable state updates per tick")
+    args = parser.parse_args()
+
+    print(f"{BANDWIDTH_BPS / 1e6:.0f} Mbit/s bottleneck, {QUEUE_MS} ms queue, {DELAY_MS} ms one way; "
+          f"{args.ticks} ticks of {args.reliable} reliable + {args.state} state messages of {PAYLOAD_BYTES} B "
+          f"every {TICK_S * 1000:.0f} ms; times in ms")
+    print(f"{'variant':<8} {'R jitter':>8} {'U jitter':>8} {'R p50':>6} {'R p99':>7} {'q drops':>7} {'retx':>5} "
+          f"{'state':>6} {'superseded':>10} {'rate Mbit/s':>11}")
+    port = PORT
+    for name, rate in VARIANTS:
+        r = run(rate, args.ticks, args.reliable, args.state, port)
+        port += 2
+        rel = r["reliable"]
+        print(f"{name:<8} {r['reli_jitter']:>8.2f} {r['unreli_jitter']:>8.2f} {rel['p50']:>6.1f} {rel['p99']:>7.1f} "
+              f"{r['queue_dropped']:>7} {r['retx']:>5} {r['state']:>6} {r['superseded']:>10} "
+              f"{r['rate'] / 1e6:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
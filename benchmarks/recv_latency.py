@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_UNRELIABLE, now_ms
+
+"""
+Enqueue-to-app delivery latency of GameNetAPI.recv.
+
+A producer thread stands in for the rx worker and hands messages to _deliver_to_app at random
+intervals; the consumer sits in recv() the way a game loop would. Compares the old 5 ms sleep
+polling loop against the condition variable wakeup and reports p50/p99 plus consumer CPU.
+
+Usage: python benchmarks/recv_latency.py [messages]
+"""
+
+
+class PollingGameNetAPI(GameNetAPI):
+    # the pre-condition-variable recv loop
+    def recv(self, timeout_ms: int = 100):
+        end_time = now_ms() + max(0, timeout_ms)
+
+        received_packets = []
+        while now_ms() < end_time:
+            with self.app_recv_q_lock:
+                if self.app_recv_q:
+                    received_packets.append(self._app_msg(self.app_recv_q.popleft()))
+                    break
+            time.sleep(0.005)
+
+        with self.app_recv_q_lock:
+            while self.app_recv_q and len(received_packets) < 64:
+                received_packets.append(self._app_msg(self.app_recv_q.popleft()))
+
+        return received_packets
+
+
+def run(cls, messages: int, port: int):
+    api = cls(("127.0.0.1", port), ("127.0.0.1", port + 1))
+    latencies = []
+    done = threading.Event()
+
+    def produce():
+        rng = random.Random(3103)
+        for seq in range(messages):
+            time.sleep(rng.uniform(0.0005, 0.004))
+            api.rx_meta[CH_UNRELIABLE].put(seq, 0, 0)
+            api._deliver_to_app((CH_UNRELIABLE, seq, 0, time.perf_counter()))
+        done.set()
+
+    producer = threading.Thread(target=produce)
+    cpu0 = time.thread_time()
+    producer.start()
+    while not (done.is_set() and not api.app_recv_q):
+        for msg in api.recv(timeout_ms=50):
+            latencies.append((time.perf_counter() - msg[3]) * 1e6)
+    cpu = time.thread_time() - cpu0
+    producer.join()
+    api.sock.close()
+
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1], cpu
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'recv':<10} {'p50 us':>10} {'p99 us':>10} {'consumer CPU s':>15}")
+    for port, (name, cls) in zip((9200, 9202), (("polling", PollingGameNetAPI), ("condition", GameNetAPI))):
+        p50, p99, cpu = run(cls, messages, port)
+        print(f"{name:<10} {p50:>10.1f} {p99:>10.1f} {cpu:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE, SEQ_MOD, now_ms
+
+"""
+Cost of the reliable receive path under reordering.
+
+Feeds _handle_reliable_rx directly (no sockets) with a stream of seqs where a fraction of packets is held back
+and arrives up to MAX_DISPLACEMENT positions late, then reports ns per packet (best of REPEAT runs). Compares
+the old dict buffer, which pops and delivers one message (and one app queue lock) at a time, with the ring
+reorder window that drains a whole run per pass.
+
+Usage: python benchmarks/reorder.py [packets]
+"""
+
+MAX_DISPLACEMENT = 64
+REPEAT = 3
+
+
+class DictReorderGameNetAPI(GameNetAPI):
+    # the dict buffer and per-message delivery loop the ring window replaced
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buffer = {}
+        self.gap_since_ms = None
+
+    def _handle_reliable_rx(self, seq: int, ts_ms: int, payload: bytes, latency: int, arrival_ms: int,
+                            ch: int = CH_RELIABLE) -> bool:
+        with self.recv_lock:
+            if self._is_seq_behind(seq, self.expected_seq):
+                return True
+            if seq in self.buffer:
+                return True
+            self.buffer[seq] = (ts_ms, bytes(payload))
+            self.reli_packets_recv += 1
+            self.reli_total_latency += latency
+            self.reli_latency_sq += pow(latency, 2)
+            self.reli_total_bytes += len(payload)
+            if self.reli_last_transit is not None:
+                d = abs(latency - self.reli_last_transit)
+                self.reli_jitter += (d - self.reli_jitter)/16
+            self.reli_last_transit = latency
+            while True:
+                if self.expected_seq in self.buffer:
+                    head_timestamp_ms, head_payload = self.buffer.pop(self.expected_seq)
+                    self._deliver_to_app((CH_RELIABLE, self.expected_seq, head_timestamp_ms, head_payload))
+                    self.gap_since_ms = None
+                    self.expected_seq = (self.expected_seq + 1) % SEQ_MOD
+                    continue
+                now = now_ms()
+                if self.gap_since_ms is None:
+                    self.gap_since_ms = now
+                    break
+                if now - self.gap_since_ms >= self.gap_skip_timeout_ms:
+                    self.expected_seq = (self.expected_seq + 1) % SEQ_MOD
+                    self.gap_since_ms = now
+                    continue
+                break
+        return True
+
+
+def arrival_order(packets: int, reorder_rate: float):
+    rng = random.Random(3103)
+    order = list(range(packets))
+    for i in range(packets):
+        if rng.random() < reorder_rate:
+            j = min(i + rng.randint(1, MAX_DISPLACEMENT), packets - 1)
+            order[i], order[j] = order[j], order[i]
+    return [s % SEQ_MOD for s in order]
+
+
+def run(cls, order, port: int) -> float:
+    api = cls(("127.0.0.1", port), ("127.0.0.1", port + 1), gap_skip_timeout_ms=10_000)
+    payload = memoryview(b"p" * 64)
+    handle = api._handle_reliable_rx
+    t0 = time.perf_counter()
+    for seq in order:
+        handle(seq, 0, payload, 0, 0)
+    elapsed = time.perf_counter() - t0
+    assert len(api.app_recv_q) == len(order), "messages lost"
+    api.sock.close()
+    return elapsed / len(order) * 1e9
+
+
+def main():
+    packets = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{'reorder %':>9} {'dict ns/pkt':>12} {'ring ns/pkt':>12}")
+    port = 9600
+    for rate in (0.0, 0.05, 0.2, 0.5):
+        order = arrival_order(packets, rate)
+        old = min(run(DictReorderGameNetAPI, order, port) for _ in range(REPEAT))
+        new = min(run(GameNetAPI, order, port + 2) for _ in range(REPEAT))
+        port += 4
+        print(f"{rate * 100:>9.0f} {old:>12.0f} {new:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
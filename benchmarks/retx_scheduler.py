@@ -0,0 +1,82 @@
+import os
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_ACK, now_ms
+
+"""
+Retransmission scheduler benchmark.
+
+Keeps N reliable packets outstanding (with an RTO long enough that none of them expire) and measures
+  - CPU time burnt by the process while idle, i.e. the cost of the retx worker itself
+  - ACK-handling latency: time from an ACK hitting the socket until its entry leaves pkts_pending_ack
+for the heap scheduler and for the old 10 ms full-scan worker.
+
+Usage: python benchmarks/retx_scheduler.py [idle_seconds]
+"""
+
+SIZES = [1_000, 10_000, 50_000]
+ACK_SAMPLES = 200
+
+
+class ScanGameNetAPI(GameNetAPI):
+    # the pre-heap worker: wake every 10 ms and walk every pending entry under send_lock
+    def _retx_worker(self):
+        while self.running:
+            now = now_ms()
+            to_retx = []
+            with self.send_lock:
+                for seq, ent in list(self.pkts_pending_ack.items()):
+                    if now - ent["last_tx"] >= self.retransmission_timeout_ms:
+                        to_retx.append((seq, ent))
+            time.sleep(0.01)
+
+
+def run(cls, outstanding: int, idle_seconds: float, port: int):
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", port + 1))
+    api = cls(("127.0.0.1", port), ("127.0.0.1", port + 1), congestion_control=False,
+              retransmission_timeout_ms=600_000, gap_skip_timeout_ms=1_200_000, max_rto_ms=600_000)
+    api.start()
+    for i in range(outstanding):
+        api.send(b"x" * 64)
+
+    cpu0 = time.process_time()
+    time.sleep(idle_seconds)
+    cpu_pct = (time.process_time() - cpu0) / idle_seconds * 100
+
+    latencies = []
+    for seq in range(ACK_SAMPLES):
+        ack = api._build_packet(CH_ACK, seq, b"")
+        t0 = time.perf_counter()
+        sink.sendto(ack, ("127.0.0.1", port))
+        while seq in api.pkts_pending_ack:
+            pass
+        latencies.append((time.perf_counter() - t0) * 1e6)
+
+    api.running = False
+    with api.retx_cv:
+        api.retx_cv.notify_all()
+    api.sock.close()
+    sink.close()
+    latencies.sort()
+    return cpu_pct, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    idle_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    port = 9100
+    print(f"{'scheduler':<8} {'outstanding':>11} {'idle CPU %':>10} {'ACK p50 us':>10} {'ACK p99 us':>10}")
+    for outstanding in SIZES:
+        for name, cls in (("scan", ScanGameNetAPI), ("heap", GameNetAPI)):
+            cpu_pct, p50, p99 = run(cls, outstanding, idle_seconds, port)
+            port += 2
+            print(f"{name:<8} {outstanding:>11} {cpu_pct:>10.1f} {p50:>10.1f} {p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
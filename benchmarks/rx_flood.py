@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_UNRELIABLE, HEADER_SIZE, SEQ_MOD, build_packet, now_ms
+
+"""
+Loopback flood: how many datagrams per second can the rx worker take in?
+
+A separate process blasts pre-built unreliable packets at the receiver for a few seconds. The receiver's
+app delivery is stubbed out so only the rx path is measured: receive, parse, CRC, dispatch, stats.
+Throughput is reported per CPU second of the rx thread, so the flooder sharing the core does not skew it.
+Compares the old path (one recvfrom(65535) per datagram behind a socket timeout, slicing + concatenating
+to check the CRC) with the batched recv_into/memoryview path.
+
+Usage: python benchmarks/rx_flood.py [seconds] [payload_bytes]
+"""
+
+
+def legacy_parse(data: bytes):
+    if len(data) < HEADER_SIZE:
+        raise ValueError("packet is too small (packet size < header size)")
+    ch = int.from_bytes(data[0:1], "big")
+    seq = int.from_bytes(data[1:3], "big")
+    timestamp = int.from_bytes(data[3:7], "big")
+    crc = int.from_bytes(data[7:11], "big")
+    payload = data[11:]
+    if zlib.crc32(data[0:7] + payload) & 0xFFFFFFFF != crc:
+        raise ValueError("bad crc")
+    return ch, seq, timestamp, payload
+
+
+class LegacyRxGameNetAPI(GameNetAPI):
+    # one blocking-with-timeout recvfrom per datagram, as before the batched receive path
+    def _rx_worker(self):
+        self.sock.settimeout(0.2)
+        while self.running:
+            try:
+                data, _ = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            recv_timestamp = now_ms()
+            try:
+                ch, seq, send_timestamp, payload = legacy_parse(data)
+            except Exception:
+                continue
+            self._dispatch(ch, seq, send_timestamp, payload, recv_timestamp)
+
+
+def flood(port: int, seconds: float, payload_size: int, start):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # consecutive seqs so freshest-wins accepts every datagram
+    pkts = [build_packet(CH_UNRELIABLE, seq, b"p" * payload_size) for seq in range(SEQ_MOD)]
+    start.wait()
+    end = time.monotonic() + seconds
+    seq = 0
+    while time.monotonic() < end:
+        for _ in range(256):
+            try:
+                sock.sendto(pkts[seq % SEQ_MOD], ("127.0.0.1", port))
+            except OSError:
+                pass
+            seq += 1
+
+
+def run(cls, port: int, seconds: float, payload_size: int) -> float:
+    api = cls(("127.0.0.1", port), ("127.0.0.1", port + 1))
+    api._deliver_to_app = lambda msg: None
+    cpu = []
+    orig_worker = api._rx_worker
+
+    def rx_worker():
+        t = time.thread_time()
+        orig_worker()
+        cpu.append(time.thread_time() - t)
+
+    api._rx_worker = rx_worker
+    start = multiprocessing.Event()
+    flooder = multiprocessing.Process(target=flood, args=(port, seconds, payload_size, start))
+    flooder.start()
+    api.start()
+    start.set()
+    t0 = time.monotonic()
+    flooder.join()
+    elapsed = time.monotonic() - t0
+    received = api.unreli_packets_recv
+    api.running = False
+    api.rx_thread.join()
+    api.sock.close()
+    return received / elapsed, received / cpu[0]
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    payload_size = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    results = {}
+    print(f"{'rx path':<8} {'pkts/s wall':>12} {'pkts/cpu-s':>12}")
+    for port, (name, cls) in zip((9400, 9402), (("legacy", LegacyRxGameNetAPI), ("batched", GameNetAPI))):
+        wall, per_cpu = run(cls, port, seconds, payload_size)
+        results[name] = per_cpu
+        print(f"{name:<8} {wall:>12.0f} {per_cpu:>12.0f}")
+    print(f"speedup per core: {results['batched'] / results['legacy']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_codec import CH_RELIABLE, CH_UNRELIABLE, CH_ACK, SACK_BITS, build_packet, parse_packet, sack_seqs
+from gamenet_server import GameNetServer
+
+"""
+Load test for GameNetServer: thousands of concurrent clients against one server process.
+
+Every emulated client is its own UDP socket (so its own session on the server) speaking the wire protocol
+directly: it sends a reliable message RATE times per second, retransmits anything unACKed after RETX_S and
+tracks how long each message took to be ACKed. Clients are spread over CLIENT_PROCS processes. The server app
+echoes every message back on the unreliable channel, so the server's send path is loaded too.
+
+Reports the live session count, server receive rate, ACK coverage and latency, echoes received by the clients,
+and the server's RSS per session. Exits with status 1 if not every client got a session or fewer than 99% of
+the messages were ACKed.
+
+Usage: python benchmarks/server_load.py [clients] [seconds] [rate_hz]
+"""
+
+CLIENT_PROCS = 4
+RETX_S = 0.2
+PORT = 9800
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def clients(count: int, seconds: float, rate: float, start, results):
+    server = ("127.0.0.1", PORT)
+    sel = selectors.DefaultSelector()
+    socks = []
+    for i in range(count):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(("127.0.0.1", 0))
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ, i)
+        socks.append(s)
+    next_seq = [0] * count
+    pending = [dict() for _ in range(count)]  # seq -> (first send, last send)
+    snd_una = [0] * count
+    sent = acked = echoes = retransmits = 0
+    latencies = []
+
+    start.wait()
+    t0 = time.monotonic()
+    end = t0 + seconds
+    due = 0
+    next_retx_scan = t0 + RETX_S
+    while True:
+        now = time.monotonic()
+        if now < end:
+            # round-robin over the clients at RATE messages per client per second
+            target = int((now - t0) * rate * count)
+            while due < target:
+                i = due % count
+                seq = next_seq[i]
+                next_seq[i] = (seq + 1) % 65536
+                socks[i].sendto(build_packet(CH_RELIABLE, seq, b"input %06d" % due), server)
+                pending[i][seq] = (now, now)
+                sent += 1
+                due += 1
+        elif not any(pending) or now > end + 2:
+            break
+
+        if now >= next_retx_scan:
+            next_retx_scan = now + RETX_S / 4
+            for i, p in enumerate(pending):
+                for seq, (first, last) in p.items():
+                    if now - last > RETX_S:
+                        socks[i].sendto(build_packet(CH_RELIABLE, seq, b"retx"), server)
+                        p[seq] = (first, now)
+                        retransmits += 1
+
+        for key, _ in sel.select(0.002):
+            i = key.data
+            sock = key.fileobj
+            while True:
+                try:
+                    data = sock.recv(2048)
+                except BlockingIOError:
+                    break
+                try:
+                    ch, seq, _, payload = parse_packet(data)
+                except ValueError:
+                    continue
+                if ch == CH_UNRELIABLE:
+                    echoes += 1
+                    continue
+                if ch != CH_ACK:
+                    continue
+                now = time.monotonic()
+                p = pending[i]
+                done = []
+                newly = (seq - snd_una[i]) % 65536
+                if 0 < newly < 32768:
+                    done.extend((snd_una[i] + k) % 65536 for k in range(newly))
+                    snd_una[i] = seq
+                if len(payload) >= SACK_BITS // 8:
+                    done.extend(sack_seqs(seq, payload))
+                for s in done:
+                    ent = p.pop(s, None)
+                    if ent is not None:
+                        acked += 1
+                        latencies.append((now - ent[0]) * 1000)
+    for s in socks:
+        s.close()
+    results.put((sent, acked, echoes, retransmits, latencies))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+
+    rss0 = rss_mb()
+    server = GameNetServer(("127.0.0.1", PORT), retransmission_timeout_ms=100, gap_skip_timeout_ms=1000)
+    server.start()
+    delivered = [0]
+
+    def app():
+        while server.running:
+            for addr, ch, seq, _, payload, _ in server.recv(timeout_ms=100):
+                delivered[0] += 1
+                server.send(addr, payload, reliable=False)
+
+    threading.Thread(target=app, daemon=True).start()
+
+    # spawn, not fork: the server's threads are already running
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    results = ctx.Queue()
+    per_proc = [count // CLIENT_PROCS + (i < count % CLIENT_PROCS) for i in range(CLIENT_PROCS)]
+    procs = [ctx.Process(target=clients, args=(n, seconds, rate, start, results)) for n in per_proc]
+    for p in procs:
+        p.start()
+    time.sleep(2.0)  # let every process open its sockets
+    cpu0 = time.process_time()
+    t0 = time.monotonic()
+    start.set()
+
+    peak_sessions = 0
+    while time.monotonic() - t0 < seconds:
+        time.sleep(0.5)
+        peak_sessions = max(peak_sessions, server.get_metrics()["sessions"])
+    rss = rss_mb()
+
+    totals = [0, 0, 0, 0]
+    latencies = []
+    for _ in procs:
+        *counts, lat = results.get()
+        totals = [a + b for a, b in zip(totals, counts)]
+        latencies.extend(lat)
+    for p in procs:
+        p.join()
+    elapsed = time.monotonic() - t0
+    cpu = time.process_time() - cpu0
+    metrics = server.get_metrics()
+    server.close()
+
+    sent, acked, echoes, retransmits = totals
+    latencies.sort()
+    pct = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] if latencies else float("nan")
+    print(f"clients              {count}")
+    print(f"peak sessions        {peak_sessions} (refused {metrics['sessions_refused']})")
+    print(f"messages sent        {sent} ({sent / seconds:.0f}/s), client retransmissions {retransmits}")
+    print(f"delivered to app     {delivered[0]}")
+    print(f"ACKed                {acked} ({acked / max(sent, 1) * 100:.2f}%)")
+    print(f"ACK latency ms       p50 {pct(0.5):.1f}  p99 {pct(0.99):.1f}  max {pct(1.0):.1f}")
+    print(f"echoes received      {echoes}")
+    print(f"server rx            {metrics['packets_recv'] / elapsed:.0f} pkts/s, {cpu / elapsed * 100:.0f}% CPU")
+    print(f"server RSS           {rss:.1f} MB ({(rss - rss0) * 1024 / max(peak_sessions, 1):.1f} KB per session)")
+    if peak_sessions < count or acked < 0.99 * sent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_codec import CH_UNRELIABLE, SEQ_MOD, build_packet
+from gamenet_shard import ShardedGameNetServer
+
+"""
+Aggregate receive rate of ShardedGameNetServer with 1 to 8 shard processes.
+
+FLOODERS processes blast pre-built unreliable packets at the shared port from SOURCES sockets each (distinct
+source ports, so SO_REUSEPORT has addresses to hash across shards; consecutive seqs per source so freshest-wins
+accepts every packet). The rate is the growth of the summed packets_recv reported by the shards over the
+measurement window, after a one second warm-up. Scaling needs free cores: the flooders run on the same machine
+and take their share.
+
+Usage: python benchmarks/shard_scaling.py [seconds] [max_shards]
+"""
+
+FLOODERS = 2
+SOURCES = 64
+PORT = 9900
+
+
+def flood(seconds: float, start, stop):
+    socks = []
+    for _ in range(SOURCES):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(("127.0.0.1", 0))
+        socks.append(s)
+    pkts = [build_packet(CH_UNRELIABLE, seq, b"p" * 64) for seq in range(1024)]
+    addr = ("127.0.0.1", PORT)
+    start.wait()
+    end = time.monotonic() + seconds
+    seq = 0
+    while not stop.is_set() and time.monotonic() < end:
+        pkt = pkts[seq % 1024]
+        for s in socks:
+            try:
+                s.sendto(pkt, addr)
+            except OSError:
+                pass
+        seq = (seq + 1) % SEQ_MOD
+    for s in socks:
+        s.close()
+
+
+def run(shards: int, seconds: float):
+    server = ShardedGameNetServer(("127.0.0.1", PORT), workers=shards, idle_timeout_s=60)
+    server.start()
+    ctx = multiprocessing.get_context("spawn")
+    start, stop = ctx.Event(), ctx.Event()
+    procs = [ctx.Process(target=flood, args=(seconds + 1.5, start, stop)) for _ in range(FLOODERS)]
+    for p in procs:
+        p.start()
+    time.sleep(1.0)
+    start.set()
+    time.sleep(1.0)
+    before = server.get_metrics().get("packets_recv", 0)
+    t0 = time.monotonic()
+    time.sleep(seconds)
+    after = server.get_metrics()
+    rate = (after.get("packets_recv", 0) - before) / (time.monotonic() - t0)
+    stop.set()
+    for p in procs:
+        p.join()
+    spread = [m.get("sessions", 0) for m in after["per_shard"]]
+    server.close()
+    return rate, spread
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 4.0
+    max_shards = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    print(f"{os.cpu_count()} CPUs, {FLOODERS} flooders x {SOURCES} sources")
+    print(f"{'shards':>6} {'pkts/s':>10} {'speedup':>8}  sessions per shard")
+    base = None
+    shards = 1
+    while shards <= max_shards:
+        rate, spread = run(shards, seconds)
+        base = base or rate
+        print(f"{shards:>6} {rate:>10.0f} {rate / base:>8.2f}  {spread}")
+        shards *= 2
+
+
+if __name__ == "__main__":
+    main()
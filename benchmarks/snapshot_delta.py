@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_SNAPSHOT, CH_UNRELIABLE
+from gamenet_netem import Link, NetworkEmulator
+from gamenet_snapshot import XorRleCodec, ZlibDeltaCodec
+
+"""
+Bandwidth of snapshot delta compression (GameNetAPI.send_snapshot()) on a synthetic position-update workload.
+
+The world is --entities entities at integer positions in -255..255, as in the {"x", "y"} JSON test cases of
+playground/analysis.py. Every tick a MOVE_SHARE of them step by up to STEP in x and y, and the whole world goes out
+as one snapshot, --ticks ticks at TICK_S, through the in-process network emulator (--loss on both directions, so
+snapshots and their ACKs get lost). Variants:
+  full      : the state with send(reliable=False), what the unreliable channel does today
+  json/xor  : JSON state, XorRleCodec (a number changing length shifts the rest of the document, all of which
+              XOR then sees as changed)
+  json/zlib : JSON state, ZlibDeltaCodec
+  packed/xor: the same world packed as fixed-size records (id, x, y as 3 int16), XorRleCodec
+Reported: state bytes handed to the transport, payload bytes sent, savings, keyframes, snapshots delivered, and
+that every delivered state equals the one sent with that seq.
+
+Usage: python benchmarks/snapshot_delta.py [--entities N] [--ticks N] [--loss P]
+"""
+
+PORT = 9960
+TICK_S = 0.005
+MOVE_SHARE = 0.2
+STEP = 3
+ENTITY = struct.Struct("!Hhh")
+
+
+def world_states(entities: int, ticks: int, seed: int):
+    # [(json bytes, packed bytes)] per tick
+    rnd = random.Random(seed)
+    pos = [[rnd.randint(-255, 255), rnd.randint(-255, 255)] for _ in range(entities)]
+    states = []
+    for _ in range(ticks):
+        for p in rnd.sample(pos, int(entities * MOVE_SHARE)):
+            p[0] = min(max(p[0] + rnd.randint(-STEP, STEP), -255), 255)
+            p[1] = min(max(p[1] + rnd.randint(-STEP, STEP), -255), 255)
+        doc = json.dumps([{"id": i, "x": x, "y": y} for i, (x, y) in enumerate(pos)]).encode()
+        packed = b"".join(ENTITY.pack(i, x, y) for i, (x, y) in enumerate(pos))
+        states.append((doc, packed))
+    return states
+
+
+def run(name: str, states, codec, loss: float, port: int, seed: int) -> dict:
+    emulator = NetworkEmulator()
+    emulator.start()
+    a_addr = ("127.0.0.1", port)
+    b_addr = ("127.0.0.1", port + 1)
+    a = GameNetAPI(a_addr, b_addr, snapshot_codec=codec)
+    b = GameNetAPI(b_addr, a_addr, snapshot_codec=codec)
+    b.print_metrics = lambda report: None  # the benchmark reports its own numbers
+    a.sock = emulator.wrap(a.sock, Link(seed=seed, loss=loss, delay_ms=2))
+    b.sock = emulator.wrap(b.sock, Link(seed=seed + 1, loss=loss, delay_ms=2))
+    a.start()
+    b.start()
+    delivered = {}
+
+    def receiver():
+        while b.running:
+            for ch, seq, _, payload, *_ in b.recv(timeout_ms=50):
+                if ch in (CH_SNAPSHOT, CH_UNRELIABLE):
+                    delivered[seq] = payload
+
+    rx = threading.Thread(target=receiver, daemon=True)
+    rx.start()
+    sent = {}
+    raw = 0
+    encode_s = 0.0
+    next_tick = time.monotonic()
+    for state in states:
+        t0 = time.perf_counter()
+        seq = a.send_snapshot(state) if codec is not None else a.send(state, reliable=False)
+        encode_s += time.perf_counter() - t0
+        sent[seq] = state
+        raw += len(state)
+        next_tick += TICK_S
+        pause = next_tick - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+    time.sleep(0.2)
+    metrics = a.get_metrics()
+    rx_metrics = b.get_metrics()
+    a.close()
+    b.running = False
+    rx.join()
+    b.sock.close()
+    emulator.close()
+    wire = metrics["snapshot_wire_bytes"] if codec is not None else raw
+    return {
+        "name": name,
+        "raw": raw,
+        "wire": wire,
+        "keyframes": metrics["snapshot_keyframes_sent"] if codec is not None else len(states),
+        "delivered": len(delivered),
+        "undecodable": rx_metrics["snapshots_undecodable"],
+        "correct": all(sent[seq] == state for seq, state in delivered.items()),
+        "send_us": encode_s / len(states) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="snapshot delta compression bandwidth")
+    parser.add_argument("--entities", type=int, default=64)
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--loss", type=float, default=0.05, help="loss rate of both directions")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    states = world_states(args.entities, args.ticks, args.seed)
+    json_states = [s[0] for s in states]
+    packed_states = [s[1] for s in states]
+    variants = (
+        ("full", json_states, None),
+        ("json/xor", json_states, XorRleCodec()),
+        ("json/zlib", json_states, ZlibDeltaCodec()),
+        ("packed/xor", packed_states, XorRleCodec()),
+    )
+    print(f"{args.entities} entities, {args.ticks} ticks, {MOVE_SHARE:.0%} move per tick, {args.loss:.0%} loss; "
+          f"JSON state ~{len(json_states[-1])} B, packed {len(packed_states[-1])} B")
+    print(f"{'variant':<11} {'state B':>9} {'sent B':>9} {'B/snap':>7} {'saved':>7} {'keyfr':>6} {'deliv':>6} "
+          f"{'undec':>6} {'send us':>8} correct")
+    for i, (name, data, codec) in enumerate(variants):
+        r = run(name, data, codec, args.loss, PORT + 2 * i, args.seed)
+        print(f"{name:<11} {r['raw']:>9} {r['wire']:>9} {r['wire'] / len(data):>7.0f} "
+              f"{(1 - r['wire'] / r['raw']) * 100:>6.1f}% {r['keyframes']:>6} {r['delivered']:>6} "
+              f"{r['undecodable']:>6} {r['send_us']:>8.1f} {r['correct']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI
+
+"""
+Long-session memory soak.
+
+Pushes several million messages (3 in 4 reliable, so both receive channels and the ACK path see every seq many
+times over after 16-bit wraps) through a loopback GameNetAPI pair and samples the process RSS every SAMPLE
+messages. After a warm-up the RSS must stay within TOLERANCE_MB of its post warm-up level, otherwise the script
+exits with status 1.
+
+Usage: python benchmarks/soak_memory.py [messages]
+"""
+
+SAMPLE = 250_000
+WARMUP = 500_000
+TOLERANCE_MB = 8
+BATCH = 64
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # peak rather than current RSS, still flat if nothing leaks
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000_000
+    port = 9500
+    tx = GameNetAPI(("127.0.0.1", port), ("127.0.0.1", port + 1))
+    rx = GameNetAPI(("127.0.0.1", port + 1), ("127.0.0.1", port))
+    tx.start()
+    rx.start()
+
+    received = [0]
+
+    def drain():
+        while rx.running:
+            received[0] += len(rx.recv(timeout_ms=100))
+
+    consumer = threading.Thread(target=drain, daemon=True)
+    consumer.start()
+
+    batch = [(b"x" * 64, i % 4 != 0) for i in range(BATCH)]
+    baseline = None
+    peak = 0.0
+    t0 = time.perf_counter()
+    print(f"{'sent':>10} {'received':>10} {'RSS MB':>8} {'pending':>8} {'msg/s':>8}")
+    for sent in range(BATCH, messages + 1, BATCH):
+        tx.send_many(batch)
+        if sent // SAMPLE != (sent - BATCH) // SAMPLE:
+            mb = rss_mb()
+            if sent >= WARMUP:
+                baseline = mb if baseline is None else baseline
+                peak = max(peak, mb)
+            rate = sent / (time.perf_counter() - t0)
+            print(f"{sent:>10} {received[0]:>10} {mb:>8.1f} {len(tx.pkts_pending_ack):>8} {rate:>8.0f}")
+
+    for api in (tx, rx):
+        api.running = False
+        with api.retx_cv:
+            api.retx_cv.notify_all()
+        api.sock.close()
+
+    if baseline is None:
+        print(f"too few messages for a verdict, need more than {WARMUP}")
+        return
+    growth = peak - baseline
+    print(f"RSS growth after warm-up: {growth:.1f} MB (tolerance {TOLERANCE_MB} MB)")
+    if growth > TOLERANCE_MB:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE, CH_STREAM, HEADER_SIZE
+from gamenet_metrics import Histogram
+from gamenet_netem import Link, NetworkEmulator
+from gamenet_stream import STREAM_HEADER
+
+"""
+Cross-stream head-of-line blocking: latency of a clean flow while another flow on the same connection loses
+packets.
+
+Two flows share one GameNetAPI pair: A (say chat) and B (say inventory updates), one message each per TICK_S. The
+link (SelectiveLink) delays everything by DELAY_MS one way and drops only A's datagrams, originals and
+retransmissions alike, with probability --loss; ACKs are never lost. Variants:
+  one channel: both flows on the reliable channel (stream 0), what the protocol offered so far
+  streams    : A on stream 1, B on stream 2
+Reported per variant and loss rate: latency of B and of A (send() to recv(), same process clock), p50/p99/max.
+With one channel every loss of A holds up the B messages behind it until A's retransmission arrives; on their
+own streams B should not notice A's losses at all.
+
+Usage: python benchmarks/streams.py [--loss P [P ...]] [--ticks N]
+"""
+
+PORT = 9990
+DELAY_MS = 10
+TICK_S = 0.004
+STAMP = struct.Struct("!cd")  # flow tag, send time
+
+
+class SelectiveLink(Link):
+    # loses flow A's datagrams only (every message goes out alone, nothing is bundled)
+    def __init__(self, drop_a: float, **kwargs):
+        super().__init__(**kwargs)
+        self.drop_a = drop_a
+
+    def plan(self, data: bytes, now: float):
+        tag_at = HEADER_SIZE + (STREAM_HEADER.size if data[0] == CH_STREAM else 0)
+        if data[0] in (CH_RELIABLE, CH_STREAM) and data[tag_at:tag_at + 1] == b"A":
+            if self.rng.random() < self.drop_a:
+                self.sent += 1
+                self.lost += 1
+                return []
+        return super().plan(data, now)
+
+
+def run(streams: bool, loss: float, ticks: int, port: int) -> dict:
+    emulator = NetworkEmulator()
+    emulator.start()
+    a_addr = ("127.0.0.1", port)
+    b_addr = ("127.0.0.1", port + 1)
+    tx = GameNetAPI(a_addr, b_addr)
+    rx = GameNetAPI(b_addr, a_addr)
+    rx.print_metrics = lambda report: None
+    tx.sock = emulator.wrap(tx.sock, SelectiveLink(loss, delay_ms=DELAY_MS, seed=port))
+    rx.sock = emulator.wrap(rx.sock, Link(delay_ms=DELAY_MS, seed=port + 1))
+    tx.start()
+    rx.start()
+    latency = {b"A": Histogram(), b"B": Histogram()}
+    got = [0]
+
+    def receiver():
+        while rx.running:
+            for msg in rx.recv(timeout_ms=50):
+                tag, sent_at = STAMP.unpack(msg[3])
+                latency[tag].record(int((time.perf_counter() - sent_at) * 1e6))
+                got[0] += 1
+
+    reader = threading.Thread(target=receiver, daemon=True)
+    reader.start()
+    next_tick = time.monotonic()
+    for _ in range(ticks):
+        tx.send(STAMP.pack(b"A", time.perf_counter()), stream=1 if streams else 0)
+        tx.send(STAMP.pack(b"B", time.perf_counter()), stream=2 if streams else 0)
+        next_tick += TICK_S
+        pause = next_tick - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+    deadline = time.monotonic() + 3
+    while got[0] < 2 * ticks and time.monotonic() < deadline:
+        time.sleep(0.05)
+    tx.close()
+    rx.running = False
+    reader.join()
+    rx.sock.close()
+    emulator.close()
+    return {tag: hist.percentiles(scale=1000) for tag, hist in latency.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="latency of a clean flow next to a lossy one")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.0, 0.05, 0.15], help="loss rate of flow A")
+    parser.add_argument("--ticks", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{args.ticks} messages per flow, one per {TICK_S * 1000:.0f} ms, {DELAY_MS} ms one way; latency in ms")
+    print(f"{'A loss':>6} {'variant':<12} {'B p50':>7} {'B p99':>7} {'B max':>7} {'A p50':>7} {'A p99':>7} "
+          f"{'A max':>7} {'B got':>6}")
+    port = PORT
+    for loss in args.loss:
+        for name, streams in (("one channel", False), ("streams", True)):
+            r = run(streams, loss, args.ticks, port)
+            port += 2
+            a, b = r[b"A"], r[b"B"]
+            print(f"{loss:>6.0%} {name:<12} {b['p50']:>7.1f} {b['p99']:>7.1f} {b['max']:>7.1f} "
+                  f"{a['p50']:>7.1f} {a['p99']:>7.1f} {a['max']:>7.1f} {b['count']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gamenet_api import GameNetAPI, CH_RELIABLE
+from gamenet_trace import PacketTrace, TRACE_RX
+
+"""
+Cost of packet tracing (gamenet_trace.py).
+
+  record     : ns per PacketTrace.record() call (flow looked up per record, what GameNetServer uses), best of a
+               few runs
+  recorder   : the same for the single-peer recorder GameNetAPI uses
+  print      : ns per line of the print("data", "rx", ...) debugging it replaces (to an in-memory stream, a
+               terminal is slower)
+  end to end : GameNetAPI pair on loopback, MESSAGES reliable messages sent as fast as send() returns, with and
+               without trace_path; wall time until the receiver has all of them, best of ROUNDS alternating runs
+
+Usage: python benchmarks/trace_overhead.py [messages]
+"""
+
+PORT = 9900
+ROUNDS = 3
+
+
+def ns_per_op(fn, iterations: int) -> float:
+    return min(timeit.repeat(fn, number=iterations, repeat=5)) / iterations * 1e9
+
+
+def end_to_end(messages: int, trace_path, port: int) -> float:
+    tx = GameNetAPI(("127.0.0.1", port), ("127.0.0.1", port + 1), trace_path=trace_path)
+    rx = GameNetAPI(("127.0.0.1", port + 1), ("127.0.0.1", port),
+                    trace_path=trace_path + ".rx" if trace_path else None)
+    tx.start()
+    rx.start()
+    got = [0]
+
+    def receiver():
+        while got[0] < messages:
+            msgs = rx.recv(timeout_ms=500)
+            if not msgs:
+                break
+            got[0] += sum(1 for m in msgs if m[0] == CH_RELIABLE)
+
+    reader = threading.Thread(target=receiver, daemon=True)
+    reader.start()
+    payload = b"m" * 64
+    t0 = time.perf_counter()
+    for _ in range(messages):
+        tx.send(payload)
+    reader.join()
+    elapsed = time.perf_counter() - t0
+    for api in (tx, rx):
+        api.running = False
+        with api.retx_cv:
+            api.retx_cv.notify_all()
+        api.sock.close()
+    if got[0] < messages:
+        print(f"only {got[0]}/{messages} delivered")
+    return elapsed
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        trace = PacketTrace(os.path.join(tmp, "bench.trace"), 1 << 16)
+        addr = ("127.0.0.1", PORT)
+        record = trace.record
+        rec_ns = ns_per_op(lambda: record(TRACE_RX, CH_RELIABLE, 1234, 5678, 64, 0, 0, addr), 200_000)
+        peer_record = trace.recorder(addr)
+        peer_ns = ns_per_op(lambda: peer_record(TRACE_RX, CH_RELIABLE, 1234, 5678, 64, 0, 0), 200_000)
+        sink = io.StringIO()
+        with redirect_stdout(sink):
+            print_ns = ns_per_op(lambda: print("data", "rx", CH_RELIABLE, 1234, 5678, 5690, 12, 0, 64), 200_000)
+        print(f"record      {rec_ns:8.0f} ns (server, flow looked up per record)")
+        print(f"recorder    {peer_ns:8.0f} ns (GameNetAPI, one peer)")
+        print(f"print       {print_ns:8.0f} ns")
+
+        plain = traced = float("inf")
+        for i in range(ROUNDS):
+            port = PORT + 4 * (i + 1)
+            plain = min(plain, end_to_end(messages, None, port))
+            traced = min(traced, end_to_end(messages, os.path.join(tmp, f"e2e{i}.trace"), port + 2))
+        print(f"end to end  {messages / plain:8.0f} msgs/s untraced, {messages / traced:.0f} msgs/s traced "
+              f"({(traced - plain) / messages * 1e9:+.0f} ns per message, both ends traced)")
+
+
+if __name__ == "__main__":
+    main()
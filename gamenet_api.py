@@ -2,32 +2,392 @@ import socket
 import threading
 import time
 import zlib
-import atexit
 import csv
+import heapq
+import itertools
+import struct
+import sys
+from array import array
 from collections import deque
-from typing import Optional, Tuple, List
+from operator import itemgetter
+from typing import Callable, Optional, Tuple, List, Iterable
+
+from gamenet_metrics import ChannelHistograms, InstrumentedLock, DEFAULT_PERCENTILES
+from gamenet_export import MetricsExporter, metrics_snapshot, DEFAULT_INTERVAL_S
+from gamenet_trace import PacketTrace, DEFAULT_TRACE_RECORDS, TRACE_TX, TRACE_RETX, TRACE_RX, TRACE_ACKED, TRACE_DROP
+from gamenet_snapshot import SnapshotSender, SnapshotReceiver, XorRleCodec
+from gamenet_fragment import FRAGMENT_HEADER, DEFAULT_REASSEMBLY_BUDGET, FragmentMark, Reassembly, split_message
+from gamenet_stream import STREAM_HEADER, STREAM_UNORDERED, MAX_STREAM, StreamSet
+from gamenet_fec import FecSender, FecReceiver
+from gamenet_pacing import SendScheduler, PACING_AUTO, PRIO_RETX, PRIO_RELIABLE, PRIO_UNRELIABLE
+from gamenet_clock import ClockSync
+from gamenet_codec import (
+    CH_RELIABLE, CH_UNRELIABLE, CH_ACK, CH_METRIC, CH_BUNDLE, CH_SNAPSHOT, CH_SNAPSHOT_ACK, CH_FRAGMENT, CH_STREAM,
+    CH_FEC, CH_CLOCK, CLOCK_PROBE, CLOCK_REPLY, SEQ_MOD, HEADER_SIZE, FRAME_HEADER_SIZE, SACK_BITS, HEADER, CRC_OFFSET,
+    WINDOW_UNLIMITED, ECHO, now_ms, ts_diff, build_packet, restamp, parse_packet, build_bundle, iter_bundle,
+    sack_seqs, ack_window, ack_echo,
+)
 
 """
 Hybrid UDP transport (H-UDP) with:
-  - Reliable channel (0): retransmission (timer-based), in-order delivery, skip-after-t
+  - Reliable channel (0): retransmission (timer-based, adaptive RTO with exponential backoff), in-order delivery,
+    skip-after-t
   - Unreliable channel (1): no retransmit, freshest-wins, no reordering
-  - ACK control type (2): internal control, not delivered to the app
-  - No callbacks; apps poll with recv(timeout_ms).
+  - ACK control type (2): internal control, not delivered to the app. Header seq carries the cumulative ACK
+    (every seq before it has arrived), the payload is an 8 byte SACK bitmap where bit i set means seq cum+1+i
+    arrived, the receiver's free window in packets (2B, 0xFFFF = unlimited), the timestamp of the newest data
+    packet and when it arrived (4B each, for the clock estimate), then 2 byte seqs of packets that arrived beyond
+    the bitmap. ACKs can be coalesced for up to ack_delay_ms.
+  - Bundle type (4): several messages packed into one datagram by send_many() or the bundling mode. Payload is a
+    run of frames | Channel (1B) | Sequence (2B) | Length (2B) | payload |; every frame is handled (ACKed,
+    retransmitted, delivered) as if it had arrived on its own. Outer seq is unused, timestamp/CRC cover all frames.
+  - Snapshot type (5): game state sent with send_snapshot(), unreliable and freshest-wins, encoded as a delta
+    against the newest snapshot the peer acknowledged (type 6, header seq = that snapshot) or as a keyframe when
+    there is none; recv() returns the rebuilt full state. Codec and payload layout in gamenet_snapshot.py.
+  - Fragment type (7): a reliable message that does not fit in one mtu sized datagram is split into fragments on
+    consecutive reliable seqs, each ACKed and retransmitted on its own. The receiver copies them into one buffer
+    per message, bounded by reassembly_budget bytes, and delivers the message on channel 0 under the seq of its
+    first fragment. Layout in gamenet_fragment.py; fragment=False sends such messages as one datagram instead.
+  - Stream type (8): send(payload, stream=n) for n in 1..255 sends a reliable message ordered only within its
+    stream, so a loss on one stream never delays another; streams in unordered_streams are reliable but
+    delivered as they arrive. Stream 0 is the reliable channel itself. Streams share the connection's seqs,
+    ACKs, retransmissions and window. Layout in gamenet_stream.py.
+  - FEC type (9): with fec={CH_RELIABLE: k, CH_UNRELIABLE: k} every k consecutive messages of a seq space are
+    followed by a parity packet, and the receiver rebuilds a lost message from it instead of waiting a
+    retransmission timeout (or never seeing it, unreliable; a rebuilt unreliable message is delivered even
+    after a newer one, so its seq can go backwards). k adapts to the loss that still needs
+    retransmissions (fec_adaptive), up to the configured k. Parity and codecs in gamenet_fec.py.
+  - Clock type (10): probes for a side that only receives, see below.
+  - recv() returns (channel, seq, timestamp_ms, payload, received timestamp, latency, retransmissions, stream);
+    stream messages come out on channel 0 with their stream, everything else has stream 0.
+  - Latency is one way, on the peer's clock as estimated from the ACK exchange (offset and drift, NTP style,
+    gamenet_clock.py; a side that sends no reliable data probes on channel 10 instead), so it holds across hosts
+    whose clocks disagree. Timestamps are 32-bit ms of a monotonic clock, compared wrap safe.
+  - No callbacks; apps block in recv(timeout_ms), which wakes as soon as a message is queued for delivery.
+  - Reliable sends are limited to the receiver's advertised window of packets in flight. With
+    congestion_control=True also to cwnd, which is AIMD: slow start, then +1 per RTT, halved (at most once per
+    RTT) when a retransmission timer fires. When the window is full the message is queued and goes out as ACKs
+    open it (send_mode="queue", the default: send() only blocks once send_backlog_limit messages are queued);
+    "block" waits for room instead and "fail" raises BlockingIOError.
   - Uses selective repeat instead of go back n
+  - Metrics leave through a MetricsExporter thread (gamenet_export.py): periodic snapshots go to metrics_sinks,
+    and the per-session report triggered by the peer's metric packet is printed there, not on the rx thread.
+  - No syscall runs under send_lock: packets built under it are handed to a writer thread (SendScheduler,
+    gamenet_pacing.py) that owns sendto(). It sends retransmissions first, then fresh reliable, then unreliable
+    datagrams, and with pacing_rate_bps (bits/s, or "auto" to estimate it from the delivery rate) paces
+    everything but ACKs through a token bucket of pacing_burst_bytes. With supersede (default: on when paced) a
+    queued unreliable message or snapshot is dropped once a newer one is queued; a dropped message is not counted
+    as sent. With lock_stats=True the internal locks record wait and hold times (get_lock_stats()).
+  - With trace_path every transmission, retransmission, arrival and ACK is recorded in a binary ring file
+    (gamenet_trace.py, well under 1 us per packet); trace_analyze.py turns it into timelines and statistics.
 
 Header layout (big-endian), 11 Bytes: | Channel (1B) | Sequence (2B) | Timestamp ms (4B) | CRC32 (4B) |
+Encoding/decoding lives in gamenet_codec.py.
 """
 
-CH_RELIABLE = 0
-CH_UNRELIABLE = 1
-CH_ACK = 2
-CH_METRIC = 3
-
-SEQ_MOD = 65536
-HEADER_SIZE = 1 + 2 + 4 + 4  # 11 bytes
+DEFAULT_MTU = 1200
+SACK_MAX_EXTRA = 64
+SEND_MODES = ("block", "fail", "queue")
+DEFAULT_RECV_WINDOW = 1024
+DEFAULT_SEND_BACKLOG = 4096  # messages send_mode="queue" holds back before send() waits for the window
+RX_IDLE_TIMEOUT = 0.2
+RX_BATCH = 16  # datagrams drained per wakeup
+# Linux: the rx timeout is the kernel's SO_RCVTIMEO (a timeval of two C longs) and what is already queued is
+# drained with MSG_DONTWAIT. Elsewhere the timeval layout differs or MSG_DONTWAIT is missing (Windows): the rx
+# threads fall back to settimeout() and read one datagram per wakeup.
+KERNEL_RX_TIMEOUT = sys.platform.startswith("linux") and hasattr(socket, "MSG_DONTWAIT")
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+RX_DRAIN = RX_BATCH if KERNEL_RX_TIMEOUT else 1
+RX_BUF_SIZE = 65535
+SEQ_META_WINDOW = 4096  # per-seq metadata slots kept per channel
 CSV_HEADER = [["Channel","Throughput", "Latency", "Jitter", "PDR"]]
-def now_ms() -> int:
-    return int(time.time() * 1000) & 0xffffffff
+DEFAULT_REPORT_PATH = "data_low.csv"
+RELIABLE_CHANNELS = (CH_RELIABLE, CH_METRIC, CH_FRAGMENT, CH_STREAM)  # channels whose messages are ACKed and retransmitted
+WRITER_IDLE_S = 0.2  # an idle writer thread re-checks whether it should stop this often
+PACING_BURST_PACKETS = 2  # default token bucket size, in mtu sized datagrams
+
+def set_rx_timeout(sock, timeout: float):
+    # receive timeout enforced by the kernel where possible, so the blocking recv needs no poll() in front of it
+    if KERNEL_RX_TIMEOUT:
+        sec = int(timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack("ll", sec, int((timeout - sec) * 1e6)))
+    else:
+        sock.settimeout(timeout)
+
+def new_lock(name: str, registry: Optional[dict]):
+    # a threading.Lock, or with a registry (lock_stats=True) an InstrumentedLock registered there under name
+    if registry is None:
+        return threading.Lock()
+    lock = registry[name] = InstrumentedLock(name)
+    return lock
+
+class PacketWriter:
+    # the thread that calls sendto() for packets built under a transport lock, so that lock is never held across a
+    # syscall. submit() appends to a deque (atomic under the GIL, no lock) and only sets the wakeup event when the
+    # writer is asleep; the writer sends everything queued per wakeup. Packets go out in submit() order.
+    def __init__(self, sock, name: str = "gamenet-writer"):
+        self.sock = sock
+        self.queue = deque()  # (packet, addr)
+        self.wake = threading.Event()
+        self.idle = False
+        self.running = True
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, pkt: bytes, addr: Tuple[str, int]):
+        self.queue.append((pkt, addr))
+        if self.idle:
+            self.wake.set()
+
+    def _run(self):
+        queue = self.queue
+        sendto = self.sock.sendto
+        while True:
+            while queue:
+                pkt, addr = queue.popleft()
+                try:
+                    sendto(pkt, addr)
+                except OSError:
+                    self.errors += 1
+            if not self.running:
+                return
+            # announce the sleep before the last look at the queue: a submit() racing with it either sees idle
+            # set and wakes us, or its packet is seen here
+            self.idle = True
+            self.wake.clear()
+            if not queue:
+                self.wake.wait(WRITER_IDLE_S)
+            self.idle = False
+
+    def close(self):
+        # sends what is still queued, then stops
+        self.running = False
+        self.wake.set()
+        self.thread.join()
+
+class SackTracker:
+    # receiver side ACK state: everything before base has arrived, bit i of mask means base + 1 + i has arrived
+    def __init__(self, delay_ms: int = 0):
+        self.delay_ms = delay_ms
+        self.base = 0
+        self.mask = 0
+        self.extra = []  # arrivals too far ahead of base for the bitmap
+        self.due: Optional[float] = None  # monotonic time the pending ACK must go out by
+        # header timestamp and arrival of the newest noted packet, echoed for the sender's clock estimate
+        self.echo_ts = 0
+        self.echo_arrival = 0
+
+    def note(self, seq: int, ts: int, arrival: int):
+        # record seq (header timestamp ts, arrived at arrival) and arm the (delayed) ACK
+        self.echo_ts = ts
+        self.echo_arrival = arrival
+        d = (seq - self.base) % SEQ_MOD
+        if d == 0:
+            # consume seq and every consecutive successor already flagged in the mask
+            run = (~self.mask & (self.mask + 1)).bit_length()
+            self.base = (self.base + run) % SEQ_MOD
+            self.mask >>= run
+        elif d < SEQ_MOD // 2:
+            self.mask |= 1 << (d - 1)
+            if d > SACK_BITS:
+                self.extra.append(seq)
+        # else: duplicate of something already covered by the cumulative ACK, re-ACK it
+
+        if self.delay_ms == 0 or len(self.extra) >= SACK_MAX_EXTRA:
+            self.due = time.monotonic()
+        elif self.due is None:
+            self.due = time.monotonic() + self.delay_ms / 1000
+
+    def take(self, window: int = WINDOW_UNLIMITED) -> Tuple[int, bytes]:
+        # returns (cumulative seq, ACK payload advertising window) and disarms the ACK
+        self.due = None
+        payload = (self.mask & ((1 << SACK_BITS) - 1)).to_bytes(SACK_BITS // 8, "big")
+        payload += min(window, WINDOW_UNLIMITED).to_bytes(2, "big")
+        payload += ECHO.pack(self.echo_ts, self.echo_arrival)
+        payload += b"".join(s.to_bytes(2, "big") for s in self.extra)
+        self.extra.clear()
+        return self.base, payload
+
+    def reset(self):
+        self.base = 0
+        self.mask = 0
+        self.extra.clear()
+        self.due = None
+
+# timing(entry) of ack_pending() for the dict entries of pkts_pending_ack
+PENDING_TIMING = itemgetter("send_timestamp", "retries")
+
+def ack_pending(
+    pending: dict,
+    cum_seq: int,
+    payload: bytes,
+    snd_una: int,
+    next_seq: int,
+    recv_timestamp: int,
+    hist: ChannelHistograms,
+    timing: Callable = PENDING_TIMING,
+) -> Tuple[List[tuple], int, Optional[int]]:
+    # sender side of an ACK, shared by every transport. Pops the pending entries it covers (the cumulative run from
+    # snd_una, walked forward only and never over the whole dict, then the SACKed seqs; a bare ACK covers cum_seq
+    # alone) and records their RTT and retries in hist. timing(entry) -> (send_timestamp, retries).
+    # Returns ([(seq, entry, rtt)], new snd_una, RTT sample): the freshest never retransmitted entry (Karn's
+    # rule), None if there is none.
+    if len(payload) < SACK_BITS // 8:
+        seqs = [cum_seq]
+    else:
+        seqs = []
+        outstanding = (next_seq - snd_una) % SEQ_MOD
+        newly = (cum_seq - snd_una) % SEQ_MOD
+        if 0 < newly <= outstanding:
+            seqs.extend((snd_una + i) % SEQ_MOD for i in range(newly))
+            snd_una = cum_seq
+        seqs.extend(sack_seqs(cum_seq, payload))
+    acked = []
+    sample = None
+    for seq in seqs:
+        ent = pending.pop(seq, None)
+        if ent is None:
+            continue
+        send_timestamp, retries = timing(ent)
+        rtt = ts_diff(recv_timestamp, send_timestamp)
+        hist.rtt_us.record(rtt * 1000)
+        hist.retries.record(retries)
+        if retries == 0 and (sample is None or rtt < sample):
+            sample = rtt
+        acked.append((seq, ent, rtt))
+    return acked, snd_una, sample
+
+class SeqMetaRing:
+    # recv timestamp, latency and retries of the last `size` seqs of one channel, kept in preallocated array
+    # columns at slot seq % size. owner is the seq a slot currently describes, so a slot reused by a newer seq
+    # (or an empty one, -1) never answers for an older seq.
+    def __init__(self, size: int = SEQ_META_WINDOW):
+        self.size = size
+        self.owner = array("l", [-1]) * size
+        self.recv_ts = array("q", [0]) * size
+        self.latency = array("q", [0]) * size
+        self.retries = array("L", [0]) * size
+
+    def put(self, seq: int, recv_ts: int, latency: int, retries: int = 0):
+        i = seq % self.size
+        self.owner[i] = seq
+        self.recv_ts[i] = recv_ts
+        self.latency[i] = latency
+        self.retries[i] = retries
+
+    def note_arrival(self, seq: int, recv_ts: int, latency: int):
+        # another arrival of a seq that is still in its slot is a retransmission
+        i = seq % self.size
+        retries = self.retries[i] + 1 if self.owner[i] == seq else 0
+        self.put(seq, recv_ts, latency, retries)
+
+    def get(self, seq: int) -> Tuple[int, int, int]:
+        # (recv timestamp, latency, retries), zeros once the slot has been taken over
+        i = seq % self.size
+        if self.owner[i] != seq:
+            return 0, 0, 0
+        return self.recv_ts[i], self.latency[i], self.retries[i]
+
+    def reset(self):
+        for i in range(self.size):
+            self.owner[i] = -1
+
+def check_timeouts(
+    retransmission_timeout_ms: int,
+    gap_skip_timeout_ms: int,
+    ack_delay_ms: int,
+    min_rto_ms: int,
+    max_rto_ms: int
+) -> int:
+# Validate timeout parameters, returns the max RTO to use
+    if retransmission_timeout_ms <= 0:
+        raise ValueError(f"retransmission_timeout_ms must be positive, got {retransmission_timeout_ms}")
+    if gap_skip_timeout_ms <= 0:
+        raise ValueError(f"gap_skip_timeout_ms must be positive, got {gap_skip_timeout_ms}")
+    if retransmission_timeout_ms >= gap_skip_timeout_ms:
+        raise ValueError(
+            f"retransmission_timeout_ms ({retransmission_timeout_ms}) must be less than "
+            f"gap_skip_timeout_ms ({gap_skip_timeout_ms}) to allow retransmissions before skipping gaps"
+        )
+    if not 0 < min_rto_ms <= retransmission_timeout_ms <= max_rto_ms:
+        raise ValueError(
+            f"expected 0 < min_rto_ms ({min_rto_ms}) <= retransmission_timeout_ms ({retransmission_timeout_ms}) "
+            f"<= max_rto_ms ({max_rto_ms})"
+        )
+    if ack_delay_ms < 0 or ack_delay_ms >= retransmission_timeout_ms:
+        raise ValueError(
+            f"ack_delay_ms ({ack_delay_ms}) must be non-negative and less than "
+            f"retransmission_timeout_ms ({retransmission_timeout_ms})"
+        )
+    # the backed off RTO stays below the gap skip too, else the receiver skips a gap whose retransmission is due
+    return min(max_rto_ms, gap_skip_timeout_ms - 1)
+
+class RtoEstimator:
+    # RFC 6298 style retransmission timer: SRTT/RTTVAR smoothing, clamped RTO, per-packet exponential backoff
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+    GRANULARITY_MS = 1
+
+    def __init__(self, initial_ms: float, min_ms: float, max_ms: float, adaptive: bool = True):
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.adaptive = adaptive
+        self.rto_ms = initial_ms
+        self.srtt_ms: Optional[float] = None
+        self.rttvar_ms: Optional[float] = None
+        self.samples = 0
+
+    def sample(self, rtt_ms: float):
+        # only feed RTTs of packets that were never retransmitted (Karn's rule)
+        rtt_ms = max(rtt_ms, 0)
+        if self.srtt_ms is None:
+            self.srtt_ms = rtt_ms
+            self.rttvar_ms = rtt_ms / 2
+        else:
+            self.rttvar_ms += self.BETA * (abs(self.srtt_ms - rtt_ms) - self.rttvar_ms)
+            self.srtt_ms += self.ALPHA * (rtt_ms - self.srtt_ms)
+        self.samples += 1
+        if self.adaptive:
+            rto = self.srtt_ms + max(self.GRANULARITY_MS, self.K * self.rttvar_ms)
+            self.rto_ms = min(max(rto, self.min_ms), self.max_ms)
+
+    def timeout_ms(self, retries: int = 0) -> float:
+        # the RTO doubles with every retransmission of the same packet, up to max_ms
+        return min(self.rto_ms * (1 << min(retries, 16)), self.max_ms)
+
+class CongestionController:
+    # AIMD congestion window in packets: slow start up to ssthresh, then +1 per RTT; halved on loss
+    MIN_CWND = 2
+
+    def __init__(self, initial: int, max_cwnd: int, enabled: bool = True):
+        self.enabled = enabled
+        self.max_cwnd = max_cwnd
+        self.cwnd = float(initial)
+        self.ssthresh = float(max_cwnd)
+        self.last_decrease = 0.0
+        self.losses = 0
+
+    def on_ack(self, acked: int):
+        if self.cwnd < self.ssthresh:
+            self.cwnd += acked
+        else:
+            self.cwnd += acked / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_cwnd)
+
+    def on_loss(self, now: float, rtt_s: float):
+        # the timers of one window's worth of losses fire together, count them as a single congestion event
+        if now - self.last_decrease < rtt_s:
+            return
+        self.last_decrease = now
+        self.losses += 1
+        self.ssthresh = max(self.cwnd / 2, self.MIN_CWND)
+        self.cwnd = self.ssthresh
+
+    def window(self) -> int:
+        # disabled: no congestion limit, only the peer's advertised window applies
+        return int(self.cwnd) if self.enabled else SEQ_MOD
 
 class GameNetAPI:
     def __init__(
@@ -36,23 +396,61 @@ class GameNetAPI:
         peer_addr: Tuple[str, int],
         metric: bool = False,
         retransmission_timeout_ms: int = 50,
-        gap_skip_timeout_ms: int = 200
+        gap_skip_timeout_ms: int = 200,
+        ack_delay_ms: int = 0,
+        adaptive_rto: bool = True,
+        min_rto_ms: int = 10,
+        max_rto_ms: int = 1000,
+        bundle: bool = False,
+        mtu: int = DEFAULT_MTU,
+        congestion_control: bool = False,
+        initial_cwnd: int = 16,
+        recv_window: int = DEFAULT_RECV_WINDOW,
+        send_mode: str = "queue",
+        send_backlog_limit: int = DEFAULT_SEND_BACKLOG,
+        metrics_sinks: Iterable = (),
+        metrics_interval_s: float = DEFAULT_INTERVAL_S,
+        report_path: str = DEFAULT_REPORT_PATH,
+        trace_path: Optional[str] = None,
+        trace_records: int = DEFAULT_TRACE_RECORDS,
+        send_thread: bool = True,
+        lock_stats: bool = False,
+        snapshot_codec=None,
+        fragment: bool = True,
+        reassembly_budget: int = DEFAULT_REASSEMBLY_BUDGET,
+        unordered_streams: Iterable[int] = (),
+        fec: Optional[dict] = None,
+        fec_adaptive: bool = True,
+        fec_codec=None,
+        pacing_rate_bps=None,
+        pacing_burst_bytes: Optional[int] = None,
+        supersede: Optional[bool] = None
     ):
-        # Validate timeout parameters
-        if retransmission_timeout_ms <= 0:
-            raise ValueError(f"retransmission_timeout_ms must be positive, got {retransmission_timeout_ms}")
-        if gap_skip_timeout_ms <= 0:
-            raise ValueError(f"gap_skip_timeout_ms must be positive, got {gap_skip_timeout_ms}")
-        if retransmission_timeout_ms >= gap_skip_timeout_ms:
-            raise ValueError(
-                f"retransmission_timeout_ms ({retransmission_timeout_ms}) must be less than "
-                f"gap_skip_timeout_ms ({gap_skip_timeout_ms}) to allow retransmissions before skipping gaps"
-            )
-        
+        max_rto_ms = check_timeouts(retransmission_timeout_ms, gap_skip_timeout_ms, ack_delay_ms, min_rto_ms, max_rto_ms)
+        if mtu <= HEADER_SIZE + FRAME_HEADER_SIZE:
+            raise ValueError(f"mtu must be larger than {HEADER_SIZE + FRAME_HEADER_SIZE} bytes, got {mtu}")
+        if send_mode not in SEND_MODES:
+            raise ValueError(f"send_mode must be one of {SEND_MODES}, got {send_mode!r}")
+        if send_backlog_limit <= 0:
+            raise ValueError(f"send_backlog_limit must be positive, got {send_backlog_limit}")
+        if not 0 < initial_cwnd < SEQ_MOD // 2:
+            raise ValueError(f"initial_cwnd must be in 1..{SEQ_MOD // 2 - 1}, got {initial_cwnd}")
+        if not 0 < recv_window < WINDOW_UNLIMITED:
+            raise ValueError(f"recv_window must be in 1..{WINDOW_UNLIMITED - 1}, got {recv_window}")
+        if pacing_rate_bps is not None and pacing_rate_bps != PACING_AUTO:
+            if isinstance(pacing_rate_bps, str) or pacing_rate_bps <= 0:
+                raise ValueError(f"pacing_rate_bps must be positive or {PACING_AUTO!r}, got {pacing_rate_bps!r}")
+        if pacing_rate_bps is not None and not send_thread:
+            raise ValueError("pacing needs the send thread (send_thread=True)")
+        unordered_streams = frozenset(unordered_streams)
+        if any(not 0 < stream <= MAX_STREAM for stream in unordered_streams):
+            raise ValueError(f"unordered_streams must be stream ids in 1..{MAX_STREAM}, got {sorted(unordered_streams)}")
+
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.sock.bind(local_addr)
-        self.sock.settimeout(0.2)
+        # blocking socket; the rx worker's wakeups come from a kernel side SO_RCVTIMEO
+        self.sock.settimeout(None)
         self.peer_addr = peer_addr
        
         #reliable stats
@@ -75,369 +473,1122 @@ class GameNetAPI:
         self.unreli_jitter = 0
         self.unreli_last_transit = None
         self.unreli_last_arrival = None
+        # latency/RTT/retries/delivery delay distributions per channel (see gamenet_metrics.py)
+        self.histograms = {
+            CH_RELIABLE: ChannelHistograms(), CH_UNRELIABLE: ChannelHistograms(), CH_SNAPSHOT: ChannelHistograms(),
+        }
         
         # rx: receive, retx: retransmit
         self.retransmission_timeout_ms = retransmission_timeout_ms
+        self.rto = RtoEstimator(retransmission_timeout_ms, min_rto_ms, max_rto_ms, adaptive_rto)
         self.gap_skip_timeout_ms = gap_skip_timeout_ms
         self.running = False
         self.rx_thread = None
         self.retx_thread = None
+        # preallocated receive buffers, datagrams are parsed in place through memoryviews
+        self.rx_pool = [bytearray(RX_BUF_SIZE) for _ in range(RX_BATCH)]
+        # sendto() of packets built under send_lock happens on this thread (started by start()), None: inline
+        self.send_thread = send_thread
+        self.writer: Optional[SendScheduler] = None
+        self.pacing_rate_bps = pacing_rate_bps
+        self.pacing_burst_bytes = pacing_burst_bytes if pacing_burst_bytes is not None else PACING_BURST_PACKETS * mtu
+        # drop a queued lone unreliable message or snapshot for a newer one; only paced queues hold them long enough
+        self.supersede = supersede if supersede is not None else pacing_rate_bps is not None
+        # name -> InstrumentedLock with lock_stats=True, None otherwise (plain locks)
+        self.locks = {} if lock_stats else None
 
         # reliable send
-        self.send_lock = threading.Lock()
+        self.send_lock = new_lock("send_lock", self.locks)
         self.next_reliable_seq = 0
-        self.pkts_pending_ack = {}  # seq -> {payload, send_timestamp, last_tx, retries}
+        self.snd_una = 0  # oldest reliable seq that may still be unacked
+        self.pkts_pending_ack = {}  # seq -> {payload, frame, send_timestamp, last_tx, ch, retries, timer}
+        # retransmission deadlines: min-heap of (deadline, tie, seq, entry) on the monotonic clock.
+        # ACKs only pop pkts_pending_ack; heap entries whose packet is gone are dropped lazily.
+        self.retx_heap = []
+        self.retx_tie = itertools.count()
+        self.retx_cv = threading.Condition(self.send_lock)
         self.last_unreliable_seq_tx = None  # TX-side seq for unreliable sends
 
+        # flow/congestion control: at most min(cwnd, peer_rwnd) reliable messages in flight. Messages that got a
+        # seq but did not fit wait in send_backlog (send_mode="queue") and go out as ACKs open the window. Once
+        # send_backlog_limit wait there the sender waits too (send_backlog_waits counts it), whatever the mode.
+        self.send_mode = send_mode
+        self.send_backlog_limit = send_backlog_limit
+        self.send_backlog_waits = 0
+        self.cc = CongestionController(initial_cwnd, SEQ_MOD // 2 - 1, congestion_control)
+        self.peer_rwnd = WINDOW_UNLIMITED
+        self.tick_reliable = 0  # reliable frames in tick_frames, already counted as in flight
+        self.send_backlog = deque()  # (channel, seq, payload)
+        self.window_cv = threading.Condition(self.send_lock)  # signalled when ACKs open the window
+
+        # messages waiting to go out together: (channel, seq, payload). With bundle=True send() only queues here
+        # and the app calls flush() once per tick; otherwise every send flushes straight away.
+        self.bundle_mode = bundle
+        self.mtu = mtu
+        self.tick_frames = []
+        self.tick_bytes = 0
+        # reliable messages over the mtu go out as CH_FRAGMENT messages of fragment_chunk data bytes each
+        self.fragment = fragment
+        self.fragment_chunk = mtu - HEADER_SIZE - FRAGMENT_HEADER.size
+        # streams 1..MAX_STREAM: next stream seq of each, and the streams sent unordered
+        self.stream_tx_seq = [0] * (MAX_STREAM + 1)
+        self.unordered_streams = unordered_streams
+        # parity groups of what goes out, under send_lock; None without fec
+        self.fec_tx = FecSender(fec, fec_adaptive, fec_codec) if fec else None
+
         # reliable recv
-        self.recv_lock = threading.Lock()
+        self.recv_lock = new_lock("recv_lock", self.locks)
         self.expected_seq = 0
-        self.buffer = {}  # seq -> (ts_ms, payload)
-        self.gap_since_ms: Optional[int] = None
+        # reorder window: slot seq & (capacity - 1) holds (ts_ms, payload, arrival ms), the arrival time feeds the
+        # delivery delay histogram; bit d of rx_occupied means expected_seq + d is buffered. Anything further ahead
+        # than capacity is dropped (and not ACKed).
+        self.reorder_capacity = 1 << (recv_window - 1).bit_length()
+        self.rx_slots: List[Optional[Tuple[int, bytes, int]]] = [None] * self.reorder_capacity
+        self.rx_occupied = 0
+        self.rx_buffered = 0
+        self.reorder_dropped = 0
+        # monotonic time at which a missing head gets skipped, armed while packets wait behind it. The rx
+        # worker's receive timeout never runs past it, so the skip fires even if nothing else arrives.
+        self.gap_deadline: Optional[float] = None
+        # messages being put together from CH_FRAGMENT, under recv_lock like the reorder window
+        self.reassembly = Reassembly(reassembly_budget)
+        # per stream reorder buffers of CH_STREAM messages, rx thread only. Delays go to whatever histogram is
+        # current, reset_metrics() replaces them
+        self.streams = StreamSet(
+            self.reorder_capacity, gap_skip_timeout_ms,
+            lambda us: self.histograms[CH_RELIABLE].delivery_delay_us.record(us),
+        )
+
+        # rebuilds lost messages from the peer's parity packets, rx thread only
+        self.fec_rx = FecReceiver(fec_codec)
+        self.fec_late_recv = 0  # rebuilt unreliable messages delivered behind a newer one
 
-        self.retransmission_map = {}
+        # per-seq metadata reported by recv(), one ring per delivered channel; ack_meta keeps the sender's view
+        # (RTT and retries of every ACKed seq)
+        self.rx_meta = {CH_RELIABLE: SeqMetaRing(), CH_UNRELIABLE: SeqMetaRing(), CH_SNAPSHOT: SeqMetaRing()}
+        self.ack_meta = SeqMetaRing()
+
+        # peer clock estimate (rx thread only): offset and drift from the ACK exchange and clock probes, and the
+        # offset in whole ms that corrects the latency of every arrival
+        self.clock = ClockSync()
+        self.clock_offset_ms = 0
+
+        # ACK generation (rx thread only)
+        self.sack = SackTracker(ack_delay_ms)
+        self.recv_window = recv_window
+        self.adv_window = recv_window  # last window advertised to the peer
 
         # unreliable recv
         self.last_unreliable_seq_rx = None
 
+        # snapshots (gamenet_snapshot.py): snap_tx under snapshot_lock (taken before send_lock, never after it),
+        # snap_rx on the rx thread only
+        snapshot_codec = snapshot_codec if snapshot_codec is not None else XorRleCodec()
+        self.snapshot_lock = new_lock("snapshot_lock", self.locks)
+        self.snap_tx = SnapshotSender(snapshot_codec)
+        self.snap_rx = SnapshotReceiver(snapshot_codec)
+
         # messages ready to be delivered to the application: (channel, seq, ts_ms, payload)
         self.app_recv_q = deque()
-        self.app_recv_q_lock = threading.Lock()
+        self.app_recv_q_lock = new_lock("app_recv_q_lock", self.locks)
+        self.app_recv_cv = threading.Condition(self.app_recv_q_lock)  # signalled on every enqueue
         self.start_time = None
         self.end_time = None
         self.metric_mode = metric
-        self.data = []
-        
+        self.data = []  # per-session report rows, written to report_path by on_exit()
+        self.report_path = report_path
+        # snapshots of get_metrics()/get_percentiles() every metrics_interval_s to metrics_sinks; also prints the
+        # session reports, so nothing slow ever runs on the rx thread
+        self.exporter = MetricsExporter(lambda: metrics_snapshot(self), metrics_sinks, metrics_interval_s)
+        # packet trace, None unless trace_path is given (the packet paths only test trace for None)
+        self.tracer = PacketTrace(trace_path, trace_records) if trace_path else None
+        self.trace = self.tracer.recorder(peer_addr) if self.tracer is not None else None
 
     def start(self):
         self.start_time = now_ms()
         self.running = True
-        self.rx_thread = threading.Thread(target=self._rx_worker, daemon=True)
+        if self.send_thread:
+            self.writer = SendScheduler(
+                self.sock, self.pacing_rate_bps, self.pacing_burst_bytes, new_lock("writer_lock", self.locks),
+                on_sent=self._on_sent,
+            )
+        self.rx_thread = threading.Thread(target=self._rx_worker, name="gamenet-rx", daemon=True)
         self.rx_thread.start()
-        self.retx_thread = threading.Thread(target=self._retx_worker, daemon=True)
+        self.retx_thread = threading.Thread(target=self._retx_worker, name="gamenet-retx", daemon=True)
         self.retx_thread.start()
+        self.exporter.start()
 
     def close(self):
-        while True:
-            with self.send_lock:
-                if len(self.pkts_pending_ack.items()) == 0:
-                    break
+        self.flush()
+        self._wait_all_acked()
         payload = self.reli_packets_send.to_bytes(4,"big") + self.unreli_packets_send.to_bytes(4, "big")
         self._send_reliable(payload,True)
-        while True:
-            # wait for metric packet
-            with self.send_lock:
-                if len(self.pkts_pending_ack.items()) == 0:
-                    break
+        # wait for metric packet
+        self._wait_all_acked()
         self.running = False
+        with self.retx_cv:
+            self.retx_cv.notify_all()
+        self.exporter.close()
+        if self.writer is not None:
+            self.writer.close()
+        if self.tracer is not None:
+            self.tracer.flush()
         try:
             self.sock.close()
         except Exception:
             print("Failed to close sock")
             pass
 
-    def send(self, payload: bytes, reliable: bool = True) -> int:
+    def _wait_all_acked(self):
+        with self.send_lock:
+            while self.pkts_pending_ack or self.send_backlog:
+                # not on retx_cv: the writer's notify() when it arms a timer must reach the retx worker
+                self.window_cv.wait(0.01)
+
+    def send(self, payload: bytes, reliable: bool = True, stream: int = 0) -> int:
+        if stream:
+            if not reliable:
+                raise ValueError("streams are reliable, an unreliable message cannot go on a stream")
+            return self._send_stream(payload, stream)
         return self._send_reliable(payload) if reliable else self._send_unreliable(payload)
 
-    def _send_reliable(self, payload: bytes, is_metric = False) -> int:
+    def send_many(self, messages: Iterable[Tuple[bytes, bool]]) -> List[int]:
+        # Sends (payload, reliable) pairs packed into as few MTU sized datagrams as possible, returns their seqs
         with self.send_lock:
-            seq = self.next_reliable_seq
-            self.next_reliable_seq = (self.next_reliable_seq + 1) % SEQ_MOD
+            seqs = []
+            for payload, reliable in messages:
+                if reliable and self._needs_fragments(payload):
+                    seqs.append(self._send_fragments_locked(payload, False))
+                elif reliable and (self.send_backlog or not self._window_open()):
+                    # over the window: the message waits in the backlog and the bundle being built still goes out
+                    # whole (flushing it here would send the rest of the batch one message per datagram)
+                    if self.send_mode == "fail":
+                        self._flush_locked()
+                        raise BlockingIOError(f"send window full ({self._inflight()} reliable messages in flight)")
+                    seqs.append(self._backlog_msg(payload))
+                else:
+                    seqs.append(self._queue_msg(payload, CH_RELIABLE if reliable else CH_UNRELIABLE))
+            self._flush_locked()
+            if self.send_mode == "block":
+                # the backlog goes out, bundled, as ACKs open the window
+                while self.send_backlog:
+                    if not self.running:
+                        raise ConnectionError("GameNetAPI is not running")
+                    self.window_cv.wait(0.1)
+        return seqs
 
-            pkt = self._build_packet(CH_RELIABLE if not is_metric else CH_METRIC, seq, payload)
-            self.sock.sendto(pkt, self.peer_addr)
-            now = now_ms()
-            self.reli_packets_send += 1
+    def send_snapshot(self, state: bytes) -> int:
+        # Sends game state, unreliable and freshest-wins, as a delta against the newest snapshot the peer
+        # acknowledged (a keyframe if there is none). The peer's recv() returns the full state on CH_SNAPSHOT.
+        with self.snapshot_lock:
+            seq, payload = self.snap_tx.encode(state)
+            # still under snapshot_lock, so snapshots hit the wire in seq order
+            with self.send_lock:
+                self._queue_frame(CH_SNAPSHOT, seq, payload)
+                if not self.bundle_mode:
+                    self._flush_locked()
+        return seq
+
+    def flush(self):
+        # Sends everything queued by send() in bundling mode
+        with self.send_lock:
+            self._flush_locked()
+
+    def _send_reliable(self, payload: bytes, is_metric = False) -> int:
+        with self.send_lock:
+            # the metric packet is only sent once everything else is ACKed, it never waits for the window
+            if is_metric:
+                seq = self._queue_msg(payload, CH_METRIC)
+            elif self._needs_fragments(payload):
+                seq = self._send_fragments_locked(payload, True)
+            elif self._reserve_window():
+                seq = self._queue_msg(payload, CH_RELIABLE)
+            else:
+                return self._backlog_msg(payload)
+            if not self.bundle_mode or is_metric:
+                self._flush_locked()
+            return seq
 
-            # Add to packet to pending ack queue
-            self.pkts_pending_ack[seq] = {
-                "payload": payload,
-                "send_timestamp": now,
-                "last_tx": now,
-                "is_metric": is_metric,
-                "retries": 0,
-            }
+    def _send_stream(self, payload: bytes, stream: int) -> int:
+        # a CH_STREAM message; stream messages are never fragmented
+        if not 0 < stream <= MAX_STREAM:
+            raise ValueError(f"stream must be in 0..{MAX_STREAM}, got {stream}")
+        if HEADER_SIZE + STREAM_HEADER.size + len(payload) > self.mtu:
+            raise ValueError(f"a stream message must fit in one datagram (mtu {self.mtu}), got {len(payload)} bytes")
+        flags = STREAM_UNORDERED if stream in self.unordered_streams else 0
+        with self.send_lock:
+            stream_seq = self.stream_tx_seq[stream]
+            self.stream_tx_seq[stream] = (stream_seq + 1) % SEQ_MOD
+            msg = STREAM_HEADER.pack(stream, flags, stream_seq) + payload
+            if not self._reserve_window():
+                return self._backlog_msg(msg, CH_STREAM)
+            seq = self._queue_msg(msg, CH_STREAM)
+            if not self.bundle_mode:
+                self._flush_locked()
             return seq
 
+    def _inflight(self) -> int:
+        # caller holds send_lock
+        return len(self.pkts_pending_ack) + self.tick_reliable
+
+    def _window_open(self) -> bool:
+        # caller holds send_lock. A zero window still lets one message out when nothing is in flight, so its
+        # ACK brings back a fresh window (the receiver has no other reason to send one).
+        window = max(min(self.cc.window(), self.peer_rwnd), 1)
+        return self._inflight() < window
+
+    def _reserve_window(self) -> bool:
+        # caller holds send_lock. Returns True once a reliable message may go out now, False if it has to be
+        # queued in the backlog; raises BlockingIOError in "fail" mode.
+        if not self.send_backlog and self._window_open():
+            return True
+        if self.send_mode == "queue":
+            # the tick being built stays as it is, this message waits in the backlog behind it
+            return False
+        # messages held back for the tick only count against the window until they are sent, send them first
+        self._flush_locked()
+        if self.send_mode == "fail":
+            if self._window_open():
+                return True
+            raise BlockingIOError(f"send window full ({self._inflight()} reliable messages in flight)")
+        while not self._window_open():
+            if not self.running:
+                raise ConnectionError("GameNetAPI is not running")
+            self.window_cv.wait(0.1)
+        return True
+
+    def _backlog_msg(self, payload: bytes, ch: int = CH_RELIABLE) -> int:
+        # caller holds send_lock; the seq is assigned now so backlog messages keep their order on the wire
+        if len(self.send_backlog) >= self.send_backlog_limit:
+            # a sender faster than the ACKs would grow the backlog without bound: wait for room. The tick being
+            # built counts as in flight, it goes out first or no ACK would ever open the window.
+            self.send_backlog_waits += 1
+            self._flush_locked()
+            while len(self.send_backlog) >= self.send_backlog_limit:
+                if not self.running:
+                    raise ConnectionError("GameNetAPI is not running")
+                self.window_cv.wait(0.1)
+        seq = self.next_reliable_seq
+        self.next_reliable_seq = (self.next_reliable_seq + 1) % SEQ_MOD
+        self.reli_packets_send += 1
+        self.send_backlog.append((ch, seq, payload))
+        return seq
+
+    def _needs_fragments(self, payload: bytes) -> bool:
+        return self.fragment and HEADER_SIZE + len(payload) > self.mtu
+
+    def _send_fragments_locked(self, payload: bytes, reserve: bool) -> int:
+        # caller holds send_lock. Queues a reliable message too large for one datagram as CH_FRAGMENT messages on
+        # consecutive seqs, returns the seq of the first. Only the first fragment may raise in "fail" mode: once
+        # started, the rest of the message goes to the backlog when the window closes, so it always goes out
+        # whole. reserve=False (send_many()) never waits, the caller drains the backlog itself.
+        first = self.next_reliable_seq
+        for i, frag in enumerate(split_message(payload, self.fragment_chunk)):
+            if reserve and (i == 0 or self.send_mode == "block"):
+                ok = self._reserve_window()
+            else:
+                ok = not self.send_backlog and self._window_open()
+                if not ok and i == 0 and self.send_mode == "fail":
+                    self._flush_locked()
+                    raise BlockingIOError(f"send window full ({self._inflight()} reliable messages in flight)")
+            if ok:
+                self._queue_msg(frag, CH_FRAGMENT)
+            else:
+                self._backlog_msg(frag, CH_FRAGMENT)
+        return first
+
+    def _drain_backlog_locked(self):
+        # caller holds send_lock; sends queued messages as far as the window allows
+        if not self.send_backlog:
+            return
+        while self.send_backlog and self._window_open():
+            self._queue_frame(*self.send_backlog.popleft())
+        self._flush_locked()
+
     def _send_unreliable(self, payload: bytes) -> int:
         with self.send_lock:
+            seq = self._queue_msg(payload, CH_UNRELIABLE)
+            if not self.bundle_mode:
+                self._flush_locked()
+            return seq
+
+    def _queue_msg(self, payload: bytes, ch: int) -> int:
+        # caller holds send_lock; assigns the seq now, the datagram goes out on the next flush
+        if ch in RELIABLE_CHANNELS:
+            seq = self.next_reliable_seq
+            self.next_reliable_seq = (self.next_reliable_seq + 1) % SEQ_MOD
+            self.reli_packets_send += 1
+        else:
             seq = 0 if self.last_unreliable_seq_tx is None else (self.last_unreliable_seq_tx + 1) % SEQ_MOD
             self.last_unreliable_seq_tx = seq
-            pkt = self._build_packet(CH_UNRELIABLE, seq, payload)
-            self.sock.sendto(pkt, self.peer_addr)
             self.unreli_packets_send += 1
-            return seq
+        self._queue_frame(ch, seq, payload)
+        return seq
+
+    def _queue_frame(self, ch: int, seq: int, payload: bytes):
+        # caller holds send_lock
+        size = FRAME_HEADER_SIZE + len(payload)
+        if self.tick_frames and HEADER_SIZE + self.tick_bytes + size > self.mtu:
+            self._flush_locked()
+        self.tick_frames.append((ch, seq, payload))
+        self.tick_bytes += size
+        if ch in RELIABLE_CHANNELS:
+            self.tick_reliable += 1
+
+    def _flush_locked(self):
+        # caller holds send_lock
+        frames = self.tick_frames
+        if not frames:
+            return
+        reliable = self.tick_reliable
+        self.tick_frames = []
+        self.tick_bytes = 0
+        self.tick_reliable = 0
 
-    def recv(self, timeout_ms: int = 100) -> List[Tuple[int, int, int, bytes, int, int, int]]:
-        # Polls for delivered msgs and returns a list of (channel, seq, timestamp_ms, payload, received timestamp, latency, number of retranmissions)
-        end_time = now_ms() + max(0, timeout_ms)
+        # a lone message goes out as a plain packet, no bundle overhead
+        pkt = self._build_packet(*frames[0]) if len(frames) == 1 else build_bundle(frames)
+        now = now_ms()
+        if reliable:
+            # Add to packet to pending ack queue, retransmissions go out as standalone packets. A message that
+            # went out alone keeps its encoded frame so a retransmission only restamps it. The RTT clock and the
+            # retransmission timer start when the writer sends the datagram (_departed_locked).
+            departure = []
+            for ch, seq, payload in frames:
+                if ch not in RELIABLE_CHANNELS:
+                    continue
+                ent = {
+                    "payload": payload,
+                    "frame": pkt if len(frames) == 1 else None,
+                    "send_timestamp": now,
+                    "last_tx": now,
+                    "ch": ch,
+                    "retries": 0,
+                    "timer": None,
+                }
+                self.pkts_pending_ack[seq] = ent
+                departure.append((seq, ent, 0))
+            self._submit(pkt, PRIO_RELIABLE, None, (True, departure))
+        else:
+            # a newer lone unreliable message or snapshot replaces this one while it is still queued
+            key = frames[0][0] if self.supersede and len(frames) == 1 else None
+            if self._submit(pkt, PRIO_UNRELIABLE, key) and key == CH_UNRELIABLE:
+                # the replaced one never goes out: the peer's PDR must not count it as lost
+                self.unreli_packets_send -= 1
+        if self.trace is not None:
+            for ch, seq, payload in frames:
+                self.trace(TRACE_TX, ch, seq, now, len(payload), 0, 0)
+
+        if self.fec_tx is not None:
+            # parity goes out as soon as a group is complete, in its own datagram
+            for ch, seq, payload in frames:
+                for first, count, parity in self.fec_tx.add(ch, seq, payload):
+                    if ch in RELIABLE_CHANNELS:
+                        # the receiver can rebuild a lost member once the parity is out: from then on give every
+                        # member a full RTO before retransmitting it
+                        members = ((first + i) % SEQ_MOD for i in range(count))
+                        rearm = [(m, self.pkts_pending_ack[m], 0) for m in members if m in self.pkts_pending_ack]
+                        self._submit(self._build_packet(CH_FEC, first, parity), PRIO_RELIABLE, None, (False, rearm))
+                    else:
+                        self._submit(self._build_packet(CH_FEC, first, parity), PRIO_UNRELIABLE)
+                    if self.trace is not None:
+                        self.trace(TRACE_TX, CH_FEC, first, now, len(parity), 0, 0)
+
+    def _on_sent(self, departed: list):
+        # writer thread: departure tokens of datagrams that just went out
+        with self.send_lock:
+            for sent in departed:
+                self._departed_locked(sent)
+
+    def _departed_locked(self, sent: tuple):
+        # caller holds send_lock. sent: (stamp, [(seq, entry, retries)]) of a datagram that left; every entry still
+        # pending at that transmission gets its retransmission timer, from now. stamp: the datagram carried the
+        # entries, their RTT clock starts now too (False for FEC parity, which only re-arms its members)
+        stamp, entries = sent
+        now = None
+        for seq, ent, retries in entries:
+            if self.pkts_pending_ack.get(seq) is not ent or ent["retries"] != retries:
+                continue
+            if stamp:
+                now = now_ms() if now is None else now
+                ent["last_tx"] = now
+                if not retries:
+                    ent["send_timestamp"] = now
+            self._schedule_retx(seq, ent)
+
+    def _schedule_retx(self, seq: int, ent: dict):
+        # caller holds send_lock. An entry has one live timer, rescheduling it leaves the old heap entry stale
+        deadline = time.monotonic() + self.rto.timeout_ms(ent["retries"]) / 1000
+        ent["timer"] = tie = next(self.retx_tie)
+        heapq.heappush(self.retx_heap, (deadline, tie, seq, ent))
+        if self.retx_heap[0][3] is ent:
+            # new earliest deadline, wake the retx worker so it does not oversleep
+            self.retx_cv.notify()
+
+    def recv(self, timeout_ms: int = 100) -> List[Tuple[int, int, int, bytes, int, int, int, int]]:
+        # Waits for delivered msgs and returns a list of (channel, seq, timestamp_ms, payload, received timestamp, latency, number of retranmissions, stream)
+        deadline = time.monotonic() + max(0, timeout_ms) / 1000
 
         received_packets = []
-        while now_ms() < end_time:
-            with self.app_recv_q_lock:
-                if self.app_recv_q:
-                    packet_details = self.app_recv_q.popleft()
-                    seq = packet_details[1]
-                    packet_details = packet_details + self.retransmission_map[seq]
-                    received_packets.append(packet_details)
-
-                    # received_packets.append(self.app_recv_q.popleft())
-                    break # return as soon as one packet arrives
-            time.sleep(0.005)
-
-        # Drain a small batch of requests (batched to reduce syscalls)
-        with self.app_recv_q_lock:
-            while self.app_recv_q and len(received_packets) < 64:
-                packet_details = self.app_recv_q.popleft()
-                seq = packet_details[1]
-                packet_details = packet_details + self.retransmission_map[seq]
-                received_packets.append(packet_details)
+        with self.app_recv_cv:
+            # sleep until the rx thread enqueues something (or we time out), no polling
+            while not self.app_recv_q:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return received_packets
+                self.app_recv_cv.wait(remaining)
 
-                # received_packets.append(self.app_recv_q.popleft())
+            # Drain a small batch of requests
+            while self.app_recv_q and len(received_packets) < 64:
+                received_packets.append(self._app_msg(self.app_recv_q.popleft()))
 
+        if self.adv_window < self.recv_window // 4:
+            self._send_window_update()
         return received_packets
 
+    def _app_msg(self, packet_details: tuple) -> Tuple[int, int, int, bytes, int, int, int, int]:
+        # appends (received timestamp, latency, retransmissions) and the stream to a queued message, which is
+        # (channel, seq, ts_ms, payload) or, from a stream, (channel, seq, ts_ms, payload, stream)
+        ch, seq = packet_details[0], packet_details[1]
+        if len(packet_details) == 4:
+            return packet_details + self.rx_meta[ch].get(seq) + (0,)
+        return packet_details[:4] + self.rx_meta[ch].get(seq) + packet_details[4:]
+
     def _build_packet(self, chan: int, seq: int, payload: bytes) -> bytes:
-        timestamp = now_ms()
-        head_without_crc = chan.to_bytes(1, "big") + seq.to_bytes(2, "big") + timestamp.to_bytes(4, "big")
-        crc = zlib.crc32(head_without_crc + payload) & 0xFFFFFFFF
-        header = head_without_crc + crc.to_bytes(4, "big")
-        return header + payload
+        return build_packet(chan, seq, payload)
 
     def _parse_packet(self, data: bytes) -> Tuple[int, int, int,  bytes]:
-        if len(data) < HEADER_SIZE:
-            raise ValueError("packet is too small (packet size < header size)")
-
-        ch = int.from_bytes(data[0:1], "big")
-        seq = int.from_bytes(data[1:3], "big")
-        timestamp = int.from_bytes(data[3:7], "big")
-        crc = int.from_bytes(data[7:11], "big")
-        payload = data[11:]
+        return parse_packet(data)
 
-        computed_crc = zlib.crc32(data[0:7] + payload) & 0xFFFFFFFF
-        if computed_crc != crc:
-            raise ValueError("bad crc")
+    def _sendto(self, pkt: bytes):
+        self.sock.sendto(pkt, self.peer_addr)
 
-        return ch, seq, timestamp, payload
+    def _submit(self, pkt: bytes, prio: int = PRIO_RELIABLE, key=None, sent=None) -> bool:
+        # caller holds send_lock. A packet (or a retransmission): queued for the writer thread in its priority
+        # class, sent inline before start() or without one; sent is its departure token (see _departed_locked).
+        # True if it superseded a queued packet (see SendScheduler)
+        if self.writer is not None:
+            return self.writer.submit(pkt, self.peer_addr, prio, key, sent)
+        self._sendto(pkt)
+        if sent is not None:
+            self._departed_locked(sent)
+        return False
 
     def _rx_worker(self):
+        views = [memoryview(buf) for buf in self.rx_pool]
+        header_views = [view[0:CRC_OFFSET] for view in views]  # the CRC'd header bytes, always at the start of a buffer
+        lengths = [0] * RX_BATCH
+        unpack_header = HEADER.unpack_from
+        crc32 = zlib.crc32
+        rcv_timeout = None
         while self.running:
+            # skip an expired gap and flush a due ACK, then wake up in time for the next of either
+            self._skip_gap()
+            stream_deadline = self._skip_stream_gaps()
+            self._flush_ack(False)
+            timeout = RX_IDLE_TIMEOUT
+            now = time.monotonic()
+            if self.sack.due is not None:
+                timeout = min(timeout, max(self.sack.due - now, 0.001))
+            if self.gap_deadline is not None:
+                timeout = min(timeout, max(self.gap_deadline - now, 0.001))
+            if stream_deadline is not None:
+                timeout = min(timeout, max(stream_deadline - now, 0.001))
+            if timeout != rcv_timeout:
+                set_rx_timeout(self.sock, timeout)
+                rcv_timeout = timeout
+
+            # block (kernel side, SO_RCVTIMEO) for the first datagram, then drain what is already queued
+            n = 0
             try:
-                data, _ = self.sock.recvfrom(65535)
-            except socket.timeout:
-                continue
+                lengths[0] = self.sock.recv_into(self.rx_pool[0])
+                n = 1
+                while n < RX_DRAIN:
+                    lengths[n] = self.sock.recv_into(self.rx_pool[n], 0, MSG_DONTWAIT)
+                    n += 1
+            except (BlockingIOError, socket.timeout):
+                if n == 0:
+                    continue
             except OSError:
                 break
 
             recv_timestamp = now_ms()
-            try:
-                ch, seq, send_timestamp, payload = self._parse_packet(data)
-                latency  = recv_timestamp - send_timestamp
-            except Exception as e:
-                #print(f"Dropped bad packet with error: {e}")
-                continue
+            for i in range(n):
+                size = lengths[i]
+                if size < HEADER_SIZE:
+                    continue
+                # parse in place: header via unpack_from, payload as a view, CRC fed incrementally
+                ch, seq, send_timestamp, crc = unpack_header(self.rx_pool[i])
+                payload = views[i][HEADER_SIZE:size]
+                if crc32(payload, crc32(header_views[i])) != crc:
+                    if self.trace is not None:
+                        self.trace(TRACE_DROP, ch, seq, send_timestamp, size - HEADER_SIZE, 0, 0)
+                    continue
 
-            if ch == CH_ACK:
-                # Consume ACK (not delivered to app)
-                with self.send_lock:
-                    packet_awaiting_ack = self.pkts_pending_ack.pop(seq, None)
-                    if packet_awaiting_ack:
-                        rtt = recv_timestamp - packet_awaiting_ack["send_timestamp"]
-                        retries = packet_awaiting_ack["retries"]
-                        self.retransmission_map[seq] = (recv_timestamp, rtt, retries) 
+                # payload is a view into the pool: anything kept past this batch is copied once, on accept
+                self._dispatch(ch, seq, send_timestamp, payload, recv_timestamp)
 
-                        #print("ack", "rx", CH_RELIABLE, seq, packet_awaiting_ack["send_timestamp"], recv_timestamp, rtt, retries, 0)
-                continue
+            # the peer is sending: probe its clock if no ACK has given an exchange lately
+            if self.clock.probe_due(time.monotonic()):
+                self._send_clock(CLOCK_PROBE)
 
-            if ch == CH_RELIABLE:
-                # ACK it
-                self._send_ack(seq)
-                
-                if seq in self.retransmission_map:
-                    self.retransmission_map[seq] = (recv_timestamp, latency, self.retransmission_map[seq][2] + 1)
-                else:
-                    self.retransmission_map[seq] = (recv_timestamp, latency, 0)
-
-                #print("data", "rx", CH_RELIABLE, seq, send_timestamp, recv_timestamp, latency, 0, len(payload))
-                self._handle_reliable_rx(seq, send_timestamp, payload, latency)
-            elif ch == CH_UNRELIABLE:
-                # retain only freshest data
-                to_deliver_to_app = False
-                if self.last_unreliable_seq_rx is None:
-                    to_deliver_to_app = True
+    def _dispatch(self, ch: int, seq: int, send_timestamp: int, payload: bytes, recv_timestamp: int):
+        # one-way: send_timestamp is on the peer's clock, moved onto ours by the estimated offset
+        latency = ts_diff(recv_timestamp, send_timestamp) + self.clock_offset_ms
+        if self.trace is not None and ch != CH_BUNDLE:
+            self.trace(TRACE_RX, ch, seq, send_timestamp, len(payload), 0, 0)
+        if ch == CH_ACK:
+            # Consume ACK (not delivered to app)
+            echo = ack_echo(payload)
+            if echo is not None:
+                self._clock_sample(echo[0], echo[1], send_timestamp, recv_timestamp)
+            self._handle_ack(seq, payload, recv_timestamp)
+            return
+        if ch == CH_CLOCK:
+            if seq == CLOCK_PROBE:
+                self._send_clock(CLOCK_REPLY, ECHO.pack(send_timestamp, recv_timestamp))
+            elif len(payload) >= ECHO.size:
+                t1, t2 = ECHO.unpack_from(payload)
+                self._clock_sample(t1, t2, send_timestamp, recv_timestamp)
+            return
+        if ch == CH_SNAPSHOT_ACK:
+            with self.snapshot_lock:
+                self.snap_tx.on_ack(seq)
+            return
+
+        if ch == CH_BUNDLE:
+            # several messages packed by send_many()/flush(), each with its own channel and seq
+            for sub_ch, sub_seq, sub_payload in iter_bundle(payload):
+                if sub_ch != CH_BUNDLE:
+                    self._dispatch(sub_ch, sub_seq, send_timestamp, sub_payload, recv_timestamp)
+            return
+
+        if self.fec_rx.history:
+            # kept for rebuilding the other messages of its parity group
+            self.fec_rx.note(ch, seq, payload)
+
+        if ch == CH_RELIABLE or ch == CH_FRAGMENT:
+            self.rx_meta[CH_RELIABLE].note_arrival(seq, recv_timestamp, latency)
+
+            if self._handle_reliable_rx(seq, send_timestamp, payload, latency, recv_timestamp, ch):
+                # ACK it (possibly coalesced with the ACKs of the packets that follow)
+                self.sack.note(seq, send_timestamp, recv_timestamp)
+        elif ch == CH_STREAM:
+            self.rx_meta[CH_RELIABLE].note_arrival(seq, recv_timestamp, latency)
+            if self._handle_stream_rx(seq, send_timestamp, payload, latency, recv_timestamp):
+                self.sack.note(seq, send_timestamp, recv_timestamp)
+        elif ch == CH_UNRELIABLE:
+            self._handle_unreliable_rx(seq, send_timestamp, payload, latency, recv_timestamp)
+        elif ch == CH_SNAPSHOT:
+            state = self.snap_rx.decode(seq, payload)
+            if state is not None:
+                # every rebuilt snapshot is acknowledged, it is the baseline the peer may encode against next
+                self._send_snapshot_ack(seq)
+                self.histograms[CH_SNAPSHOT].latency_us.record(latency * 1000)
+                self.rx_meta[CH_SNAPSHOT].put(seq, recv_timestamp, latency)
+                self._deliver_to_app((CH_SNAPSHOT, seq, send_timestamp, state))
+        elif ch == CH_FEC:
+            # rebuilt messages take the normal path, stamped with the parity packet's timestamp. A rebuilt
+            # unreliable message never arrived, so it is delivered even behind a newer one (see gamenet_fec.py)
+            for sub_ch, sub_seq, sub_payload in self.fec_rx.recover(seq, payload):
+                if sub_ch == CH_UNRELIABLE:
+                    self.fec_rx.note(sub_ch, sub_seq, sub_payload)
+                    self._handle_unreliable_rx(sub_seq, send_timestamp, sub_payload, latency, recv_timestamp, True)
                 else:
-                    diff = (seq - self.last_unreliable_seq_rx + SEQ_MOD) % SEQ_MOD
-                    if 0 < diff < SEQ_MOD // 2:
-                        to_deliver_to_app = True
-                if to_deliver_to_app:
-                    self.last_unreliable_seq_rx = seq
-                    self.unreli_packets_recv += 1
-                    self.unreli_total_bytes += len(payload)
-                    self.unreli_total_latency += latency 
-                    self.unreli_latency_sq += pow(latency, 2)
-                    
-                    if self.unreli_last_transit is not None:
-                        d = abs(latency - self.unreli_last_transit)
-                        self.unreli_jitter += (d - self.unreli_jitter)/16
-                    self.unreli_last_transit = latency
-                    self.retransmission_map[seq] = (recv_timestamp, latency, 0)
-
-                    with self.app_recv_q_lock:
-                        self.app_recv_q.append((CH_UNRELIABLE, seq, send_timestamp, payload))
-                #else:
-                    #print(f"UNRELIABLE CHANNEL: dropped old seq={seq}")
-            elif ch == CH_METRIC:
-                self.end_time = now_ms()
-                total_reli= int.from_bytes(payload[0:4],"big")
-                total_unreli = int.from_bytes(payload[4:],"big")
-                self._send_ack(seq)
-                self.print_metrics(total_reli, total_unreli)
-                self.last_unreliable_seq_rx = None
-                self.expected_seq = 0
-            else:
-                print(f"Unknown channel: {ch}")
+                    self._dispatch(sub_ch, sub_seq, send_timestamp, sub_payload, recv_timestamp)
+        elif ch == CH_METRIC:
+            self.end_time = now_ms()
+            total_reli= int.from_bytes(payload[0:4],"big")
+            total_unreli = int.from_bytes(payload[4:],"big")
+            self._flush_ack(True)
+            # the metric packet ends the sender's session: ACK exactly it and start over from seq 0
+            self._send_ack((seq + 1) % SEQ_MOD, bytes(SACK_BITS // 8))
+            self.exporter.submit(self.print_metrics, self._session_report(total_reli, total_unreli))
+            self.last_unreliable_seq_rx = None
+            self.snap_rx.reset()
+            self.fec_rx.reset()
+            self._reset_reorder()
+            self.sack.reset()
+            # the next session may come from a restarted peer, with a clock of its own
+            self.clock.reset()
+            self.clock_offset_ms = 0
+            # the next session starts over at seq 0, its arrivals must not count as repeats of this one's
+            self.rx_meta[CH_RELIABLE].reset()
+        else:
+            print(f"Unknown channel: {ch}")
+
+    def _handle_unreliable_rx(self, seq: int, ts_ms: int, payload: bytes, latency: int, arrival_ms: int,
+                              rebuilt: bool = False):
+        # retain only freshest data; a message rebuilt from FEC parity is delivered even if a newer one already was
+        fresh = self.last_unreliable_seq_rx is None or 0 < (seq - self.last_unreliable_seq_rx) % SEQ_MOD < SEQ_MOD // 2
+        if not fresh and not rebuilt:
+            #print(f"UNRELIABLE CHANNEL: dropped old seq={seq}")
+            return
+        if fresh:
+            self.last_unreliable_seq_rx = seq
+        else:
+            self.fec_late_recv += 1
+        self.unreli_packets_recv += 1
+        self.unreli_total_bytes += len(payload)
+        self.unreli_total_latency += latency
+        self.unreli_latency_sq += pow(latency, 2)
+
+        if self.unreli_last_transit is not None:
+            d = abs(latency - self.unreli_last_transit)
+            self.unreli_jitter += (d - self.unreli_jitter)/16
+        self.unreli_last_transit = latency
+        self.histograms[CH_UNRELIABLE].latency_us.record(latency * 1000)
+        self.rx_meta[CH_UNRELIABLE].put(seq, arrival_ms, latency)
+
+        self._deliver_to_app((CH_UNRELIABLE, seq, ts_ms, bytes(payload)))
+
+    def _deliver_to_app(self, msg: Tuple[int, int, int, bytes]):
+        with self.app_recv_cv:
+            self.app_recv_q.append(msg)
+            self.app_recv_cv.notify()
+
+    def _deliver_many_to_app(self, msgs: List[Tuple[int, int, int, bytes]]):
+        with self.app_recv_cv:
+            self.app_recv_q.extend(msgs)
+            self.app_recv_cv.notify()
 
     def _is_seq_behind(self, a: int, b: int) -> bool:
         # True if 'a' is older than 'b' in modulo space (within half-range)
         return 0 < (b - a + SEQ_MOD) % SEQ_MOD < (SEQ_MOD // 2)
 
-    def _handle_reliable_rx(self, seq: int, ts_ms: int, payload: bytes, latency: int):
-        # buffer out of order packets
-        # deliver in order at expected_seq
+    def _handle_reliable_rx(self, seq: int, ts_ms: int, payload: bytes, latency: int, arrival_ms: int,
+                            ch: int = CH_RELIABLE) -> bool:
+        # buffer out of order packets in the reorder window, deliver in order at expected_seq. A fragment is copied
+        # into its message buffer and only its FragmentMark takes the slot.
+        # Returns False if the packet was dropped for lying beyond the window or the reassembly budget (or is a
+        # malformed fragment), so it is not ACKed.
         with self.recv_lock:
-            # drop late arrivals for already skipped heads
-            if self._is_seq_behind(seq, self.expected_seq):
-                return
+            offset = (seq - self.expected_seq) % SEQ_MOD
+            # late arrival for an already delivered or skipped head, ACK it again
+            if offset >= SEQ_MOD // 2:
+                return True
+            if offset >= self.reorder_capacity:
+                self.reorder_dropped += 1
+                return False
 
             # Duplicate data detected. We drop it as we use a (modified) selective repeat.
-            if seq in self.buffer:
-                return
+            bit = 1 << offset
+            if self.rx_occupied & bit:
+                return True
+            size = len(payload)
+            if ch == CH_FRAGMENT:
+                payload = self.reassembly.put(seq, payload, self.expected_seq)
+                if payload is None:
+                    return False
+                size -= FRAGMENT_HEADER.size
 
-            # Buffer this out-of-order or head candidate
-            self.buffer[seq] = (ts_ms, payload)
-
-            self.reli_packets_recv += 1
-            self.reli_total_latency += latency
-            self.reli_latency_sq += pow(latency, 2)
-            self.reli_total_bytes += len(payload)
-            if self.reli_last_transit is not None:
-                d = abs(latency - self.reli_last_transit)
-                self.reli_jitter += (d - self.reli_jitter)/16
-            self.reli_last_transit = latency
-            
-            while True:
-                # If the current head-of-line is present, deliver it and advance
-                if self.expected_seq in self.buffer:
-                    head_timestamp_ms, head_payload = self.buffer.pop(self.expected_seq)
-                    with self.app_recv_q_lock:
-                        self.app_recv_q.append((CH_RELIABLE, self.expected_seq, head_timestamp_ms, head_payload))
-
-                    # Delivered head, so we clear gap timer and move expected forward
-                    self.gap_since_ms = None
-                    self.expected_seq = (self.expected_seq + 1) % SEQ_MOD
-                    continue
+            self._note_reliable_rx(size, latency)
+            hist = self.histograms[CH_RELIABLE]
 
-                # Missing head-of-line (gap)
-                now = now_ms()
-                if self.gap_since_ms is None:
-                    # Start gap timer
-                    self.gap_since_ms = now
-                    break
+            if offset == 0 and not self.rx_occupied:
+                # in-order arrival with nothing buffered: straight to the app
+                self.expected_seq = (seq + 1) % SEQ_MOD
+                hist.delivery_delay_us.record(0)
+                if ch != CH_FRAGMENT:
+                    self._deliver_to_app((CH_RELIABLE, seq, ts_ms, bytes(payload)))
                 else:
-                    # If we've waited long enough, skip the missing head to keep moving, we expect to receive
-                    # the missing packet later handled by retransmit worker.
-                    if now - self.gap_since_ms >= self.gap_skip_timeout_ms:
-                        #print(f"RELIABLE skip seq={self.expected_seq}")
-                        self.expected_seq = (self.expected_seq + 1) % SEQ_MOD
-                        self.gap_since_ms = now # restart gap timer for the new head
-                        continue
-                    break
+                    done = self.reassembly.complete(payload)
+                    if done is not None:
+                        self._deliver_to_app((CH_RELIABLE, done[0], ts_ms, done[1]))
+                return True
 
-    def _send_ack(self, seq: int):
-        pkt = self._build_packet(CH_ACK, seq, b"")
-        self.sock.sendto(pkt, self.peer_addr)
+            # Buffer this out-of-order or head candidate, with its arrival time for the delivery delay
+            if ch != CH_FRAGMENT:
+                payload = bytes(payload)
+            self.rx_slots[seq & (self.reorder_capacity - 1)] = (ts_ms, payload, arrival_ms)
+            self.rx_occupied |= bit
+            self.rx_buffered += 1
+            if offset == 0:
+                self._drain_reliable_locked()
+            elif self.gap_deadline is None:
+                # first packet behind a missing head: start the gap timer
+                self.gap_deadline = time.monotonic() + self.gap_skip_timeout_ms / 1000
+            return True
+
+    def _note_reliable_rx(self, size: int, latency: int):
+        # stats of a new reliable message, whatever its channel
+        self.reli_packets_recv += 1
+        self.reli_total_latency += latency
+        self.reli_latency_sq += pow(latency, 2)
+        self.reli_total_bytes += size
+        if self.reli_last_transit is not None:
+            d = abs(latency - self.reli_last_transit)
+            self.reli_jitter += (d - self.reli_jitter)/16
+        self.reli_last_transit = latency
+        self.histograms[CH_RELIABLE].latency_us.record(latency * 1000)
+
+    def _handle_stream_rx(self, seq: int, ts_ms: int, payload: bytes, latency: int, arrival_ms: int) -> bool:
+        # Orders a CH_STREAM message within its stream only. Its seq also fills its place in the reorder window,
+        # without a payload, so the reliable channel (stream 0) keeps the connection wide order but never
+        # delivers it. Returns False if the message must not be ACKed (beyond the window, see StreamSet.put).
+        with self.recv_lock:
+            offset = (seq - self.expected_seq) % SEQ_MOD
+            if self.reorder_capacity <= offset < SEQ_MOD // 2:
+                self.reorder_dropped += 1
+                return False
+            ready = []
+            accepted = self.streams.put(seq, ts_ms, payload, arrival_ms, ready)
+            if accepted is None:
+                return False
+            if accepted:
+                self._note_reliable_rx(len(payload) - STREAM_HEADER.size, latency)
+            bit = 1 << offset
+            if offset < SEQ_MOD // 2 and not self.rx_occupied & bit:
+                if offset == 0 and not self.rx_occupied:
+                    self.expected_seq = (seq + 1) % SEQ_MOD
+                else:
+                    self.rx_slots[seq & (self.reorder_capacity - 1)] = (ts_ms, None, arrival_ms)
+                    self.rx_occupied |= bit
+                    self.rx_buffered += 1
+                    if offset == 0:
+                        self._drain_reliable_locked()
+                    elif self.gap_deadline is None:
+                        self.gap_deadline = time.monotonic() + self.gap_skip_timeout_ms / 1000
+            if ready:
+                self._deliver_many_to_app(ready)
+            return True
+
+    def _skip_stream_gaps(self) -> Optional[float]:
+        # rx thread: delivers what waited behind expired stream gaps, returns the next stream gap deadline
+        deadline = self.streams.next_deadline()
+        if deadline is None or time.monotonic() < deadline:
+            return deadline
+        ready = []
+        self.streams.skip_gaps(ready)
+        if ready:
+            self._deliver_many_to_app(ready)
+        return self.streams.next_deadline()
+
+    def _drain_reliable_locked(self):
+        # caller holds recv_lock. Delivers the run of consecutive packets at the head in one pass (one
+        # app_recv_q_lock round trip) and restarts the gap timer if packets are left behind a new gap.
+        occupied = self.rx_occupied
+        run = (~occupied & (occupied + 1)).bit_length() - 1
+        if run:
+            slots = self.rx_slots
+            mask = self.reorder_capacity - 1
+            seq = self.expected_seq
+            ready = []
+            now = now_ms()
+            record_delay = self.histograms[CH_RELIABLE].delivery_delay_us.record
+            for _ in range(run):
+                head_timestamp_ms, head_payload, arrival_ms = slots[seq & mask]
+                slots[seq & mask] = None
+                if head_payload is None:
+                    # a stream message, delivered by its stream
+                    pass
+                elif type(head_payload) is not FragmentMark:
+                    ready.append((CH_RELIABLE, seq, head_timestamp_ms, head_payload))
+                    record_delay(ts_diff(now, arrival_ms) * 1000)
+                else:
+                    # a fragment: the message goes out with its last one, under the seq of its first
+                    done = self.reassembly.complete(head_payload)
+                    if done is not None:
+                        ready.append((CH_RELIABLE, done[0], head_timestamp_ms, done[1]))
+                    record_delay(ts_diff(now, arrival_ms) * 1000)
+                seq = (seq + 1) % SEQ_MOD
+            self.expected_seq = seq
+            self.rx_occupied = occupied >> run
+            self.rx_buffered -= run
+            if ready:
+                self._deliver_many_to_app(ready)
+        self.gap_deadline = time.monotonic() + self.gap_skip_timeout_ms / 1000 if self.rx_occupied else None
+
+    def _skip_gap(self):
+        # rx thread. Once the gap timer expires, give up on the missing head (and every other missing seq before
+        # the first buffered one: all of them were sent before it) and deliver what was waiting behind it. The
+        # skipped packets are still ACKed if they turn up later, just never delivered.
+        if self.gap_deadline is None or time.monotonic() < self.gap_deadline:
+            return
+        with self.recv_lock:
+            occupied = self.rx_occupied
+            if not occupied:
+                self.gap_deadline = None
+                return
+            hole = (occupied & -occupied).bit_length() - 1
+            #print(f"RELIABLE skip seq={self.expected_seq}..{self.expected_seq + hole - 1}")
+            self.expected_seq = (self.expected_seq + hole) % SEQ_MOD
+            self.rx_occupied = occupied >> hole
+            # messages with a skipped fragment before the new head will never complete
+            self.reassembly.expire(self.expected_seq)
+            self._drain_reliable_locked()
+
+    def _reset_reorder(self):
+        with self.recv_lock:
+            self.rx_slots = [None] * self.reorder_capacity
+            self.rx_occupied = 0
+            self.rx_buffered = 0
+            self.gap_deadline = None
+            self.expected_seq = 0
+            self.reassembly.reset()
+            self.streams.reset()
+
+    def _flush_ack(self, force: bool):
+        if self.sack.due is None or (not force and time.monotonic() < self.sack.due):
+            return
+        self.adv_window = self._recv_window_free()
+        self._send_ack(*self.sack.take(self.adv_window))
+
+    def _send_window_update(self):
+        # the app freed space after we advertised an (almost) closed window: tell the sender right away instead
+        # of waiting for its next probe. Only the cumulative seq is repeated, never the SACK state, so this is
+        # safe to send from the app thread.
+        free = self._recv_window_free()
+        if free < self.recv_window // 2:
+            return
+        self.adv_window = free
+        self._send_ack(self.sack.base, bytes(SACK_BITS // 8) + free.to_bytes(2, "big"))
+
+    def _recv_window_free(self) -> int:
+        # reliable messages this side can still take: reorder buffer plus messages the app has not read yet
+        with self.app_recv_q_lock:
+            used = self.rx_buffered + self.streams.buffered + len(self.app_recv_q)
+        return max(self.recv_window - used, 0)
+
+    def _send_ack(self, cum_seq: int, sack_payload: bytes):
+        pkt = self._build_packet(CH_ACK, cum_seq, sack_payload)
+        try:
+            self._sendto(pkt)
+        except OSError:
+            pass
+        if self.trace is not None:
+            self.trace(TRACE_TX, CH_ACK, cum_seq, now_ms(), len(sack_payload), 0, 0)
+
+    def _send_clock(self, seq: int, payload: bytes = b""):
+        # a clock probe, or the reply to the peer's (rx thread)
+        try:
+            self._sendto(self._build_packet(CH_CLOCK, seq, payload))
+        except OSError:
+            pass
+        if self.trace is not None:
+            self.trace(TRACE_TX, CH_CLOCK, seq, now_ms(), len(payload), 0, 0)
+
+    def _clock_sample(self, t1: int, t2: int, t3: int, t4: int):
+        # rx thread: an exchange with the peer (see gamenet_clock.py), moves the latency correction along
+        offset = self.clock.sample(t1, t2, t3, t4)
+        if offset is not None:
+            self.clock_offset_ms = round(offset)
+
+    def _send_snapshot_ack(self, seq: int):
+        try:
+            self._sendto(self._build_packet(CH_SNAPSHOT_ACK, seq, b""))
+        except OSError:
+            pass
+        if self.trace is not None:
+            self.trace(TRACE_TX, CH_SNAPSHOT_ACK, seq, now_ms(), 0, 0, 0)
+
+    def _handle_ack(self, seq: int, payload: bytes, recv_timestamp: int):
+        with self.send_lock:
+            acked, self.snd_una, rtt_sample = ack_pending(
+                self.pkts_pending_ack, seq, payload, self.snd_una, self.next_reliable_seq, recv_timestamp,
+                self.histograms[CH_RELIABLE],
+            )
+            for s, ent, rtt in acked:
+                self.ack_meta.put(s, recv_timestamp, rtt, ent["retries"])
+            if self.fec_tx is not None:
+                for s, ent, rtt in acked:
+                    self.fec_tx.on_ack(ent["retries"] > 0)
+            if self.trace is not None:
+                for s, ent, rtt in acked:
+                    self.trace(TRACE_ACKED, ent["ch"], s, ent["send_timestamp"], len(ent["payload"]), ent["retries"], rtt)
+            if rtt_sample is not None:
+                self.rto.sample(rtt_sample)
+            window = ack_window(payload)
+            if window is not None:
+                self.peer_rwnd = window
+            if acked:
+                self.cc.on_ack(len(acked))
+                if self.writer is not None and self.writer.auto:
+                    delivered = sum(HEADER_SIZE + len(ent["payload"]) for _, ent, _ in acked)
+                    self.writer.on_delivered(delivered)
+            self._drain_backlog_locked()
+            self.window_cv.notify_all()
 
     def _retx_worker(self):
         while self.running:
-            now = now_ms()
             to_retx = []
-            with self.send_lock:
-                for seq, ent in list(self.pkts_pending_ack.items()):
-                    if now - ent["last_tx"] >= self.retransmission_timeout_ms:
-                        to_retx.append((seq, ent))
+            with self.retx_cv:
+                while self.running:
+                    now = time.monotonic()
+                    heap = self.retx_heap
+                    while heap and heap[0][0] <= now:
+                        _, tie, seq, ent = heapq.heappop(heap)
+                        # stale entry: packet was ACKed (or its seq reused) or its timer rescheduled since
+                        if self.pkts_pending_ack.get(seq) is ent and ent["timer"] == tie:
+                            to_retx.append((seq, ent))
+                    if to_retx:
+                        self.cc.on_loss(now, self.rto.rto_ms / 1000)
+                        break
+                    # sleep until the next real deadline, or until a send schedules an earlier one
+                    self.retx_cv.wait(heap[0][0] - now if heap else None)
 
             for seq, ent in to_retx:
-                pkt = self._build_packet(CH_RELIABLE if not ent["is_metric"] else CH_METRIC, seq, ent["payload"])
-                try:
-                    self.sock.sendto(pkt, self.peer_addr)
-                except OSError:
-                    return
-                now2 = now_ms()
-
-                # Update bookkeeping under lock in case ACK popped it simultaneously
-                with self.send_lock:
-                    cur = self.pkts_pending_ack.get(seq)
-                    if cur is not None:
-                        cur["last_tx"] = now2
-                        cur["retries"] += 1
-                        retries_print = cur["retries"]
-                        send_ts_print = cur["send_timestamp"]
-                    else:
-                        # entry was ACKed and removed, skip printing
-                        retries_print = None
-                        send_ts_print = None
+                pkt = ent["frame"]
+                if pkt is None:
+                    # first retransmission of a bundled message: encode its standalone frame once
+                    pkt = ent["frame"] = self._build_packet(ent["ch"], seq, ent["payload"])
+                else:
+                    # restamp a copy, the previous transmission may still be queued in the writer
+                    pkt = ent["frame"] = bytearray(pkt)
+                    restamp(pkt, now_ms(), ent["payload"])
 
-                #if retries_print is not None:
-                    #print("data_retx", "tx", CH_RELIABLE, seq, send_ts_print, "", "", retries_print, len(ent["payload"]))
-            time.sleep(0.01)
+            # under lock in case an ACK popped them meanwhile; the next timer starts when the writer sends them
+            with self.send_lock:
+                for seq, ent in to_retx:
+                    if self.pkts_pending_ack.get(seq) is not ent:
+                        continue
+                    ent["retries"] += 1
+                    try:
+                        self._submit(ent["frame"], PRIO_RETX, None, (True, [(seq, ent, ent["retries"])]))
+                    except OSError:
+                        return
+                    if self.trace is not None:
+                        self.trace(TRACE_RETX, ent["frame"][0], seq, now_ms(), len(ent["payload"]), ent["retries"], 0)
 
-    def print_metrics(self, total_reli: int, total_unreli: int):
-        duration = self.end_time - self.start_time
-        
-        tp = self.reli_total_bytes / (duration / 1000)
-        if total_reli == 0:
-            pdr = 0
-        else:
-            pdr = self.reli_packets_recv / total_reli
+    def get_metrics(self) -> dict:
+        # point-in-time snapshot of counters and estimators, readable from any thread
+        with self.send_lock:
+            pending = len(self.pkts_pending_ack)
+            inflight = self._inflight()
+            queued = len(self.send_backlog)
+        return {
+            "reli_packets_send": self.reli_packets_send,
+            "reli_packets_recv": self.reli_packets_recv,
+            "reli_total_bytes": self.reli_total_bytes,
+            "reli_jitter_ms": self.reli_jitter,
+            "unreli_packets_send": self.unreli_packets_send,
+            "unreli_packets_recv": self.unreli_packets_recv,
+            "unreli_total_bytes": self.unreli_total_bytes,
+            "unreli_jitter_ms": self.unreli_jitter,
+            "pending_ack": pending,
+            "rto_ms": self.rto.rto_ms,
+            "srtt_ms": self.rto.srtt_ms,
+            "rttvar_ms": self.rto.rttvar_ms,
+            "rtt_samples": self.rto.samples,
+            "cwnd": self.cc.window(),
+            "ssthresh": self.cc.ssthresh,
+            "cc_losses": self.cc.losses,
+            "peer_rwnd": self.peer_rwnd,
+            "inflight": inflight,
+            "send_queue_depth": queued,
+            "send_backlog_waits": self.send_backlog_waits,
+            "writer_queue_depth": self.writer.queued if self.writer is not None else 0,
+            "writer_errors": self.writer.errors if self.writer is not None else 0,
+            "send_superseded": self.writer.superseded if self.writer is not None else 0,
+            "pacing_rate_bps": self.writer.rate_bps if self.writer is not None else 0,
+            "reorder_buffered": self.rx_buffered,
+            "reorder_dropped": self.reorder_dropped,
+            # peer clock estimate (gamenet_clock.py): offset (peer - own) and drift, least round trip it rests
+            # on, and the one-way delay each way
+            "clock_offset_ms": self.clock.offset_ms,
+            "clock_drift_ppm": self.clock.drift_ppm,
+            "clock_delay_ms": self.clock.delay_ms,
+            "clock_samples": self.clock.samples,
+            "owd_out_ms": self.clock.owd_out_ms,
+            "owd_in_ms": self.clock.owd_in_ms,
+            "fragmented_recv": self.reassembly.completed,
+            "fragmented_incomplete": self.reassembly.incomplete,
+            "fragments_refused": self.reassembly.refused,
+            "reassembly_bytes": self.reassembly.used,
+            "stream_buffered": self.streams.buffered,
+            "stream_dropped": self.streams.dropped,
+            # FEC: parity sent and its bytes (the bandwidth it costs), current group size per space, and what the
+            # peer's parity rebuilt here
+            "fec_parity_sent": self.fec_tx.parity_sent if self.fec_tx is not None else 0,
+            "fec_parity_bytes": self.fec_tx.parity_bytes if self.fec_tx is not None else 0,
+            "fec_group_reliable": self.fec_tx.sizes.get(CH_RELIABLE, 0) if self.fec_tx is not None else 0,
+            "fec_group_unreliable": self.fec_tx.sizes.get(CH_UNRELIABLE, 0) if self.fec_tx is not None else 0,
+            "fec_parity_recv": self.fec_rx.parity_recv,
+            "fec_recovered": self.fec_rx.recovered,
+            "fec_unrecoverable": self.fec_rx.unrecoverable,
+            "fec_late_recv": self.fec_late_recv,
+            # snapshot bandwidth: raw is the full states handed to send_snapshot(), wire what went out for them
+            "snapshots_sent": self.snap_tx.sent,
+            "snapshot_keyframes_sent": self.snap_tx.keyframes,
+            "snapshot_raw_bytes": self.snap_tx.raw_bytes,
+            "snapshot_wire_bytes": self.snap_tx.wire_bytes,
+            "snapshots_recv": self.snap_rx.received,
+            "snapshot_keyframes_recv": self.snap_rx.keyframes,
+            "snapshots_stale": self.snap_rx.stale,
+            "snapshots_undecodable": self.snap_rx.undecodable,
+        }
 
-        if self.reli_packets_recv == 0:
-            avg_latency = 0
-        else:
-            avg_latency = self.reli_total_latency / self.reli_packets_recv 
+    def get_percentiles(self, qs: Iterable[float] = DEFAULT_PERCENTILES) -> dict:
+        # p50/p90/p99/p99.9, max, mean and count of every distribution, per channel; times in ms. Read without
+        # locks so it never stalls the rx path, a sample recorded meanwhile may or may not be included.
+        report = {
+            "reliable": self.histograms[CH_RELIABLE].percentiles(qs),
+            "unreliable": self.histograms[CH_UNRELIABLE].percentiles(qs),
+            "snapshot": self.histograms[CH_SNAPSHOT].percentiles(qs),
+        }
+        if self.locks is not None:
+            report["locks"] = self.get_lock_stats(qs)
+        return report
 
-        print("Reliable Channel: ")
-        print(f"TP: {tp:.2f} bytes/s")
-        print(f"Avg Latency: {avg_latency:.2f}ms")
-        print(f"Jitter: {self.reli_jitter:.2f}ms")
-        print(f"PDR: {pdr*100:.2f}%")
+    def get_lock_stats(self, qs: Iterable[float] = DEFAULT_PERCENTILES) -> dict:
+        # lock name -> acquisitions, contended acquisitions, hold time and wait time per thread role, in
+        # microseconds (see InstrumentedLock); empty unless lock_stats=True
+        if self.locks is None:
+            return {}
+        return {name: lock.stats(qs) for name, lock in self.locks.items()}
 
-        if pdr != 0 and pdr <= 100 and self.reli_packets_recv != 0:
-            self.data.append([1, tp, avg_latency, self.reli_jitter, pdr])
+    def _session_report(self, total_reli: int, total_unreli: int) -> dict:
+        # rx thread: freeze the session's numbers and start the next session's, printing happens on the exporter
+        duration = ts_diff(self.end_time, self.start_time)
+        report = {
+            "duration_ms": duration,
+            "reliable": self._channel_report(
+                CH_RELIABLE, total_reli, self.reli_packets_recv, self.reli_total_bytes, self.reli_total_latency,
+                self.reli_jitter, duration
+            ),
+            "unreliable": self._channel_report(
+                CH_UNRELIABLE, total_unreli, self.unreli_packets_recv, self.unreli_total_bytes,
+                self.unreli_total_latency, self.unreli_jitter, duration
+            ),
+        }
+        self.reset_metrics()
+        return report
 
-        tp = self.unreli_total_bytes / (duration / 1000)
-        if total_unreli == 0:
-            pdr = 0
-        else:
-            pdr = self.unreli_packets_recv / total_unreli
+    def _channel_report(self, ch: int, total: int, recv: int, nbytes: int, total_latency: int, jitter: float,
+                        duration: int) -> dict:
+        return {
+            "tp": nbytes / (duration / 1000) if duration else 0,
+            "pdr": recv / total if total else 0,
+            "avg_latency": total_latency / recv if recv else 0,
+            "jitter": jitter,
+            "recv": recv,
+            # reset_metrics() swaps in fresh histograms, so this one is no longer written to
+            "latency_us": self.histograms[ch].latency_us,
+        }
 
-        if self.unreli_packets_recv == 0:
-            avg_latency = 0
-        else:
-            avg_latency = self.unreli_total_latency / self.unreli_packets_recv 
-        
-        print("Unreliable Channel: ")
-        print(f"TP: {tp:.2f} bytes/s")
-        print(f"Avg Latency: {avg_latency:.2f}ms")
-        print(f"Jitter: {self.unreli_jitter:.2f}ms")
-        print(f"PDR: {pdr*100:.2f}%")
+    def print_metrics(self, report: dict):
+        # exporter thread
+        for name, label, flag in (("reliable", "Reliable", 1), ("unreliable", "Unreliable", 0)):
+            r = report[name]
+            print(f"{label} Channel: ")
+            print(f"TP: {r['tp']:.2f} bytes/s")
+            print(f"Avg Latency: {r['avg_latency']:.2f}ms")
+            print(self._latency_line(r["latency_us"]))
+            print(f"Jitter: {r['jitter']:.2f}ms")
+            print(f"PDR: {r['pdr']*100:.2f}%")
 
-        if pdr != 0 and pdr <= 100 and self.unreli_packets_recv != 0:
-            self.data.append([0, tp, avg_latency, self.unreli_jitter, pdr])
+            if r["pdr"] != 0 and r["pdr"] <= 100 and r["recv"] != 0:
+                self.data.append([flag, r["tp"], r["avg_latency"], r["jitter"], r["pdr"]])
 
-        self.reset_metrics()
+    def _latency_line(self, hist) -> str:
+        p = hist.percentiles(scale=1000)
+        if not p["count"]:
+            return "Latency p50/p99/p99.9/max: -"
+        return f"Latency p50/p99/p99.9/max: {p['p50']:.2f}/{p['p99']:.2f}/{p['p99.9']:.2f}/{p['max']:.2f}ms"
 
-    def on_exit(self):
-        with open("data_low.csv", "w") as f:
+    def on_exit(self, path: Optional[str] = None):
+        # writes the session reports collected so far to path (default: report_path)
+        self.exporter.close()
+        with open(path or self.report_path, "w") as f:
             reli_csv = CSV_HEADER + self.data
             writer = csv.writer(f)
             writer.writerows(reli_csv)
@@ -456,3 +1607,6 @@ class GameNetAPI:
         self.unreli_total_bytes = 0
         self.unreli_total_latency = 0
         self.unreli_latency_sq = 0
+        self.histograms = {
+            CH_RELIABLE: ChannelHistograms(), CH_UNRELIABLE: ChannelHistograms(), CH_SNAPSHOT: ChannelHistograms(),
+        }
@@ -0,0 +1,461 @@
+import asyncio
+import socket
+import time
+from collections import deque
+from typing import Optional, Tuple, List
+
+from gamenet_metrics import ChannelHistograms, DEFAULT_PERCENTILES
+from gamenet_fragment import FRAGMENT_HEADER, DEFAULT_REASSEMBLY_BUDGET, FragmentMark, Reassembly
+from gamenet_clock import ClockSync
+from gamenet_stream import STREAM_HEADER, StreamSet
+from gamenet_api import (
+    CH_RELIABLE, CH_UNRELIABLE, CH_ACK, CH_METRIC, CH_BUNDLE, CH_FRAGMENT, CH_STREAM, CH_CLOCK, CLOCK_PROBE,
+    CLOCK_REPLY, SEQ_MOD, SACK_BITS, ECHO, DEFAULT_RECV_WINDOW, RtoEstimator, SackTracker, SeqMetaRing, ack_pending,
+    ack_echo, build_packet, restamp, parse_packet, iter_bundle, check_timeouts, now_ms, ts_diff,
+)
+
+"""
+asyncio flavour of the H-UDP transport in gamenet_api.py.
+
+Same wire format (header, channels 0-4, cumulative + SACK ACKs, bundles), so an AsyncGameNetAPI can talk to a
+threaded GameNetAPI. Instead of rx/retx threads it runs entirely on the event loop:
+  - datagrams arrive through a DatagramProtocol created by loop.create_datagram_endpoint
+  - every reliable packet owns a loop.call_at retransmission timer, cancelled when it is ACKed
+  - a missing head-of-line arms a loop.call_at timer that skips it after gap_skip_timeout_ms
+  - fragmented messages (channel 7, gamenet_fragment.py) from a GameNetAPI peer are reassembled within
+    reassembly_budget bytes; sends are never fragmented
+  - stream messages (channel 8, gamenet_stream.py) from a GameNetAPI peer are ordered within their stream and
+    recv() returns GameNetAPI's 8-tuple, stream last; sends go on stream 0 only
+  - latency is one way against the peer's clock as estimated from the ACK exchange and clock probes (channel 10,
+    gamenet_clock.py), like GameNetAPI's
+  - apps use `await send()`, `await recv(timeout_ms)` or `async for msg in api`
+"""
+
+
+class _GameNetProtocol(asyncio.DatagramProtocol):
+    def __init__(self, api: "AsyncGameNetAPI"):
+        self.api = api
+
+    def datagram_received(self, data: bytes, addr):
+        self.api._on_datagram(data)
+
+    def error_received(self, exc: Exception):
+        # ICMP errors (peer not up yet); retransmission takes care of it
+        pass
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.api._on_connection_lost()
+
+
+class AsyncGameNetAPI:
+    def __init__(
+        self,
+        local_addr: Tuple[str, int],
+        peer_addr: Tuple[str, int],
+        retransmission_timeout_ms: int = 50,
+        gap_skip_timeout_ms: int = 200,
+        ack_delay_ms: int = 0,
+        adaptive_rto: bool = True,
+        min_rto_ms: int = 10,
+        max_rto_ms: int = 1000,
+        reassembly_budget: int = DEFAULT_REASSEMBLY_BUDGET
+    ):
+        max_rto_ms = check_timeouts(retransmission_timeout_ms, gap_skip_timeout_ms, ack_delay_ms, min_rto_ms, max_rto_ms)
+
+        self.local_addr = local_addr
+        self.peer_addr = peer_addr
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.running = False
+
+        # stats
+        self.reli_packets_send = 0
+        self.reli_packets_recv = 0
+        self.reli_total_bytes = 0
+        self.reli_jitter = 0
+        self.reli_last_transit = None
+        self.unreli_packets_send = 0
+        self.unreli_packets_recv = 0
+        self.unreli_total_bytes = 0
+        self.unreli_jitter = 0
+        self.unreli_last_transit = None
+        self.peer_totals: Optional[Tuple[int, int]] = None  # (reliable, unreliable) sent, from the last CH_METRIC
+
+        # reliable send
+        self.gap_skip_timeout_ms = gap_skip_timeout_ms
+        self.rto = RtoEstimator(retransmission_timeout_ms, min_rto_ms, max_rto_ms, adaptive_rto)
+        self.next_reliable_seq = 0
+        self.snd_una = 0
+        self.pkts_pending_ack = {}  # seq -> {payload, frame, send_timestamp, last_tx, is_metric, retries, timer}
+        self.all_acked: Optional[asyncio.Event] = None
+        self.last_unreliable_seq_tx = None
+
+        # reliable recv
+        self.sack = SackTracker(ack_delay_ms)
+        self.ack_timer: Optional[asyncio.TimerHandle] = None
+        self.expected_seq = 0
+        self.buffer = {}  # seq -> (ts_ms, payload or FragmentMark, arrival ms); payload None: a stream message
+        self.reassembly = Reassembly(reassembly_budget)
+        self.gap_timer: Optional[asyncio.TimerHandle] = None
+        self.histograms = {CH_RELIABLE: ChannelHistograms(), CH_UNRELIABLE: ChannelHistograms()}
+        # per stream reorder buffers of CH_STREAM messages, and the timer of the earliest stream gap
+        self.streams = StreamSet(
+            DEFAULT_RECV_WINDOW, gap_skip_timeout_ms, lambda us: self.histograms[CH_RELIABLE].delivery_delay_us.record(us),
+        )
+        self.stream_timer: Optional[asyncio.TimerHandle] = None
+        self.rx_meta = {CH_RELIABLE: SeqMetaRing(), CH_UNRELIABLE: SeqMetaRing()}
+        self.ack_meta = SeqMetaRing()
+
+        # unreliable recv
+        self.last_unreliable_seq_rx = None
+
+        # peer clock estimate, see GameNetAPI
+        self.clock = ClockSync()
+        self.clock_offset_ms = 0
+
+        # messages ready to be delivered to the application: (channel, seq, ts_ms, payload), or from a stream
+        # (channel, seq, ts_ms, payload, stream)
+        self.app_recv_q = deque()
+        self.app_recv_ready: Optional[asyncio.Event] = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.all_acked = asyncio.Event()
+        self.all_acked.set()
+        self.app_recv_ready = asyncio.Event()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setblocking(False)
+        sock.bind(self.local_addr)
+        self.transport, _ = await self.loop.create_datagram_endpoint(lambda: _GameNetProtocol(self), sock=sock)
+        self.running = True
+
+    async def close(self):
+        await self.all_acked.wait()
+        payload = self.reli_packets_send.to_bytes(4, "big") + self.unreli_packets_send.to_bytes(4, "big")
+        self._send_reliable(payload, True)
+        # wait for metric packet
+        await self.all_acked.wait()
+        self.running = False
+        self.transport.close()
+
+    async def send(self, payload: bytes, reliable: bool = True) -> int:
+        return self._send_reliable(payload) if reliable else self._send_unreliable(payload)
+
+    def _send_reliable(self, payload: bytes, is_metric: bool = False) -> int:
+        seq = self.next_reliable_seq
+        self.next_reliable_seq = (self.next_reliable_seq + 1) % SEQ_MOD
+
+        frame = build_packet(CH_RELIABLE if not is_metric else CH_METRIC, seq, payload)
+        self.transport.sendto(frame, self.peer_addr)
+        now = now_ms()
+        self.reli_packets_send += 1
+
+        ent = {
+            "payload": payload,
+            "frame": frame,
+            "send_timestamp": now,
+            "last_tx": now,
+            "is_metric": is_metric,
+            "retries": 0,
+            "timer": None,
+        }
+        self.pkts_pending_ack[seq] = ent
+        self.all_acked.clear()
+        self._schedule_retx(seq, ent)
+        return seq
+
+    def _schedule_retx(self, seq: int, ent: dict):
+        when = self.loop.time() + self.rto.timeout_ms(ent["retries"]) / 1000
+        ent["timer"] = self.loop.call_at(when, self._on_retx_timeout, seq, ent)
+
+    def _on_retx_timeout(self, seq: int, ent: dict):
+        if self.pkts_pending_ack.get(seq) is not ent or self.transport is None or self.transport.is_closing():
+            return
+        ent["last_tx"] = now_ms()
+        restamp(ent["frame"], ent["last_tx"], ent["payload"])
+        self.transport.sendto(ent["frame"], self.peer_addr)
+        ent["retries"] += 1
+        self._schedule_retx(seq, ent)
+
+    def _send_unreliable(self, payload: bytes) -> int:
+        seq = 0 if self.last_unreliable_seq_tx is None else (self.last_unreliable_seq_tx + 1) % SEQ_MOD
+        self.last_unreliable_seq_tx = seq
+        self.transport.sendto(build_packet(CH_UNRELIABLE, seq, payload), self.peer_addr)
+        self.unreli_packets_send += 1
+        return seq
+
+    async def recv(self, timeout_ms: int = 100) -> List[Tuple[int, int, int, bytes, int, int, int, int]]:
+        # Waits for delivered msgs and returns a list of (channel, seq, timestamp_ms, payload, received timestamp, latency, number of retranmissions, stream)
+        if not self.app_recv_q:
+            try:
+                await asyncio.wait_for(self.app_recv_ready.wait(), max(0, timeout_ms) / 1000)
+            except asyncio.TimeoutError:
+                return []
+
+        received_packets = []
+        while self.app_recv_q and len(received_packets) < 64:
+            received_packets.append(self._pop_app_msg())
+        return received_packets
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Tuple[int, int, int, bytes, int, int, int, int]:
+        while not self.app_recv_q:
+            if not self.running:
+                raise StopAsyncIteration
+            await self.app_recv_ready.wait()
+        return self._pop_app_msg()
+
+    def _pop_app_msg(self) -> Tuple[int, int, int, bytes, int, int, int, int]:
+        packet_details = self.app_recv_q.popleft()
+        if not self.app_recv_q:
+            self.app_recv_ready.clear()
+        meta = self.rx_meta[packet_details[0]].get(packet_details[1])
+        if len(packet_details) == 4:
+            return packet_details + meta + (0,)
+        return packet_details[:4] + meta + packet_details[4:]
+
+    def _deliver_to_app(self, msg: Tuple[int, int, int, bytes]):
+        self.app_recv_q.append(msg)
+        self.app_recv_ready.set()
+
+    def _on_connection_lost(self):
+        self.running = False
+        # wake `async for` consumers so they can stop
+        if self.app_recv_ready is not None:
+            self.app_recv_ready.set()
+
+    def _on_datagram(self, data: bytes):
+        recv_timestamp = now_ms()
+        try:
+            ch, seq, send_timestamp, payload = parse_packet(data)
+        except Exception:
+            return
+        self._dispatch(ch, seq, send_timestamp, payload, recv_timestamp)
+        if self.clock.probe_due(time.monotonic()):
+            self._send_clock(CLOCK_PROBE)
+
+    def _dispatch(self, ch: int, seq: int, send_timestamp: int, payload: bytes, recv_timestamp: int):
+        latency = ts_diff(recv_timestamp, send_timestamp) + self.clock_offset_ms
+        if ch == CH_BUNDLE:
+            for sub_ch, sub_seq, sub_payload in iter_bundle(payload):
+                if sub_ch != CH_BUNDLE:
+                    self._dispatch(sub_ch, sub_seq, send_timestamp, sub_payload, recv_timestamp)
+        elif ch == CH_ACK:
+            echo = ack_echo(payload)
+            if echo is not None:
+                self._clock_sample(echo[0], echo[1], send_timestamp, recv_timestamp)
+            self._handle_ack(seq, payload, recv_timestamp)
+        elif ch == CH_CLOCK:
+            if seq == CLOCK_PROBE:
+                self._send_clock(CLOCK_REPLY, ECHO.pack(send_timestamp, recv_timestamp))
+            elif len(payload) >= ECHO.size:
+                t1, t2 = ECHO.unpack_from(payload)
+                self._clock_sample(t1, t2, send_timestamp, recv_timestamp)
+        elif ch == CH_RELIABLE or ch == CH_FRAGMENT:
+            self.rx_meta[CH_RELIABLE].note_arrival(seq, recv_timestamp, latency)
+            if self._handle_reliable_rx(seq, send_timestamp, payload, latency, recv_timestamp, ch):
+                self.sack.note(seq, send_timestamp, recv_timestamp)
+                self._arm_ack()
+        elif ch == CH_STREAM:
+            self.rx_meta[CH_RELIABLE].note_arrival(seq, recv_timestamp, latency)
+            if self._handle_stream_rx(seq, send_timestamp, payload, latency, recv_timestamp):
+                self.sack.note(seq, send_timestamp, recv_timestamp)
+                self._arm_ack()
+        elif ch == CH_UNRELIABLE:
+            # retain only freshest data
+            if self.last_unreliable_seq_rx is not None and not 0 < (seq - self.last_unreliable_seq_rx) % SEQ_MOD < SEQ_MOD // 2:
+                return
+            self.last_unreliable_seq_rx = seq
+            self.unreli_packets_recv += 1
+            self.unreli_total_bytes += len(payload)
+            if self.unreli_last_transit is not None:
+                self.unreli_jitter += (abs(latency - self.unreli_last_transit) - self.unreli_jitter) / 16
+            self.unreli_last_transit = latency
+            self.histograms[CH_UNRELIABLE].latency_us.record(latency * 1000)
+            self.rx_meta[CH_UNRELIABLE].put(seq, recv_timestamp, latency)
+            self._deliver_to_app((CH_UNRELIABLE, seq, send_timestamp, payload))
+        elif ch == CH_METRIC:
+            self._flush_ack()
+            # the metric packet ends the sender's session: ACK exactly it and start over from seq 0
+            self._send_ack((seq + 1) % SEQ_MOD, bytes(SACK_BITS // 8))
+            self.peer_totals = (int.from_bytes(payload[0:4], "big"), int.from_bytes(payload[4:8], "big"))
+            self.last_unreliable_seq_rx = None
+            self.expected_seq = 0
+            self.buffer.clear()
+            self.reassembly.reset()
+            self.streams.reset()
+            self._cancel_gap_timer()
+            self._arm_stream_timer()
+            self.sack.reset()
+            self.rx_meta[CH_RELIABLE].reset()
+            self.clock.reset()
+            self.clock_offset_ms = 0
+
+    def _handle_reliable_rx(self, seq: int, ts_ms: int, payload: bytes, latency: int, arrival_ms: int,
+                            ch: int = CH_RELIABLE) -> bool:
+        # drop late arrivals for already skipped heads and duplicates (ACKed again). False: a fragment the
+        # reassembly refused (budget, malformed), not ACKed so the peer retransmits it
+        if 0 < (self.expected_seq - seq) % SEQ_MOD < SEQ_MOD // 2 or seq in self.buffer:
+            return True
+        size = len(payload)
+        if ch == CH_FRAGMENT:
+            payload = self.reassembly.put(seq, payload, self.expected_seq)
+            if payload is None:
+                return False
+            size -= FRAGMENT_HEADER.size
+        self.buffer[seq] = (ts_ms, payload, arrival_ms)
+        self._note_reliable_rx(size, latency)
+        self._drain_reliable()
+        return True
+
+    def _note_reliable_rx(self, size: int, latency: int):
+        # stats of a new reliable message, whatever its channel
+        self.histograms[CH_RELIABLE].latency_us.record(latency * 1000)
+        self.reli_packets_recv += 1
+        self.reli_total_bytes += size
+        if self.reli_last_transit is not None:
+            self.reli_jitter += (abs(latency - self.reli_last_transit) - self.reli_jitter) / 16
+        self.reli_last_transit = latency
+
+    def _handle_stream_rx(self, seq: int, ts_ms: int, payload: bytes, latency: int, arrival_ms: int) -> bool:
+        # orders a CH_STREAM message within its stream only; its seq fills its place in the reliable order without
+        # a payload, as in GameNetAPI. False: malformed or beyond the stream's buffer, not ACKed
+        ready = []
+        accepted = self.streams.put(seq, ts_ms, payload, arrival_ms, ready)
+        if accepted is None:
+            return False
+        if accepted:
+            self._note_reliable_rx(len(payload) - STREAM_HEADER.size, latency)
+        for msg in ready:
+            self._deliver_to_app(msg)
+        self._arm_stream_timer()
+        if not 0 < (self.expected_seq - seq) % SEQ_MOD < SEQ_MOD // 2 and seq not in self.buffer:
+            self.buffer[seq] = (ts_ms, None, arrival_ms)
+            self._drain_reliable()
+        return True
+
+    def _arm_stream_timer(self):
+        # one timer for the earliest stream gap deadline (StreamSet keeps them on time.monotonic())
+        if self.stream_timer is not None:
+            self.stream_timer.cancel()
+            self.stream_timer = None
+        deadline = self.streams.next_deadline()
+        if deadline is not None:
+            delay = max(deadline - time.monotonic(), 0.001)
+            self.stream_timer = self.loop.call_at(self.loop.time() + delay, self._on_stream_gap_timeout)
+
+    def _on_stream_gap_timeout(self):
+        self.stream_timer = None
+        ready = []
+        self.streams.skip_gaps(ready)
+        for msg in ready:
+            self._deliver_to_app(msg)
+        self._arm_stream_timer()
+
+    def _drain_reliable(self):
+        # deliver in order from expected_seq; a hole with packets buffered behind it arms the skip timer
+        now = now_ms()
+        while self.expected_seq in self.buffer:
+            head_timestamp_ms, head_payload, arrival_ms = self.buffer.pop(self.expected_seq)
+            if head_payload is None:
+                # a stream message, delivered (and its delay recorded) by its stream
+                pass
+            else:
+                self.histograms[CH_RELIABLE].delivery_delay_us.record(ts_diff(now, arrival_ms) * 1000)
+                if type(head_payload) is not FragmentMark:
+                    self._deliver_to_app((CH_RELIABLE, self.expected_seq, head_timestamp_ms, head_payload))
+                else:
+                    # the message goes out with its last fragment, under the seq of its first
+                    done = self.reassembly.complete(head_payload)
+                    if done is not None:
+                        self._deliver_to_app((CH_RELIABLE, done[0], head_timestamp_ms, done[1]))
+            self.expected_seq = (self.expected_seq + 1) % SEQ_MOD
+            self._cancel_gap_timer()
+        if self.buffer and self.gap_timer is None:
+            self.gap_timer = self.loop.call_at(self.loop.time() + self.gap_skip_timeout_ms / 1000, self._on_gap_timeout)
+
+    def _on_gap_timeout(self):
+        # waited long enough for the missing head, skip it and flush whatever queued up behind it
+        self.gap_timer = None
+        self.expected_seq = (self.expected_seq + 1) % SEQ_MOD
+        self.reassembly.expire(self.expected_seq)
+        self._drain_reliable()
+
+    def _cancel_gap_timer(self):
+        if self.gap_timer is not None:
+            self.gap_timer.cancel()
+            self.gap_timer = None
+
+    def _arm_ack(self):
+        delay = self.sack.due - time.monotonic()
+        if delay <= 0:
+            self._flush_ack()
+        elif self.ack_timer is None:
+            self.ack_timer = self.loop.call_later(delay, self._flush_ack)
+
+    def _flush_ack(self):
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+        if self.sack.due is not None:
+            self._send_ack(*self.sack.take())
+
+    def _send_ack(self, cum_seq: int, sack_payload: bytes):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(build_packet(CH_ACK, cum_seq, sack_payload), self.peer_addr)
+
+    def _send_clock(self, seq: int, payload: bytes = b""):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(build_packet(CH_CLOCK, seq, payload), self.peer_addr)
+
+    def _clock_sample(self, t1: int, t2: int, t3: int, t4: int):
+        offset = self.clock.sample(t1, t2, t3, t4)
+        if offset is not None:
+            self.clock_offset_ms = round(offset)
+
+    def _handle_ack(self, seq: int, payload: bytes, recv_timestamp: int):
+        acked, self.snd_una, rtt_sample = ack_pending(
+            self.pkts_pending_ack, seq, payload, self.snd_una, self.next_reliable_seq, recv_timestamp,
+            self.histograms[CH_RELIABLE],
+        )
+        for s, ent, rtt in acked:
+            ent["timer"].cancel()
+            self.ack_meta.put(s, recv_timestamp, rtt, ent["retries"])
+        if rtt_sample is not None:
+            self.rto.sample(rtt_sample)
+        if not self.pkts_pending_ack:
+            self.all_acked.set()
+
+    def get_percentiles(self, qs=DEFAULT_PERCENTILES) -> dict:
+        # p50/p90/p99/p99.9, max, mean and count of every distribution, per channel; times in ms
+        return {
+            "reliable": self.histograms[CH_RELIABLE].percentiles(qs),
+            "unreliable": self.histograms[CH_UNRELIABLE].percentiles(qs),
+        }
+
+    def get_metrics(self) -> dict:
+        return {
+            "reli_packets_send": self.reli_packets_send,
+            "reli_packets_recv": self.reli_packets_recv,
+            "reli_total_bytes": self.reli_total_bytes,
+            "reli_jitter_ms": self.reli_jitter,
+            "unreli_packets_send": self.unreli_packets_send,
+            "unreli_packets_recv": self.unreli_packets_recv,
+            "unreli_total_bytes": self.unreli_total_bytes,
+            "unreli_jitter_ms": self.unreli_jitter,
+            "pending_ack": len(self.pkts_pending_ack),
+            "rto_ms": self.rto.rto_ms,
+            "srtt_ms": self.rto.srtt_ms,
+            "rttvar_ms": self.rto.rttvar_ms,
+            "rtt_samples": self.rto.samples,
+            "clock_offset_ms": self.clock.offset_ms,
+            "clock_drift_ppm": self.clock.drift_ppm,
+            "clock_delay_ms": self.clock.delay_ms,
+            "clock_samples": self.clock.samples,
+            "owd_out_ms": self.clock.owd_out_ms,
+            "owd_in_ms": self.clock.owd_in_ms,
+        }
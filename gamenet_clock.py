@@ -0,0 +1,133 @@
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from gamenet_codec import ts_diff
+
+"""
+Clock offset and drift estimation for the H-UDP transport, NTP style, so one-way latency is measured against the
+peer's clock as it actually is instead of assuming both clocks agree.
+
+Every exchange gives four timestamps: t1 when a packet left here, t2 when it arrived at the peer, t3 when the
+peer's answer left and t4 when that arrived here (t1 and t4 on this side's clock, t2 and t3 on the peer's). The
+answer is an ACK, which echoes t1 (the header timestamp of the newest data packet it covers) and t2 next to its
+own header timestamp t3, or the reply to a CH_CLOCK probe, which echoes the same two. Then
+  delay  = (t4 - t1) - (t3 - t2)                  round trip without the time the peer held the packet
+  offset = ((t2 - t1) + (t3 - t4)) / 2            peer clock - own clock
+and the offset is exact when both directions take equally long. Queueing on either way breaks that, so as NTP's
+clock filter does, only the least delayed exchange of every CLOCK_FILTER_S counts: one offset point per interval.
+Points whose delay is well above the least one kept (a congested interval) are left out, and once the remaining
+points span CLOCK_FIT_MIN_S a least squares line through them gives the drift (the rate the two clocks run apart,
+within +-CLOCK_MAX_DRIFT_PPM) and the offset is read off that line, extrapolated to now, between exchanges too.
+
+Per direction: owd_out_ms and owd_in_ms are smoothed one-way delays of the exchanges towards the peer (t2 - t1)
+and back (t4 - t3), each corrected by the offset. What the estimate can never see is a constant asymmetry of the
+path; it ends up half in the offset, split evenly over the two directions.
+
+A side that sends reliable data gets an exchange out of every ACK. A side that only receives has nothing of its
+own being ACKed, so it probes: CH_CLOCK seq CLOCK_PROBE, answered with seq CLOCK_REPLY and the ECHO payload, at
+most once per CLOCK_PROBE_INTERVAL_S and only while the peer is sending and no ACK has given an exchange for that
+long. Timestamps are 32 bit and wrap, every difference goes through ts_diff.
+"""
+
+CLOCK_FILTER_S = 1.0  # the least delayed exchange of every interval this long is one offset point
+CLOCK_POINTS = 64  # offset points kept for the drift fit
+CLOCK_FIT_MIN_S = 8.0  # points must span this long before the drift is fitted
+CLOCK_MAX_DRIFT_PPM = 500.0  # NTP's frequency tolerance, a steeper fit is noise
+CLOCK_DELAY_SLACK_MS = 2  # a point counts while its delay is within this (or a quarter) of the least one kept
+CLOCK_PROBE_INTERVAL_S = 1.0
+CLOCK_OWD_GAIN = 1 / 8
+
+class ClockSync:
+    # one per peer, fed from the thread that receives the ACKs and probe replies
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.points: Deque[Tuple[float, float, float]] = deque(maxlen=CLOCK_POINTS)  # (delay, offset, monotonic s)
+        self.best: Optional[Tuple[float, float, float]] = None  # least delayed exchange of the current interval
+        self.interval_end = 0.0
+        # the fitted line: offset fit_offset at monotonic fit_t, fit_slope ms per s
+        self.fit_t = 0.0
+        self.fit_offset = 0.0
+        self.fit_slope = 0.0
+        self.offset_ms: Optional[float] = None  # peer clock - own clock as of the last exchange
+        self.delay_ms: Optional[float] = None  # least delay among the points
+        self.owd_out_ms: Optional[float] = None
+        self.owd_in_ms: Optional[float] = None
+        self.samples = 0
+        self.last_sample: Optional[float] = None
+        self.last_probe: Optional[float] = None
+
+    @property
+    def drift_ppm(self) -> float:
+        return self.fit_slope * 1000
+
+    def sample(self, t1: int, t2: int, t3: int, t4: int, now: Optional[float] = None) -> Optional[float]:
+        # one exchange (32-bit ms timestamps, see the module docstring); returns the offset estimate, None if the
+        # exchange makes no sense (the peer restarted its clock, a corrupted echo)
+        now = time.monotonic() if now is None else now
+        rtt = ts_diff(t4, t1)
+        hold = ts_diff(t3, t2)
+        if rtt < 0 or hold < 0:
+            return None
+        # timestamps are whole ms, on a fast path the difference can come out a little below zero
+        delay = max(rtt - hold, 0)
+        offset = (ts_diff(t2, t1) + ts_diff(t3, t4)) / 2
+        self.samples += 1
+        self.last_sample = now
+
+        improved = self.best is None or delay < self.best[0]
+        if improved:
+            self.best = (delay, offset, now)
+        if now >= self.interval_end:
+            # the first exchange is a point right away, so there is an estimate from the first ACK on
+            self.points.append(self.best)
+            self.best = None
+            self.interval_end = now + CLOCK_FILTER_S
+            self._fit()
+        elif improved:
+            self._fit()
+        estimate = self.offset_ms = self.fit_offset + self.fit_slope * (now - self.fit_t)
+
+        out = ts_diff(t2, t1) - estimate
+        back = ts_diff(t4, t3) + estimate
+        if self.owd_out_ms is None:
+            self.owd_out_ms, self.owd_in_ms = out, back
+        else:
+            self.owd_out_ms += (out - self.owd_out_ms) * CLOCK_OWD_GAIN
+            self.owd_in_ms += (back - self.owd_in_ms) * CLOCK_OWD_GAIN
+        return estimate
+
+    def _fit(self):
+        points = list(self.points)
+        if self.best is not None:
+            points.append(self.best)
+        least = min(p[0] for p in points)
+        self.delay_ms = least
+        cutoff = least + max(CLOCK_DELAY_SLACK_MS, least / 4)
+        good = [(t, offset) for delay, offset, t in points if delay <= cutoff]
+        if len(good) < 3 or good[-1][0] - good[0][0] < CLOCK_FIT_MIN_S:
+            # too short for a drift: the newest good point stands
+            self.fit_t, self.fit_offset = good[-1]
+            self.fit_slope = 0.0
+            return
+        n = len(good)
+        mean_t = sum(t for t, _ in good) / n
+        mean_offset = sum(offset for _, offset in good) / n
+        sxx = sum((t - mean_t) ** 2 for t, _ in good)
+        sxy = sum((t - mean_t) * (offset - mean_offset) for t, offset in good)
+        limit = CLOCK_MAX_DRIFT_PPM / 1000
+        self.fit_t = mean_t
+        self.fit_offset = mean_offset
+        self.fit_slope = min(max(sxy / sxx, -limit), limit)
+
+    def probe_due(self, now: float) -> bool:
+        # True when a probe should go out now (and counts it as sent): no exchange for CLOCK_PROBE_INTERVAL_S and
+        # no probe in that time either
+        if self.last_sample is not None and now - self.last_sample < CLOCK_PROBE_INTERVAL_S:
+            return False
+        if self.last_probe is not None and now - self.last_probe < CLOCK_PROBE_INTERVAL_S:
+            return False
+        self.last_probe = now
+        return True
@@ -0,0 +1,135 @@
+import struct
+import time
+import zlib
+from typing import Optional, Tuple, List
+
+"""
+Wire codec for the H-UDP transport (see gamenet_api.py for the protocol itself).
+
+Header layout (big-endian), 11 Bytes: | Channel (1B) | Sequence (2B) | Timestamp ms (4B) | CRC32 (4B) |
+CRC32 covers the first 7 header bytes followed by the payload.
+
+Timestamps are milliseconds of a monotonic clock, anchored to the wall clock once at import so two hosts with
+synced clocks start out close, and truncated to 32 bits: they wrap every ~49.7 days, so timestamps are only ever
+compared through ts_diff(), which is exact for anything less than ~24.8 days apart. How far the peer's clock is
+off is estimated from the ACK exchange (gamenet_clock.py).
+
+Everything is built on precompiled struct.Struct objects and incremental zlib.crc32, so no field goes through
+to_bytes/from_bytes and the CRC never needs the header and payload concatenated. Frames are bytearrays: a
+retransmission restamps the timestamp and CRC in place instead of re-serializing the packet.
+"""
+
+CH_RELIABLE = 0
+CH_UNRELIABLE = 1
+CH_ACK = 2
+CH_METRIC = 3
+CH_BUNDLE = 4
+CH_SNAPSHOT = 5  # delta-compressed state snapshot, see gamenet_snapshot.py
+CH_SNAPSHOT_ACK = 6  # newest snapshot the receiver rebuilt
+CH_FRAGMENT = 7  # piece of a reliable message larger than one datagram, see gamenet_fragment.py
+CH_STREAM = 8  # reliable message of an independently ordered stream, see gamenet_stream.py
+CH_FEC = 9  # parity of a group of messages, see gamenet_fec.py
+CH_CLOCK = 10  # clock probe (seq CLOCK_PROBE) and its reply (seq CLOCK_REPLY), see gamenet_clock.py
+
+SEQ_MOD = 65536
+HEADER_SIZE = 1 + 2 + 4 + 4  # 11 bytes
+FRAME_HEADER_SIZE = 1 + 2 + 2  # bundle frame: channel, seq, length
+SACK_BITS = 64
+ACK_WINDOW_OFFSET = SACK_BITS // 8  # receive window follows the SACK bitmap
+ACK_ECHO_OFFSET = ACK_WINDOW_OFFSET + 2  # timestamp echo follows the window
+ACK_EXTRA_OFFSET = ACK_ECHO_OFFSET + 8
+WINDOW_UNLIMITED = 0xFFFF
+TS_MASK = 0xFFFFFFFF
+CLOCK_PROBE = 0
+CLOCK_REPLY = 1
+
+HEADER = struct.Struct("!BHII")  # channel, seq, timestamp, crc
+HEADER_NO_CRC = struct.Struct("!BHI")
+BUNDLE_FRAME = struct.Struct("!BHH")  # channel, seq, length
+U16 = struct.Struct("!H")
+U32 = struct.Struct("!I")
+ECHO = struct.Struct("!II")  # echoed timestamp, its arrival on the echoing side's clock
+TIMESTAMP_OFFSET = 3
+CRC_OFFSET = 7
+CLOCK_EPOCH_S = time.time() - time.monotonic()
+
+def now_ms() -> int:
+    # never steps back when the wall clock is adjusted, see the module docstring
+    return int((time.monotonic() + CLOCK_EPOCH_S) * 1000) & TS_MASK
+
+def ts_diff(a: int, b: int) -> int:
+    # a - b in ms for two 32-bit timestamps, right across a wrap (negative when a is older)
+    return ((a - b + 0x80000000) & TS_MASK) - 0x80000000
+
+def ts_add(ts: int, ms: int) -> int:
+    return (ts + ms) & TS_MASK
+
+def build_packet(chan: int, seq: int, payload: bytes) -> bytearray:
+    head = HEADER_NO_CRC.pack(chan, seq, now_ms())
+    frame = bytearray(head)
+    frame += U32.pack(zlib.crc32(payload, zlib.crc32(head)))
+    frame += payload
+    return frame
+
+def restamp(frame: bytearray, timestamp: int, payload: Optional[bytes] = None):
+    # refresh the timestamp of an already encoded frame and redo its CRC, the rest of the frame is untouched.
+    # Passing the payload the frame was built from saves copying it back out of the frame for the CRC.
+    if payload is None:
+        payload = frame[HEADER_SIZE:]
+    U32.pack_into(frame, TIMESTAMP_OFFSET, timestamp)
+    U32.pack_into(frame, CRC_OFFSET, zlib.crc32(payload, zlib.crc32(frame[:CRC_OFFSET])))
+
+def parse_packet(data: bytes) -> Tuple[int, int, int,  bytes]:
+    # works on bytes or a memoryview; for a memoryview the returned payload is a view into it (no copy)
+    if len(data) < HEADER_SIZE:
+        raise ValueError("packet is too small (packet size < header size)")
+
+    ch, seq, timestamp, crc = HEADER.unpack_from(data)
+    payload = data[HEADER_SIZE:]
+
+    # CRC over header-without-crc then payload, fed incrementally instead of concatenating
+    computed_crc = zlib.crc32(payload, zlib.crc32(data[0:CRC_OFFSET])) & 0xFFFFFFFF
+    if computed_crc != crc:
+        raise ValueError("bad crc")
+
+    return ch, seq, timestamp, payload
+
+def build_bundle(frames: List[Tuple[int, int, bytes]]) -> bytearray:
+    parts = []
+    for ch, seq, p in frames:
+        parts.append(BUNDLE_FRAME.pack(ch, seq, len(p)))
+        parts.append(p)
+    return build_packet(CH_BUNDLE, 0, b"".join(parts))
+
+def iter_bundle(payload: bytes):
+    # yields (channel, seq, payload) for every frame of a CH_BUNDLE payload, stops at a truncated frame
+    i = 0
+    while i + FRAME_HEADER_SIZE <= len(payload):
+        ch, seq, length = BUNDLE_FRAME.unpack_from(payload, i)
+        end = i + FRAME_HEADER_SIZE + length
+        if end > len(payload):
+            return
+        yield ch, seq, payload[i + FRAME_HEADER_SIZE:end]
+        i = end
+
+def sack_seqs(cum_seq: int, payload: bytes):
+    # yields the seqs selectively acknowledged by an ACK payload (bitmap, then explicit seqs after the window)
+    mask = int.from_bytes(payload[:SACK_BITS // 8], "big")
+    while mask:
+        low = mask & -mask
+        yield (cum_seq + low.bit_length()) % SEQ_MOD
+        mask ^= low
+    for i in range(ACK_EXTRA_OFFSET, len(payload) - 1, 2):
+        yield U16.unpack_from(payload, i)[0]
+
+def ack_window(payload: bytes) -> Optional[int]:
+    # receive window advertised by an ACK payload, None for ACKs that carry no window
+    if len(payload) < ACK_ECHO_OFFSET:
+        return None
+    return U16.unpack_from(payload, ACK_WINDOW_OFFSET)[0]
+
+def ack_echo(payload: bytes) -> Optional[Tuple[int, int]]:
+    # (timestamp of the newest data packet the ACK answers, its arrival at the peer), None for ACKs without one
+    if len(payload) < ACK_EXTRA_OFFSET:
+        return None
+    return ECHO.unpack_from(payload, ACK_ECHO_OFFSET)
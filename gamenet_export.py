@@ -0,0 +1,216 @@
+import csv
+import json
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional
+
+"""
+Metrics export for the H-UDP transports, off the packet path.
+
+A MetricsExporter owns one background thread. Every interval_s it calls snapshot() (metrics_snapshot(transport)
+works for GameNetAPI, AsyncGameNetAPI, GameNetServer and ShardedGameNetServer) and hands the flat
+{name: number} dict to each sink. Sinks only ever run on that thread, so a slow disk or a stuck HTTP client
+delays the next snapshot, never packet reception: snapshots are taken when the thread is free, not queued.
+
+The rx thread talks to the exporter through submit(fn, *args) only: an append to a bounded deque. The
+exporter runs the queued calls (e.g. printing a session report) before its next snapshot; if the queue is full
+the oldest call is dropped and counted in dropped.
+
+Sinks:
+  - CsvSink: one row per snapshot, columns fixed by the first snapshot
+  - JsonLinesSink: one JSON object per snapshot
+  - PrometheusSink: serves the latest snapshot as Prometheus text exposition on http://host:port/metrics. The
+    text is rendered by the exporter thread, scrapes only copy it out.
+"""
+
+DEFAULT_INTERVAL_S = 1.0
+SUBMIT_QUEUE_LEN = 1024
+PROMETHEUS_PREFIX = "gamenet_"
+
+Snapshot = Dict[str, Optional[float]]
+
+def flatten(values: dict, prefix: str = "", out: Optional[Snapshot] = None) -> Snapshot:
+    # {"reliable": {"rtt_ms": {"p99": 3}}} -> {"reliable_rtt_ms_p99": 3}; lists are indexed. None (e.g. a
+    # percentile without samples) is kept so every snapshot has the same keys, other non-numeric values are dropped
+    if out is None:
+        out = {}
+    for key, value in values.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flatten(value, name + "_", out)
+        elif isinstance(value, (list, tuple)):
+            flatten(dict(enumerate(value)), name + "_", out)
+        elif value is None or isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+def metrics_snapshot(transport) -> Snapshot:
+    # counters and percentiles of any transport with get_metrics() and get_percentiles(), stamped with unix time
+    snap = {"ts": time.time()}
+    flatten(transport.get_metrics(), "", snap)
+    flatten(transport.get_percentiles(), "", snap)
+    return snap
+
+class CsvSink:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.writer = None
+        self.fields: List[str] = []
+
+    def write(self, snap: Snapshot):
+        if self.file is None:
+            self.fields = list(snap)
+            self.file = open(self.path, "w", newline="")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.fields)
+        # None is written as an empty cell
+        self.writer.writerow(["" if snap.get(f) is None else snap[f] for f in self.fields])
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+class JsonLinesSink:
+    def __init__(self, path: str):
+        self.file = open(path, "w")
+
+    def write(self, snap: Snapshot):
+        self.file.write(json.dumps(snap) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def _prometheus_name(prefix: str, key: str) -> str:
+    return prefix + re.sub(r"[^a-zA-Z0-9_]", "_", key)
+
+class PrometheusSink:
+    def __init__(self, host: str = "127.0.0.1", port: int = 9464, prefix: str = PROMETHEUS_PREFIX):
+        self.prefix = prefix
+        self.body = b""
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.body
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def write(self, snap: Snapshot):
+        # every value is exposed as an untyped sample, None as NaN; ts is the time the snapshot was taken
+        lines = []
+        for key, value in snap.items():
+            name = _prometheus_name(self.prefix, key)
+            lines.append(f"# TYPE {name} untyped\n{name} {'NaN' if value is None else value}\n")
+        self.body = "".join(lines).encode()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class MetricsExporter:
+    def __init__(
+        self,
+        snapshot: Callable[[], Snapshot],
+        sinks: Iterable = (),
+        interval_s: Optional[float] = DEFAULT_INTERVAL_S,
+    ):
+        if interval_s is not None and interval_s <= 0:
+            raise ValueError(f"interval_s must be positive, got {interval_s}")
+        self.snapshot = snapshot
+        self.sinks = list(sinks)
+        # no periodic snapshots without sinks, the thread then only runs submitted calls
+        self.interval_s = interval_s if self.sinks else None
+        self.calls: deque = deque()
+        self.cv = threading.Condition()
+        self.dropped = 0
+        self.sink_errors = 0
+        self.snapshots = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def close(self, timeout: float = 2.0):
+        # runs what was submitted, takes one last snapshot and closes the sinks
+        if not self.running:
+            return
+        with self.cv:
+            self.running = False
+            self.cv.notify()
+        self.thread.join(timeout)
+
+    def submit(self, fn: Callable, *args):
+        # any thread, never blocks on a sink: fn(*args) runs later on the exporter thread
+        with self.cv:
+            if len(self.calls) >= SUBMIT_QUEUE_LEN:
+                self.calls.popleft()
+                self.dropped += 1
+            self.calls.append((fn, args))
+            self.cv.notify()
+
+    def _run(self):
+        next_snap = time.monotonic() + self.interval_s if self.interval_s is not None else None
+        while True:
+            with self.cv:
+                while self.running and not self.calls:
+                    if next_snap is None:
+                        self.cv.wait()
+                        continue
+                    wait = next_snap - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self.cv.wait(wait)
+                calls = list(self.calls)
+                self.calls.clear()
+                running = self.running
+            for fn, args in calls:
+                try:
+                    fn(*args)
+                except Exception as e:
+                    print(f"metrics exporter: {fn.__name__} failed: {e}")
+            if next_snap is not None and (not running or time.monotonic() >= next_snap):
+                self._export()
+                next_snap = time.monotonic() + self.interval_s
+            if not running:
+                break
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception:
+                pass
+
+    def _export(self):
+        snap = self.snapshot()
+        self.snapshots += 1
+        for sink in self.sinks:
+            try:
+                sink.write(snap)
+            except Exception as e:
+                self.sink_errors += 1
+                print(f"metrics exporter: {type(sink).__name__} failed: {e}")
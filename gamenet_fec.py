@@ -0,0 +1,195 @@
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from gamenet_codec import CH_RELIABLE, CH_UNRELIABLE, CH_FRAGMENT, CH_STREAM, SEQ_MOD
+
+"""
+Forward error correction for the H-UDP transport (channel CH_FEC): a lost message is rebuilt from parity as soon
+as the parity arrives, instead of one retransmission timeout later (reliable) or never (unreliable).
+
+The sender groups consecutive messages of a seq space, k at a time, and sends the codec's parity packets after
+the k-th. The spaces are the reliable seqs (CH_RELIABLE, CH_FRAGMENT and CH_STREAM share them) and the unreliable
+seqs; the group size is set per space. A message that is not the next seq of its group (the metric packet took a
+seq, or a message went out of seq order) closes the group early. The receiver keeps the last FEC_HISTORY messages
+of a space once parity for it shows up, and hands every message it can rebuild to the normal receive path, where
+it is ACKed and delivered like one that arrived. A rebuilt unreliable message is delivered even when a newer
+one already was: parity comes after its whole group, so freshest-wins would drop nearly every rebuilt message,
+and it is no duplicate (it never arrived).
+
+What a group protects of every member: | channel (1B) | length (2B) | payload |, so the rebuilt message carries
+its channel and exact length. Timestamps are not protected (a retransmission restamps its frame); a rebuilt
+message gets the timestamp of the parity packet.
+
+A reliable message can only be rebuilt once its group's parity is out, so the sender restarts the first
+retransmission timer of the group's members when it sends the parity: the rebuilt message's ACK then comes back
+before the timer fires. A message whose timer already fired (the group filled slowly) is left alone.
+
+CH_FEC: header seq is the group's first seq; payload | space (1B) | members (1B) | parity index (1B) | parity |
+
+Codecs are pluggable: parity_count, encode(members) -> [parity], and decode(members, parities) -> members with
+the lost ones filled in, or None. XorParity sends one parity packet per group and rebuilds one loss; a
+Reed-Solomon codec would send several and rebuild as many.
+
+Adaptive group size: every ACKed reliable message reports whether it needed a retransmission, the loss FEC did
+not repair. Every FEC_ADAPT_ACKS ACKs the group size of every space shrinks by one while that residual loss is
+above FEC_TARGET_LOSS and grows back by one, up to the configured size, once it is below a quarter of it. The
+unreliable space has no ACKs of its own and follows the reliable one (same path).
+"""
+
+FEC_HEADER = struct.Struct("!BBB")  # space, members, parity index
+FEC_MEMBER = struct.Struct("!BH")  # channel, length
+FEC_HISTORY = 256  # messages kept per space by the receiver; divides SEQ_MOD
+FEC_MAX_GROUP = 64
+FEC_MIN_GROUP = 2
+FEC_TARGET_LOSS = 0.01
+FEC_ADAPT_ACKS = 64
+
+# seq space of every channel FEC can protect
+FEC_SPACE = {CH_RELIABLE: CH_RELIABLE, CH_FRAGMENT: CH_RELIABLE, CH_STREAM: CH_RELIABLE, CH_UNRELIABLE: CH_UNRELIABLE}
+
+class XorParity:
+    # one parity packet per group: the XOR of its members (zero padded to the longest), rebuilds any single loss
+    parity_count = 1
+
+    def encode(self, members: List[bytes]) -> List[bytes]:
+        size = max(len(m) for m in members)
+        acc = 0
+        for m in members:
+            acc ^= int.from_bytes(m, "little")  # little endian: shorter members are zero padded at the end
+        return [acc.to_bytes(size, "little")]
+
+    def decode(self, members: List[Optional[bytes]], parities: List[Optional[bytes]]) -> Optional[List[bytes]]:
+        lost = [i for i, m in enumerate(members) if m is None]
+        if len(lost) != 1 or parities[0] is None:
+            return None
+        parity = parities[0]
+        acc = int.from_bytes(parity, "little")
+        for m in members:
+            if m is not None:
+                acc ^= int.from_bytes(m, "little")
+        if acc.bit_length() > 8 * len(parity):
+            return None
+        members = list(members)
+        members[lost[0]] = acc.to_bytes(len(parity), "little")
+        return members
+
+def fec_member(ch: int, payload: bytes) -> bytes:
+    return FEC_MEMBER.pack(ch, len(payload)) + payload
+
+class FecSender:
+    # sender side, caller holds send_lock
+    def __init__(self, group_sizes: Dict[int, int], adaptive: bool = True, codec=None):
+        for space, k in group_sizes.items():
+            if space not in (CH_RELIABLE, CH_UNRELIABLE):
+                raise ValueError(f"FEC protects CH_RELIABLE ({CH_RELIABLE}) and CH_UNRELIABLE ({CH_UNRELIABLE}), got {space}")
+            if not 0 < k <= FEC_MAX_GROUP:
+                raise ValueError(f"FEC group size must be in 1..{FEC_MAX_GROUP}, got {k}")
+        self.codec = codec if codec is not None else XorParity()
+        self.max_sizes = dict(group_sizes)
+        self.sizes = dict(group_sizes)  # current group size per space
+        self.adaptive = adaptive
+        self.groups: Dict[int, Tuple[int, List[bytes]]] = {}  # space -> (first seq, members so far)
+        self.residual_loss = 0.0
+        self.acks = 0
+        self.parity_sent = 0
+        self.parity_bytes = 0
+
+    def add(self, ch: int, seq: int, payload: bytes) -> List[Tuple[int, int, bytes]]:
+        # a message just sent; returns the parity packets to send after it, (first seq, members, CH_FEC payload)
+        space = FEC_SPACE.get(ch)
+        if space not in self.sizes:
+            return []
+        out = []
+        group = self.groups.get(space)
+        if group is not None and (group[0] + len(group[1])) % SEQ_MOD != seq:
+            # not the next seq (a message that went out of order, or one skipped by the metric packet)
+            out += self._close(space)
+            group = None
+        if group is None:
+            group = self.groups[space] = (seq, [])
+        group[1].append(fec_member(ch, payload))
+        if len(group[1]) >= self.sizes[space]:
+            out += self._close(space)
+        return out
+
+    def _close(self, space: int) -> List[Tuple[int, int, bytes]]:
+        first, members = self.groups.pop(space)
+        out = []
+        for i, parity in enumerate(self.codec.encode(members)):
+            out.append((first, len(members), FEC_HEADER.pack(space, len(members), i) + parity))
+            self.parity_sent += 1
+            self.parity_bytes += FEC_HEADER.size + len(parity)
+        return out
+
+    def on_ack(self, lost: bool):
+        # an ACKed reliable message; lost: it was retransmitted, FEC did not save it
+        if not self.adaptive:
+            return
+        self.residual_loss += (lost - self.residual_loss) / FEC_ADAPT_ACKS
+        self.acks += 1
+        if self.acks % FEC_ADAPT_ACKS:
+            return
+        for space, k in self.sizes.items():
+            if self.residual_loss > FEC_TARGET_LOSS:
+                self.sizes[space] = max(min(FEC_MIN_GROUP, self.max_sizes[space]), k - 1)
+            elif self.residual_loss < FEC_TARGET_LOSS / 4:
+                self.sizes[space] = min(self.max_sizes[space], k + 1)
+
+class FecReceiver:
+    # receiver side, rx thread only. A space's history only exists once parity for it has arrived.
+    def __init__(self, codec=None):
+        self.codec = codec if codec is not None else XorParity()
+        self.history: Dict[int, List[Optional[Tuple[int, bytes]]]] = {}  # space -> slot seq % FEC_HISTORY: (seq, member)
+        self.parity_recv = 0
+        self.recovered = 0
+        self.unrecoverable = 0  # groups that lost more than the codec can rebuild
+
+    def note(self, ch: int, seq: int, payload: bytes):
+        # a message arrived (or was rebuilt)
+        ring = self.history.get(FEC_SPACE.get(ch))
+        if ring is not None:
+            ring[seq % FEC_HISTORY] = (seq, fec_member(ch, payload))
+
+    def reset(self):
+        # the peer starts a new session at seq 0: forget what was kept, it would match the new seqs
+        for space in self.history:
+            self.history[space] = [None] * FEC_HISTORY
+
+    def recover(self, first: int, payload: bytes) -> List[Tuple[int, int, bytes]]:
+        # a CH_FEC packet; returns the rebuilt (channel, seq, payload) messages
+        self.parity_recv += 1
+        if len(payload) < FEC_HEADER.size:
+            return []
+        space, count, index = FEC_HEADER.unpack_from(payload)
+        if space not in (CH_RELIABLE, CH_UNRELIABLE) or not 0 < count <= FEC_MAX_GROUP:
+            return []
+        ring = self.history.get(space)
+        if ring is None:
+            # the first parity of this space: nothing of its group was kept, start keeping from here on
+            self.history[space] = [None] * FEC_HISTORY
+            return []
+        seqs = [(first + i) % SEQ_MOD for i in range(count)]
+        members = []
+        for seq in seqs:
+            slot = ring[seq % FEC_HISTORY]
+            members.append(slot[1] if slot is not None and slot[0] == seq else None)
+        if None not in members:
+            return []
+        parities = [None] * self.codec.parity_count
+        if index >= len(parities):
+            return []
+        parities[index] = bytes(payload[FEC_HEADER.size:])
+        rebuilt = self.codec.decode(members, parities)
+        if rebuilt is None:
+            self.unrecoverable += 1
+            return []
+        out = []
+        for seq, old, member in zip(seqs, members, rebuilt):
+            if old is not None or len(member) < FEC_MEMBER.size:
+                continue
+            ch, length = FEC_MEMBER.unpack_from(member)
+            if FEC_SPACE.get(ch) != space or FEC_MEMBER.size + length > len(member):
+                continue
+            out.append((ch, seq, member[FEC_MEMBER.size:FEC_MEMBER.size + length]))
+            self.recovered += 1
+        return out
@@ -0,0 +1,117 @@
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from gamenet_codec import SEQ_MOD
+
+"""
+Fragmentation of reliable messages larger than one datagram (channel CH_FRAGMENT).
+
+The sender splits such a message into MTU sized fragments on consecutive reliable seqs. Every fragment is an ordinary
+reliable message: ACKed, retransmitted and flow controlled on its own, so a loss costs one fragment, not the whole
+message as with an IP-fragmented datagram.
+
+CH_FRAGMENT payload: | fragment index (2B) | fragment count (2B) | message length (4B) | data |
+Every fragment but the last carries the same amount of data, so the receiver finds a fragment's place in the
+message without an offset field: index * len(data), the last one ends the message.
+
+The receiver allocates the message buffer at its full length on the first fragment to arrive (whichever it is)
+and copies each fragment's data straight into it from the receive buffer. The fragment itself only leaves a
+FragmentMark in the reorder buffer, so in-order delivery and gap skipping work unchanged; delivering the mark of
+the last fragment delivers the message (seq of its first fragment), if no fragment of it was skipped.
+
+Message buffers count against a reassembly budget in bytes. A fragment that would open a buffer beyond it is
+refused and must not be ACKed: the sender retransmits it once earlier messages have been delivered. The message at
+the delivery head is always admitted, so the stream never stalls on the budget.
+"""
+
+FRAGMENT_HEADER = struct.Struct("!HHI")  # index, count, message length
+MAX_FRAGMENTS = 0xFFFF
+DEFAULT_REASSEMBLY_BUDGET = 8 * 1024 * 1024
+
+def split_message(payload: bytes, chunk: int) -> List[bytes]:
+    # CH_FRAGMENT payloads of a message, chunk data bytes each (the last one less)
+    count = -(-len(payload) // chunk)
+    if count > MAX_FRAGMENTS:
+        raise ValueError(f"message of {len(payload)} bytes needs more than {MAX_FRAGMENTS} fragments")
+    view = memoryview(payload)
+    return [
+        FRAGMENT_HEADER.pack(i, count, len(payload)) + view[i * chunk:(i + 1) * chunk]
+        for i in range(count)
+    ]
+
+class FragmentMark:
+    # what a fragment leaves in the reorder buffer in place of its payload
+    __slots__ = ("first", "last")
+
+    def __init__(self, first: int, last: bool):
+        self.first = first
+        self.last = last
+
+class Reassembly:
+    # receiver side: messages being reassembled, keyed by the seq of their first fragment. Used by the one thread
+    # (or lock) that runs the reliable receive path.
+    def __init__(self, budget: int = DEFAULT_REASSEMBLY_BUDGET):
+        self.budget = budget
+        self.used = 0  # bytes of the buffers below
+        self.messages: Dict[int, list] = {}  # first seq -> [buffer, fragments missing, fragment count]
+        self.completed = 0
+        self.incomplete = 0  # a fragment was skipped, the message was dropped
+        self.refused = 0  # fragments not admitted for the budget (retransmitted later)
+
+    def put(self, seq: int, payload: bytes, expected_seq: int) -> Optional[FragmentMark]:
+        # copies a new (not duplicate) fragment into its message buffer. None: malformed or over the budget, the
+        # caller must not ACK it
+        if len(payload) < FRAGMENT_HEADER.size:
+            return None
+        index, count, length = FRAGMENT_HEADER.unpack_from(payload)
+        if index >= count:
+            return None
+        first = (seq - index) % SEQ_MOD
+        msg = self.messages.get(first)
+        if msg is None or msg[2] != count or len(msg[0]) != length:
+            if msg is not None:
+                # a message left over from before the seqs wrapped
+                self._drop(first)
+            head = (expected_seq - first) % SEQ_MOD < count
+            if self.used + length > self.budget and not head:
+                self.refused += 1
+                return None
+            msg = self.messages[first] = [bytearray(length), count, count]
+            self.used += length
+        data = payload[FRAGMENT_HEADER.size:]
+        start = index * len(data) if index < count - 1 else length - len(data)
+        if start < 0 or start + len(data) > length:
+            return None
+        msg[0][start:start + len(data)] = data
+        msg[1] -= 1
+        return FragmentMark(first, index == count - 1)
+
+    def complete(self, mark: FragmentMark) -> Optional[Tuple[int, bytearray]]:
+        # called as a mark is delivered in order: (first seq, message) once the last fragment's mark comes up
+        if not mark.last:
+            return None
+        msg = self.messages.get(mark.first)
+        if msg is None:
+            return None
+        self._drop(mark.first)
+        if msg[1]:
+            self.incomplete += 1
+            return None
+        self.completed += 1
+        return mark.first, msg[0]
+
+    def expire(self, expected_seq: int):
+        # after a gap skip: messages that ended before the new delivery head will never complete
+        for first, msg in list(self.messages.items()):
+            last = (first + msg[2] - 1) % SEQ_MOD
+            if 0 < (expected_seq - last) % SEQ_MOD < SEQ_MOD // 2:
+                self._drop(first)
+                self.incomplete += 1
+
+    def _drop(self, first: int):
+        msg = self.messages.pop(first)
+        self.used -= len(msg[0])
+
+    def reset(self):
+        self.messages.clear()
+        self.used = 0
@@ -0,0 +1,208 @@
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, Optional
+
+"""
+Constant-memory latency statistics for the H-UDP transport.
+
+Histogram is an HDR-style log-bucketed histogram of non-negative integers: values below 2**SUB_BITS get a bucket
+each, above that every power of two is split into 2**(SUB_BITS - 1) buckets, so any recorded value (max included)
+is reported within 1 / 2**(SUB_BITS - 1) (about 6%) of itself. A histogram is a fixed array of counters:
+recording is a few integer operations, two histograms merge by adding their counters, and percentiles walk the
+array once.
+
+ChannelHistograms groups the histograms kept per channel. Times are recorded in microseconds and reported in
+milliseconds.
+
+InstrumentedLock stands in for a transport's threading.Lock when lock_stats is on and keeps histograms of how
+long every acquire waited (per thread role) and how long the lock was then held.
+"""
+
+SUB_BITS = 5
+VALUE_BITS = 64
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+
+def _bucket(value: int) -> int:
+    if value < (1 << SUB_BITS):
+        return value
+    shift = value.bit_length() - SUB_BITS
+    return (shift << (SUB_BITS - 1)) + (value >> shift)
+
+def _bucket_high(index: int) -> int:
+    # largest value that lands in bucket index
+    if index < (1 << SUB_BITS):
+        return index
+    shift = (index >> (SUB_BITS - 1)) - 1
+    mantissa = index - (shift << (SUB_BITS - 1))
+    return ((mantissa + 1) << shift) - 1
+
+BUCKETS = _bucket((1 << VALUE_BITS) - 1) + 1
+
+class Histogram:
+    # counts cover every value below 2**VALUE_BITS, so record() needs no range check and any two histograms merge
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * BUCKETS))
+        self.sum = 0
+
+    def record(self, value: int):
+        # hot path: _bucket() inlined, no sample count or max kept (both are derived from counts when read).
+        # Negative values (clock skew between hosts) count as 0.
+        if value >= (1 << SUB_BITS):
+            shift = value.bit_length() - SUB_BITS
+            self.counts[(shift << (SUB_BITS - 1)) + (value >> shift)] += 1
+            self.sum += value
+        elif value > 0:
+            self.counts[value] += 1
+            self.sum += value
+        else:
+            self.counts[0] += 1
+
+    def merge(self, other: "Histogram"):
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.sum += other.sum
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.sum = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def max(self) -> int:
+        # upper edge of the highest non-empty bucket, 0 when empty
+        counts = self.counts
+        for i in range(len(counts) - 1, -1, -1):
+            if counts[i]:
+                return _bucket_high(i)
+        return 0
+
+    def percentile(self, q: float, total: Optional[int] = None) -> Optional[int]:
+        # smallest recorded bucket covering q% of the samples, reported as its upper edge
+        if total is None:
+            total = self.total
+        if not total:
+            return None
+        rank = max(1, -(-total * q // 100))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return _bucket_high(i)
+        return self.max
+
+    def percentiles(self, qs: Iterable[float] = DEFAULT_PERCENTILES, scale: float = 1.0) -> Dict[str, Optional[float]]:
+        # {"p50": .., "p90": .., ..., "max": .., "mean": .., "count": n}, values divided by scale
+        total = self.total
+        out: Dict[str, Optional[float]] = {}
+        for q in qs:
+            v = self.percentile(q, total)
+            out[f"p{q:g}"] = None if v is None else v / scale
+        out["max"] = self.max / scale if total else None
+        out["mean"] = self.sum / total / scale if total else None
+        out["count"] = total
+        return out
+
+class ChannelHistograms:
+    # one channel's distributions: one-way latency and delivery delay (time from arrival until the message is
+    # handed to the app, i.e. head-of-line blocking) on the receive side, RTT and retransmissions per message on
+    # the send side
+    US_PER_MS = 1000
+
+    def __init__(self):
+        self.latency_us = Histogram()
+        self.delivery_delay_us = Histogram()
+        self.rtt_us = Histogram()
+        self.retries = Histogram()
+
+    def merge(self, other: "ChannelHistograms"):
+        self.latency_us.merge(other.latency_us)
+        self.delivery_delay_us.merge(other.delivery_delay_us)
+        self.rtt_us.merge(other.rtt_us)
+        self.retries.merge(other.retries)
+
+    def reset(self):
+        self.latency_us.reset()
+        self.delivery_delay_us.reset()
+        self.rtt_us.reset()
+        self.retries.reset()
+
+    def percentiles(self, qs: Iterable[float] = DEFAULT_PERCENTILES) -> dict:
+        return {
+            "latency_ms": self.latency_us.percentiles(qs, self.US_PER_MS),
+            "delivery_delay_ms": self.delivery_delay_us.percentiles(qs, self.US_PER_MS),
+            "rtt_ms": self.rtt_us.percentiles(qs, self.US_PER_MS),
+            "retries": self.retries.percentiles(qs),
+        }
+
+class InstrumentedLock:
+    # threading.Lock (also as the lock of a threading.Condition) that records, in ns, how long each acquire waited,
+    # per thread role: the transport's own threads ("gamenet-*") by name, every other thread as "app", and how long
+    # the lock was held. Only the owner of the lock writes its histograms, so recording needs no lock of its own.
+    APP_ROLE = "app"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.owner: Optional[int] = None
+        self.acquired_ns = 0
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_ns: Dict[str, Histogram] = {}
+        self.hold_ns = Histogram()
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        wait = 0
+        if not self.lock.acquire(False):
+            if not blocking:
+                return False
+            t0 = time.perf_counter_ns()
+            if not self.lock.acquire(True, timeout):
+                return False
+            wait = time.perf_counter_ns() - t0
+            self.contended += 1
+        self.owner = threading.get_ident()
+        self.acquisitions += 1
+        role = threading.current_thread().name
+        if not role.startswith("gamenet-"):
+            role = self.APP_ROLE
+        hist = self.wait_ns.get(role)
+        if hist is None:
+            hist = self.wait_ns[role] = Histogram()
+        hist.record(wait)
+        self.acquired_ns = time.perf_counter_ns()
+        return True
+
+    def release(self):
+        self.hold_ns.record(time.perf_counter_ns() - self.acquired_ns)
+        self.owner = None
+        self.lock.release()
+
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+    def _is_owned(self) -> bool:
+        # used by threading.Condition; without it the Condition probes with acquire(False), which would be counted
+        return self.owner == threading.get_ident()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self, qs: Iterable[float] = DEFAULT_PERCENTILES) -> dict:
+        # {"acquisitions", "contended", "hold_us": {...}, "wait_us": {role: {...}}}, percentiles in microseconds
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "hold_us": self.hold_ns.percentiles(qs, 1000),
+            "wait_us": {role: hist.percentiles(qs, 1000) for role, hist in list(self.wait_ns.items())},
+        }
@@ -0,0 +1,244 @@
+import heapq
+import itertools
+import random
+import selectors
+import socket
+import threading
+import time
+from typing import List, Optional, Tuple
+
+"""
+Network emulator for testing the H-UDP transport: loss, delay, jitter, reordering, duplication, corruption and a
+bandwidth cap, without a thread or socket per datagram.
+
+A Link holds the impairments of one direction and turns every datagram into zero or more (deliver_at, bytes)
+copies. Copies wait in a single min-heap ordered by delivery time (DelayQueue) and go out on the wire when due.
+Two ways to drive it:
+  - NetworkEmulator: in process. wrap(sock, link) returns a socket whose sendto() only schedules the datagram;
+    one scheduler thread sends every due datagram of every wrapped socket. Pass the wrapped socket to
+    GameNetAPI as .sock to put a link between two endpoints in the same process.
+  - UdpProxy: a standalone proxy between a client and a server port (what unrelinet.py runs). One thread does
+    everything: select() on both sockets with the next delivery time as timeout.
+
+Link model, in order: the datagram queues behind the bottleneck (bandwidth_bps, dropped if it would wait longer
+than queue_ms), is lost with probability loss, otherwise delayed by delay_ms + uniform(0, jitter_ms) (plus
+reorder_ms with probability reorder, which lets later datagrams overtake it). With probability duplicate a
+second, independently delayed copy is sent; every copy has one bit flipped with probability corrupt.
+"""
+
+DEFAULT_QUEUE_MS = 200.0
+DEFAULT_REORDER_MS = 20.0
+PROXY_BUF_SIZE = 65535
+
+class Link:
+    def __init__(
+        self,
+        loss: float = 0.0,
+        delay_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        reorder: float = 0.0,
+        reorder_ms: float = DEFAULT_REORDER_MS,
+        duplicate: float = 0.0,
+        corrupt: float = 0.0,
+        bandwidth_bps: float = 0,
+        queue_ms: float = DEFAULT_QUEUE_MS,
+        seed: Optional[int] = None,
+    ):
+        for name, p in (("loss", loss), ("reorder", reorder), ("duplicate", duplicate), ("corrupt", corrupt)):
+            if not 0.0 <= p <= 1.0:
+                raise ValueError(f"{name} must be a probability in [0, 1], got {p}")
+        for name, v in (("delay_ms", delay_ms), ("jitter_ms", jitter_ms), ("reorder_ms", reorder_ms),
+                        ("bandwidth_bps", bandwidth_bps), ("queue_ms", queue_ms)):
+            if v < 0:
+                raise ValueError(f"{name} must not be negative, got {v}")
+        self.loss = loss
+        self.delay_s = delay_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.reorder = reorder
+        self.reorder_s = reorder_ms / 1000
+        self.duplicate = duplicate
+        self.corrupt = corrupt
+        self.bandwidth_bps = bandwidth_bps
+        self.queue_s = queue_ms / 1000
+        self.rng = random.Random(seed)
+        self.free_at = 0.0  # monotonic time the bottleneck has sent everything queued so far
+
+        self.sent = 0
+        self.queue_dropped = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicated = 0
+        self.corrupted = 0
+
+    def plan(self, data: bytes, now: float) -> List[Tuple[float, bytes]]:
+        # the copies of one datagram that reach the other side, with their monotonic delivery times
+        rng = self.rng
+        self.sent += 1
+        start = now
+        if self.bandwidth_bps:
+            start = max(now, self.free_at)
+            if start - now > self.queue_s:
+                self.queue_dropped += 1
+                return []
+            self.free_at = start + len(data) * 8 / self.bandwidth_bps
+            start = self.free_at
+        if self.loss and rng.random() < self.loss:
+            self.lost += 1
+            return []
+        copies = [(start + self._delay(), self._maybe_corrupt(data))]
+        if self.duplicate and rng.random() < self.duplicate:
+            self.duplicated += 1
+            copies.append((start + self._delay(), self._maybe_corrupt(data)))
+        return copies
+
+    def _delay(self) -> float:
+        delay = self.delay_s
+        if self.jitter_s:
+            delay += self.rng.random() * self.jitter_s
+        if self.reorder and self.rng.random() < self.reorder:
+            self.reordered += 1
+            delay += self.reorder_s
+        return delay
+
+    def _maybe_corrupt(self, data: bytes) -> bytes:
+        if not self.corrupt or not data or self.rng.random() >= self.corrupt:
+            return data
+        self.corrupted += 1
+        bit = self.rng.randrange(len(data) * 8)
+        out = bytearray(data)
+        out[bit >> 3] ^= 1 << (bit & 7)
+        return bytes(out)
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "queue_dropped": self.queue_dropped,
+            "lost": self.lost,
+            "reordered": self.reordered,
+            "duplicated": self.duplicated,
+            "corrupted": self.corrupted,
+        }
+
+class DelayQueue:
+    # datagrams in flight: min-heap of (deliver_at, tie, socket, data, addr)
+    def __init__(self):
+        self.heap = []
+        self.tie = itertools.count()
+
+    def push(self, link: Link, data: bytes, sock, addr, now: float) -> bool:
+        # True if the head of the queue changed (the scheduler has to wake up earlier)
+        head = self.heap[0][0] if self.heap else None
+        for deliver_at, copy in link.plan(data, now):
+            heapq.heappush(self.heap, (deliver_at, next(self.tie), sock, copy, addr))
+        return bool(self.heap) and self.heap[0][0] != head
+
+    def next_deadline(self) -> Optional[float]:
+        return self.heap[0][0] if self.heap else None
+
+    def send_due(self, now: float) -> int:
+        heap = self.heap
+        n = 0
+        while heap and heap[0][0] <= now:
+            _, _, sock, data, addr = heapq.heappop(heap)
+            try:
+                sock.sendto(data, addr)
+            except OSError:
+                pass
+            n += 1
+        return n
+
+class EmulatedSocket:
+    # stands in for a UDP socket: sendto() goes through the link, everything else is the real socket
+    def __init__(self, sock: socket.socket, link: Link, emulator: "NetworkEmulator"):
+        self.sock = sock
+        self.link = link
+        self.emulator = emulator
+
+    def sendto(self, data, addr) -> int:
+        # copy: callers reuse their buffers (retransmissions restamp frames in place)
+        self.emulator.submit(self.sock, self.link, bytes(data), addr)
+        return len(data)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+class NetworkEmulator:
+    def __init__(self):
+        self.queue = DelayQueue()
+        self.cv = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def wrap(self, sock: socket.socket, link: Link) -> EmulatedSocket:
+        return EmulatedSocket(sock, link, self)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        with self.cv:
+            self.running = False
+            self.cv.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+    def submit(self, sock, link: Link, data: bytes, addr):
+        with self.cv:
+            if self.queue.push(link, data, sock, addr, time.monotonic()):
+                self.cv.notify()
+
+    def _run(self):
+        queue = self.queue
+        with self.cv:
+            while self.running:
+                queue.send_due(time.monotonic())
+                deadline = queue.next_deadline()
+                self.cv.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+class UdpProxy:
+    # client <-> listen_addr [forward link] -> server_addr, replies back over the backward link to the client
+    # that sent last. Single threaded.
+    def __init__(self, listen_addr: Tuple[str, int], server_addr: Tuple[str, int], forward: Link, backward: Link):
+        self.server_addr = server_addr
+        self.forward = forward
+        self.backward = backward
+        self.listen = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen.bind(listen_addr)
+        self.upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.upstream.bind((listen_addr[0], 0))
+        self.client_addr: Optional[Tuple[str, int]] = None
+        self.queue = DelayQueue()
+        self.running = False
+
+    def serve_forever(self):
+        sel = selectors.DefaultSelector()
+        sel.register(self.listen, selectors.EVENT_READ)
+        sel.register(self.upstream, selectors.EVENT_READ)
+        queue = self.queue
+        self.running = True
+        try:
+            while self.running:
+                deadline = queue.next_deadline()
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                for key, _ in sel.select(timeout):
+                    try:
+                        data, addr = key.fileobj.recvfrom(PROXY_BUF_SIZE)
+                    except OSError:
+                        # ICMP port unreachable from an earlier send, the peer is not up yet
+                        continue
+                    now = time.monotonic()
+                    if key.fileobj is self.listen:
+                        self.client_addr = addr
+                        queue.push(self.forward, data, self.upstream, self.server_addr, now)
+                    elif self.client_addr is not None:
+                        queue.push(self.backward, data, self.listen, self.client_addr, now)
+                queue.send_due(time.monotonic())
+        finally:
+            sel.close()
+
+    def close(self):
+        self.running = False
+        self.listen.close()
+        self.upstream.close()
@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+"""
+Send scheduler for the H-UDP transport: the thread that calls sendto() for a GameNetAPI, with priority classes and
+token bucket pacing.
+
+Packets are submitted in a priority class and leave strictly by class, FIFO within one:
+  PRIO_RETX        retransmissions, what the peer has been waiting for longest
+  PRIO_RELIABLE    fresh reliable messages (any datagram carrying one) and their FEC parity
+  PRIO_UNRELIABLE  unreliable messages, snapshots and their parity
+A datagram holding a single unreliable message or snapshot may come with a supersede key (its channel): a newer
+datagram with the same key drops it if it is still queued, since the receiver only keeps the newest anyway
+(freshest-wins). Bundles are never dropped. The transport only passes keys when it paces (or is told to), an
+unpaced queue drains at once and only ever holds what the writer has not caught up with.
+
+Pacing: given a rate, a token bucket of burst bytes refilled at that rate lets the next datagram out as soon as
+the bucket is out of debt (tokens >= 0) and charges its full size, so datagrams go out whole and the average rate
+holds. Without a rate every queued datagram goes out at once, as with PacketWriter.
+
+A datagram may carry a departure token (submit(..., sent=token)); once it has gone out the writer hands the
+tokens of its batch to on_sent, and the transport starts RTT clocks and retransmission timers there, so neither
+pacing delay nor retransmissions jumping the queue ahead of a datagram are mistaken for path delay or loss.
+
+Rate "auto" estimates the bottleneck from the delivery rate, BBR style. A sample is the bytes delivered over one
+run of ACKs, from the first ACK after a gap longer than RATE_GAP_S to the last before the next one (cut at
+RATE_SAMPLE_MAX_S under steady traffic) and at least RATE_GAP_S long: reliable bytes the peer ACKed, plus what
+went out in the unreliable class meanwhile (no ACKs, counted as delivered). A burst drains through the bottleneck
+at its rate, so its ACKs come back at that rate however idle the sender is between bursts, and a whole run evens
+out ACKs that are processed in batches. The rate is the largest of the last RATE_SAMPLES samples times a gain
+cycling through RATE_GAINS, one sample each: the probing sample lets the estimate grow past the rate it paces at.
+Nothing is paced before the first sample.
+"""
+
+PRIO_RETX = 0
+PRIO_RELIABLE = 1
+PRIO_UNRELIABLE = 2
+PRIORITIES = 3
+PACING_AUTO = "auto"
+RATE_SAMPLES = 10
+RATE_GAINS = (1.25, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0)
+RATE_GAP_S = 0.01  # an ACK gap longer than this ends a delivery rate sample, which is at least this long
+RATE_SAMPLE_MAX_S = 0.1
+IDLE_WAIT_S = 0.2  # an idle scheduler re-checks whether it should stop this often
+
+class SendScheduler:
+    # drop-in for PacketWriter with submit(pkt, addr, prio, key, sent). rate_bps: None (not paced), bits per second,
+    # or PACING_AUTO. lock: the lock behind the scheduler's condition (an InstrumentedLock with lock_stats).
+    # on_sent(tokens): called by the writer thread, without the lock, with the departure tokens of every batch
+    def __init__(
+        self,
+        sock,
+        rate_bps=None,
+        burst_bytes: int = 0,
+        lock=None,
+        name: str = "gamenet-writer",
+        on_sent: Optional[Callable[[list], None]] = None,
+    ):
+        self.sock = sock
+        self.on_sent = on_sent
+        self.cv = threading.Condition(lock if lock is not None else threading.Lock())
+        # per class: entries [packet, addr, key, departure token]; a superseded entry stays queued with packet None
+        self.queues: List[Deque[list]] = [deque() for _ in range(PRIORITIES)]
+        self.keyed: Dict[object, list] = {}  # supersede key -> its queued entry
+        self.queued = 0
+        self.superseded = 0
+        self.errors = 0
+        self.sent_bytes = [0] * PRIORITIES
+        self.queued_bytes = [0] * PRIORITIES
+
+        self.auto = rate_bps == PACING_AUTO
+        self.rate_bps = 0.0 if self.auto or rate_bps is None else float(rate_bps)  # 0: not paced
+        self.burst = burst_bytes
+        self.tokens = float(burst_bytes)
+        self.refilled_at = time.monotonic()
+        # delivery rate samples (auto)
+        self.samples: Deque[float] = deque(maxlen=RATE_SAMPLES)
+        self.gain_index = 0
+        self.sample_start: Optional[float] = None
+        self.last_delivery = 0.0
+        self.delivered = 0
+        self.delivered_unacked = 0  # unreliable class bytes sent by the last ACK of the sample
+
+        self.idle = False
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, pkt: bytes, addr: Tuple[str, int], prio: int = PRIO_RELIABLE, key=None, sent=None) -> bool:
+        # True if pkt superseded a queued datagram with the same key, which will never be sent
+        entry = [pkt, addr, key, sent]
+        superseded = False
+        with self.cv:
+            if key is not None:
+                old = self.keyed.get(key)
+                if old is not None:
+                    self.queued_bytes[prio] -= len(old[0])
+                    old[0] = None
+                    self.queued -= 1
+                    self.superseded += 1
+                    superseded = True
+                self.keyed[key] = entry
+            self.queues[prio].append(entry)
+            self.queued += 1
+            self.queued_bytes[prio] += len(pkt)
+            if self.idle:
+                self.cv.notify()
+        return superseded
+
+    def on_delivered(self, nbytes: int):
+        # reliable bytes the peer just ACKed, feeds the rate estimate (auto only)
+        if not self.auto:
+            return
+        with self.cv:
+            now = time.monotonic()
+            if self.sample_start is not None and now - self.last_delivery > RATE_GAP_S:
+                self._end_sample_locked(now)
+            if self.sample_start is None:
+                # the first ACK of a run only marks its start
+                self.sample_start = self.last_delivery = now
+                self.sent_bytes[PRIO_UNRELIABLE] = 0
+                self.delivered = self.delivered_unacked = 0
+                return
+            self.last_delivery = now
+            self.delivered += nbytes
+            self.delivered_unacked = self.sent_bytes[PRIO_UNRELIABLE]
+            if now - self.sample_start >= RATE_SAMPLE_MAX_S:
+                self._end_sample_locked(now)
+
+    def _end_sample_locked(self, now: float):
+        elapsed = self.last_delivery - self.sample_start
+        self.sample_start = None
+        if elapsed < RATE_GAP_S:
+            return
+        self.samples.append((self.delivered + self.delivered_unacked) * 8 / elapsed)
+        self.gain_index = (self.gain_index + 1) % len(RATE_GAINS)
+        self._set_rate_locked(max(self.samples) * RATE_GAINS[self.gain_index], now)
+
+    def set_rate(self, rate_bps: float):
+        # bits per second, 0 stops pacing
+        with self.cv:
+            self._set_rate_locked(rate_bps, time.monotonic())
+
+    def _set_rate_locked(self, rate_bps: float, now: float):
+        self._refill(now)
+        self.rate_bps = rate_bps
+        self.cv.notify()
+
+    def _refill(self, now: float):
+        if self.rate_bps:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate_bps / 8)
+        else:
+            self.tokens = self.burst
+        self.refilled_at = now
+
+    def _take_locked(self, batch: List[list]) -> Optional[float]:
+        # moves what may go out now into batch, highest class first. Returns the seconds until the bucket lets
+        # the next queued datagram out, None when nothing is left
+        paced = self.rate_bps > 0
+        if paced:
+            self._refill(time.monotonic())
+        for prio, queue in enumerate(self.queues):
+            while queue:
+                entry = queue[0]
+                pkt = entry[0]
+                if pkt is None:
+                    queue.popleft()
+                    continue
+                if paced:
+                    if self.tokens < 0:
+                        return -self.tokens * 8 / self.rate_bps
+                    self.tokens -= len(pkt)
+                queue.popleft()
+                self.queued -= 1
+                self.queued_bytes[prio] -= len(pkt)
+                if entry[2] is not None and self.keyed.get(entry[2]) is entry:
+                    del self.keyed[entry[2]]
+                self.sent_bytes[prio] += len(pkt)
+                batch.append(entry)
+        return None
+
+    def _run(self):
+        sendto = self.sock.sendto
+        batch = []
+        departed = []
+        while True:
+            with self.cv:
+                while True:
+                    wait = self._take_locked(batch)
+                    if batch:
+                        break
+                    if wait is not None:
+                        # out of tokens: the next submit needs no wakeup, the bucket decides
+                        self.cv.wait(wait)
+                        continue
+                    if not self.running:
+                        return
+                    self.idle = True
+                    self.cv.wait(IDLE_WAIT_S)
+                    self.idle = False
+            for pkt, addr, _, sent in batch:
+                try:
+                    sendto(pkt, addr)
+                except OSError:
+                    # counts as gone too: the transport's retransmission timer takes care of it
+                    self.errors += 1
+                if sent is not None:
+                    departed.append(sent)
+            batch.clear()
+            if departed:
+                if self.on_sent is not None:
+                    self.on_sent(departed)
+                departed = []
+
+    def close(self):
+        # sends what is still queued (paced), then stops
+        with self.cv:
+            self.running = False
+            self.cv.notify()
+        self.thread.join()
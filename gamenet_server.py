@@ -0,0 +1,755 @@
+import socket
+import threading
+import time
+import zlib
+import heapq
+import itertools
+from collections import deque
+from operator import attrgetter
+from typing import Optional, Tuple, List, Dict
+
+from gamenet_codec import (
+    CH_RELIABLE, CH_UNRELIABLE, CH_ACK, CH_METRIC, CH_BUNDLE, CH_FRAGMENT, CH_STREAM, CH_CLOCK, CLOCK_PROBE,
+    CLOCK_REPLY, SEQ_MOD, HEADER_SIZE, SACK_BITS, HEADER, CRC_OFFSET, WINDOW_UNLIMITED, ECHO, now_ms, ts_diff, build_packet, restamp,
+    iter_bundle, ack_window, ack_echo,
+)
+from gamenet_metrics import ChannelHistograms, DEFAULT_PERCENTILES
+from gamenet_clock import ClockSync
+from gamenet_fragment import FRAGMENT_HEADER, FragmentMark, Reassembly
+from gamenet_stream import STREAM_HEADER, StreamSet
+from gamenet_trace import PacketTrace, DEFAULT_TRACE_RECORDS, TRACE_TX, TRACE_RETX, TRACE_RX, TRACE_ACKED, TRACE_DROP
+from gamenet_api import (
+    SackTracker, RtoEstimator, CongestionController, PacketWriter, check_timeouts, ack_pending, new_lock,
+    DEFAULT_RECV_WINDOW, RX_BATCH, RX_DRAIN, RX_BUF_SIZE, RX_IDLE_TIMEOUT, MSG_DONTWAIT, set_rx_timeout,
+)
+
+"""
+Server mode of the H-UDP transport: one socket, many peers.
+
+Same wire protocol as GameNetAPI (see gamenet_api.py), so every client is a plain GameNetAPI or AsyncGameNetAPI
+pointed at the server's address. Instead of one instance (a socket and two threads) per client:
+  - a single bound socket and a session table keyed by the peer's (host, port); a session is created by the
+    first valid packet from a new address (or the first send() to it), up to max_sessions
+  - PeerSession objects use __slots__ and hold only the per-peer protocol state: seq counters, pending reliable
+    packets, SACK/RTO/congestion state, the reorder buffer and a few counters
+  - one rx thread serves every session: parses, ACKs (one coalesced ACK per peer per receive batch), reorders and
+    runs the per-peer ACK-delay and gap-skip deadlines from a single heap
+  - one timer thread runs the retransmissions of every session from a single deadline heap and expires sessions
+    that have been silent for idle_timeout_s
+  - a client's metric packet (sent by GameNetAPI.close()) is ACKed and ends its session
+  - recv() returns (peer addr, channel, seq, timestamp_ms, payload, stream) tuples
+  - latency/RTT/retries/delivery delay histograms are kept server wide per channel (per-session histograms would
+    cost kilobytes per peer); get_percentiles() reports them
+  - packets built under the server lock (sends, retransmissions) go out through a PacketWriter thread, ACKs are
+    sent by the rx thread itself; lock_stats=True instruments the locks (get_lock_stats())
+  - with trace_path, packets of every peer are recorded in one binary trace (gamenet_trace.py), one flow per peer
+  - fragmented messages from clients (gamenet_fragment.py) are reassembled per session, within
+    reassembly_budget bytes per session; the buffers only exist while a message is being put together
+  - stream messages from clients (gamenet_stream.py) are ordered within their stream, per session, and come out
+    on channel 0 with their stream (everything else has stream 0); a session's StreamSet is created by its first
+    stream message. Sends go on stream 0 only
+  - every session estimates its client's clock like GameNetAPI does (gamenet_clock.py): from the ACKs of what
+    the server sent, or else from clock probes (channel 10) while the client sends; latencies are one way, on the
+    client's clock as estimated. ACKs echo the timestamps clients estimate the server's clock from, and their
+    probes are answered
+
+Server to client reliable sends never block: beyond min(cwnd, peer window) they wait in the session's backlog.
+"""
+
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_IDLE_TIMEOUT_S = 30.0
+SWEEP_INTERVAL_S = 1.0
+SERVER_RCVBUF = 4 * 1024 * 1024
+# per-session counters that get_metrics() reports as server totals, closed sessions included
+SESSION_COUNTERS = ("reli_recv", "unreli_recv", "retransmissions", "reorder_dropped")
+# per session: thousands of peers each holding the client default of 8 MiB would be too much to allow
+SESSION_REASSEMBLY_BUDGET = 1024 * 1024
+
+class PendingPacket:
+    __slots__ = ("payload", "frame", "send_timestamp", "retries")
+
+    def __init__(self, payload: bytes, frame: bytearray, send_timestamp: int):
+        self.payload = payload
+        self.frame = frame
+        self.send_timestamp = send_timestamp
+        self.retries = 0
+
+# timing(entry) of ack_pending() for PendingPacket entries
+PENDING_TIMING = attrgetter("send_timestamp", "retries")
+
+class PeerSession:
+    __slots__ = (
+        "addr", "last_seen", "closed",
+        # send side, guarded by the server lock
+        "next_reliable_seq", "snd_una", "pending", "backlog", "last_unreliable_seq_tx", "rto", "cc", "peer_rwnd",
+        # receive side, rx thread only
+        "sack", "ack_queued", "rx_synced", "expected_seq", "buffer", "gap_deadline", "last_unreliable_seq_rx",
+        "reassembly", "streams", "clock", "clock_offset_ms",
+        # counters
+        "reli_sent", "unreli_sent", "reli_recv", "unreli_recv", "bytes_recv", "retransmissions", "reorder_dropped",
+    )
+
+    def __init__(self, addr: Tuple[str, int], rto: RtoEstimator, cc: CongestionController, ack_delay_ms: int):
+        self.addr = addr
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self.next_reliable_seq = 0
+        self.snd_una = 0
+        self.pending: Dict[int, PendingPacket] = {}
+        self.backlog: deque = deque()  # (seq, payload) waiting for the window
+        self.last_unreliable_seq_tx: Optional[int] = None
+        self.rto = rto
+        self.cc = cc
+        self.peer_rwnd = WINDOW_UNLIMITED
+        self.sack = SackTracker(ack_delay_ms)
+        self.ack_queued = False
+        self.rx_synced = False  # set by the first reliable packet, see _handle_reliable_rx
+        self.expected_seq = 0
+        # seq -> (ts_ms, payload, arrival ms); payload None: a stream message, delivered by its stream
+        self.buffer: Dict[int, Tuple[int, Optional[bytes], int]] = {}
+        self.gap_deadline: Optional[float] = None
+        self.last_unreliable_seq_rx: Optional[int] = None
+        self.reassembly: Optional[Reassembly] = None  # created by the first fragment
+        self.streams: Optional[StreamSet] = None  # created by the first stream message
+        self.clock = ClockSync()
+        self.clock_offset_ms = 0  # client clock - server clock, rounded, added to every one-way latency
+        self.reli_sent = 0
+        self.unreli_sent = 0
+        self.reli_recv = 0
+        self.unreli_recv = 0
+        self.bytes_recv = 0
+        self.retransmissions = 0
+        self.reorder_dropped = 0
+
+class GameNetServer:
+    def __init__(
+        self,
+        local_addr: Tuple[str, int],
+        retransmission_timeout_ms: int = 50,
+        gap_skip_timeout_ms: int = 200,
+        ack_delay_ms: int = 0,
+        adaptive_rto: bool = True,
+        min_rto_ms: int = 10,
+        max_rto_ms: int = 1000,
+        congestion_control: bool = False,
+        initial_cwnd: int = 16,
+        recv_window: int = DEFAULT_RECV_WINDOW,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S,
+        reuse_port: bool = False,
+        trace_path: Optional[str] = None,
+        trace_records: int = DEFAULT_TRACE_RECORDS,
+        send_thread: bool = True,
+        lock_stats: bool = False,
+        reassembly_budget: int = SESSION_REASSEMBLY_BUDGET
+    ):
+        max_rto_ms = check_timeouts(retransmission_timeout_ms, gap_skip_timeout_ms, ack_delay_ms, min_rto_ms, max_rto_ms)
+        if not 0 < recv_window < WINDOW_UNLIMITED:
+            raise ValueError(f"recv_window must be in 1..{WINDOW_UNLIMITED - 1}, got {recv_window}")
+        if max_sessions <= 0:
+            raise ValueError(f"max_sessions must be positive, got {max_sessions}")
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # several processes bind the same port and the kernel spreads peers over them (see gamenet_shard.py)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        try:
+            # thousands of peers burst into one socket, give the kernel room to queue them
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SERVER_RCVBUF)
+        except OSError:
+            pass
+        self.sock.bind(local_addr)
+        self.sock.settimeout(None)
+        self.local_addr = self.sock.getsockname()
+
+        self.retransmission_timeout_ms = retransmission_timeout_ms
+        self.gap_skip_timeout_ms = gap_skip_timeout_ms
+        self.ack_delay_ms = ack_delay_ms
+        self.adaptive_rto = adaptive_rto
+        self.min_rto_ms = min_rto_ms
+        self.max_rto_ms = max_rto_ms
+        self.congestion_control = congestion_control
+        self.initial_cwnd = initial_cwnd
+        self.recv_window = recv_window
+        self.max_sessions = max_sessions
+        self.idle_timeout_s = idle_timeout_s
+        self.reassembly_budget = reassembly_budget
+
+        self.running = False
+        self.rx_thread = None
+        self.timer_thread = None
+        self.rx_pool = [bytearray(RX_BUF_SIZE) for _ in range(RX_BATCH)]
+        self.send_thread = send_thread
+        self.writer: Optional[PacketWriter] = None
+        self.locks = {} if lock_stats else None
+
+        # session table and everything on the send side of every session
+        self.lock = new_lock("lock", self.locks)
+        self.sessions: Dict[Tuple[str, int], PeerSession] = {}
+        # retransmission deadlines of all sessions: (deadline, tie, session, seq, packet), dropped lazily once the
+        # packet is no longer pending in its session
+        self.retx_heap = []
+        self.retx_tie = itertools.count()
+        self.retx_cv = threading.Condition(self.lock)
+
+        # ACK-delay and gap-skip deadlines of all sessions (rx thread only): (deadline, tie, session)
+        self.rx_timers = []
+        self.rx_tie = itertools.count()
+        self.ack_dirty: List[PeerSession] = []  # sessions owing an ACK at the end of this receive batch
+
+        # messages ready to be delivered to the application: (peer addr, channel, seq, ts_ms, payload, stream)
+        self.app_recv_q = deque()
+        self.app_recv_q_lock = new_lock("app_recv_q_lock", self.locks)
+        self.app_recv_cv = threading.Condition(self.app_recv_q_lock)
+
+        self.histograms = {CH_RELIABLE: ChannelHistograms(), CH_UNRELIABLE: ChannelHistograms()}
+        self.sessions_opened = 0
+        self.sessions_closed = 0
+        self.sessions_refused = 0
+        self.packets_recv = 0
+        self.closed_counts = dict.fromkeys(SESSION_COUNTERS, 0)  # folded in from sessions as they close
+        self.tracer = PacketTrace(trace_path, trace_records) if trace_path else None
+
+    def start(self):
+        self.running = True
+        if self.send_thread:
+            self.writer = PacketWriter(self.sock)
+        self.rx_thread = threading.Thread(target=self._rx_worker, name="gamenet-rx", daemon=True)
+        self.rx_thread.start()
+        self.timer_thread = threading.Thread(target=self._timer_worker, name="gamenet-timer", daemon=True)
+        self.timer_thread.start()
+
+    def close(self):
+        self.running = False
+        with self.retx_cv:
+            self.retx_cv.notify_all()
+        if self.writer is not None:
+            self.writer.close()
+        if self.tracer is not None:
+            self.tracer.flush()
+        try:
+            self.sock.close()
+        except Exception:
+            print("Failed to close sock")
+
+    def send(self, addr: Tuple[str, int], payload: bytes, reliable: bool = True) -> int:
+        # a new peer gets a session on its first send; ConnectionRefusedError once max_sessions are open
+        with self.lock:
+            sess = self._session_locked(addr)
+            if sess is None:
+                raise ConnectionRefusedError(f"session table full ({self.max_sessions} peers)")
+            if not reliable:
+                seq = 0 if sess.last_unreliable_seq_tx is None else (sess.last_unreliable_seq_tx + 1) % SEQ_MOD
+                sess.last_unreliable_seq_tx = seq
+                sess.unreli_sent += 1
+                self._submit(build_packet(CH_UNRELIABLE, seq, payload), addr)
+                if self.tracer is not None:
+                    self.tracer.record(TRACE_TX, CH_UNRELIABLE, seq, now_ms(), len(payload), 0, 0, addr)
+                return seq
+            seq = sess.next_reliable_seq
+            sess.next_reliable_seq = (seq + 1) % SEQ_MOD
+            sess.reli_sent += 1
+            if sess.backlog or not self._window_open(sess):
+                sess.backlog.append((seq, payload))
+            else:
+                self._transmit_locked(sess, seq, payload)
+            return seq
+
+    def recv(self, timeout_ms: int = 100) -> List[Tuple[Tuple[str, int], int, int, int, bytes, int]]:
+        # Waits for delivered msgs and returns a list of (peer addr, channel, seq, timestamp_ms, payload, stream)
+        deadline = time.monotonic() + max(0, timeout_ms) / 1000
+        received_packets = []
+        with self.app_recv_cv:
+            while not self.app_recv_q:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return received_packets
+                self.app_recv_cv.wait(remaining)
+            while self.app_recv_q and len(received_packets) < 256:
+                received_packets.append(self.app_recv_q.popleft())
+        return received_packets
+
+    def disconnect(self, addr: Tuple[str, int]):
+        with self.lock:
+            self._close_session_locked(addr)
+
+    def _session_locked(self, addr: Tuple[str, int]) -> Optional[PeerSession]:
+        # caller holds lock; returns the peer's session, opening one if there is room
+        sess = self.sessions.get(addr)
+        if sess is not None:
+            return sess
+        if len(self.sessions) >= self.max_sessions:
+            self.sessions_refused += 1
+            return None
+        rto = RtoEstimator(self.retransmission_timeout_ms, self.min_rto_ms, self.max_rto_ms, self.adaptive_rto)
+        cc = CongestionController(self.initial_cwnd, SEQ_MOD // 2 - 1, self.congestion_control)
+        sess = self.sessions[addr] = PeerSession(addr, rto, cc, self.ack_delay_ms)
+        self.sessions_opened += 1
+        return sess
+
+    def _close_session_locked(self, addr: Tuple[str, int]):
+        # caller holds lock; its pending packets and timers are dropped lazily
+        sess = self.sessions.pop(addr, None)
+        if sess is None:
+            return
+        sess.closed = True
+        for name in SESSION_COUNTERS:
+            self.closed_counts[name] += getattr(sess, name)
+        sess.pending.clear()
+        sess.backlog.clear()
+        self.sessions_closed += 1
+
+    def _sendto(self, pkt: bytes, addr: Tuple[str, int]):
+        try:
+            self.sock.sendto(pkt, addr)
+        except OSError:
+            pass
+
+    def _submit(self, pkt: bytes, addr: Tuple[str, int]):
+        # a packet built under lock: queued for the writer thread, sent inline before start() or without one
+        if self.writer is not None:
+            self.writer.submit(pkt, addr)
+        else:
+            self._sendto(pkt, addr)
+
+    def _window_open(self, sess: PeerSession) -> bool:
+        # caller holds lock; a zero window still lets one packet out when nothing is in flight (see GameNetAPI)
+        return len(sess.pending) < max(min(sess.cc.window(), sess.peer_rwnd), 1)
+
+    def _transmit_locked(self, sess: PeerSession, seq: int, payload: bytes):
+        # caller holds lock
+        pkt = build_packet(CH_RELIABLE, seq, payload)
+        self._submit(pkt, sess.addr)
+        ent = sess.pending[seq] = PendingPacket(payload, pkt, now_ms())
+        if self.tracer is not None:
+            self.tracer.record(TRACE_TX, CH_RELIABLE, seq, ent.send_timestamp, len(payload), 0, 0, sess.addr)
+        self._schedule_retx(sess, seq, ent)
+
+    def _schedule_retx(self, sess: PeerSession, seq: int, ent: PendingPacket):
+        # caller holds lock
+        deadline = time.monotonic() + sess.rto.timeout_ms(ent.retries) / 1000
+        if not self.retx_heap or deadline < self.retx_heap[0][0]:
+            self.retx_cv.notify()
+        heapq.heappush(self.retx_heap, (deadline, next(self.retx_tie), sess, seq, ent))
+
+    def _rx_worker(self):
+        views = [memoryview(buf) for buf in self.rx_pool]
+        header_views = [view[0:CRC_OFFSET] for view in views]
+        sizes = [0] * RX_BATCH
+        addrs = [None] * RX_BATCH
+        unpack_header = HEADER.unpack_from
+        crc32 = zlib.crc32
+        sessions = self.sessions
+        rcv_timeout = None
+        while self.running:
+            self._run_rx_timers()
+            timeout = RX_IDLE_TIMEOUT
+            if self.rx_timers:
+                timeout = min(timeout, max(self.rx_timers[0][0] - time.monotonic(), 0.001))
+            if timeout != rcv_timeout:
+                set_rx_timeout(self.sock, timeout)
+                rcv_timeout = timeout
+
+            n = 0
+            try:
+                sizes[0], addrs[0] = self.sock.recvfrom_into(self.rx_pool[0])
+                n = 1
+                while n < RX_DRAIN:
+                    sizes[n], addrs[n] = self.sock.recvfrom_into(self.rx_pool[n], 0, MSG_DONTWAIT)
+                    n += 1
+            except (BlockingIOError, socket.timeout):
+                if n == 0:
+                    continue
+            except OSError:
+                break
+
+            recv_timestamp = now_ms()
+            now = time.monotonic()
+            ready = []
+            for i in range(n):
+                size = sizes[i]
+                if size < HEADER_SIZE:
+                    continue
+                ch, seq, send_timestamp, crc = unpack_header(self.rx_pool[i])
+                payload = views[i][HEADER_SIZE:size]
+                if crc32(payload, crc32(header_views[i])) != crc:
+                    if self.tracer is not None:
+                        self.tracer.record(TRACE_DROP, ch, seq, send_timestamp, size - HEADER_SIZE, 0, 0, addrs[i])
+                    continue
+                addr = addrs[i]
+                sess = sessions.get(addr)
+                if sess is None:
+                    if ch == CH_METRIC:
+                        # retransmitted metric packet of a session we already closed: our ACK got lost, repeat it
+                        # (without reopening the session) or the client's close() waits forever
+                        self._sendto(build_packet(CH_ACK, (seq + 1) % SEQ_MOD, bytes(SACK_BITS // 8)), addr)
+                        continue
+                    if ch == CH_ACK or ch == CH_CLOCK:
+                        # nothing to acknowledge or answer for an unknown peer, do not open a session for it
+                        continue
+                    with self.lock:
+                        sess = self._session_locked(addr)
+                    if sess is None:
+                        continue
+                sess.last_seen = now
+                self.packets_recv += 1
+                self._dispatch(sess, ch, seq, send_timestamp, payload, recv_timestamp, ready)
+                # the client is sending: probe its clock if no ACK has given an exchange lately
+                if not sess.closed and sess.clock.probe_due(now):
+                    self._sendto(build_packet(CH_CLOCK, CLOCK_PROBE, b""), addr)
+
+            if ready:
+                with self.app_recv_cv:
+                    self.app_recv_q.extend(ready)
+                    self.app_recv_cv.notify()
+            # one ACK per peer for the whole batch
+            for sess in self.ack_dirty:
+                sess.ack_queued = False
+                self._flush_ack(sess)
+            self.ack_dirty.clear()
+
+    def _dispatch(self, sess: PeerSession, ch: int, seq: int, send_timestamp: int, payload: bytes,
+                  recv_timestamp: int, ready: list):
+        if self.tracer is not None and ch != CH_BUNDLE:
+            self.tracer.record(TRACE_RX, ch, seq, send_timestamp, len(payload), 0, 0, sess.addr)
+        if ch == CH_RELIABLE or ch == CH_FRAGMENT:
+            if self._handle_reliable_rx(sess, seq, send_timestamp, payload, recv_timestamp, ready, ch):
+                self._note_ack(sess, seq, send_timestamp, recv_timestamp)
+        elif ch == CH_STREAM:
+            if self._handle_stream_rx(sess, seq, send_timestamp, payload, recv_timestamp, ready):
+                self._note_ack(sess, seq, send_timestamp, recv_timestamp)
+        elif ch == CH_UNRELIABLE:
+            last = sess.last_unreliable_seq_rx
+            if last is None or 0 < (seq - last) % SEQ_MOD < SEQ_MOD // 2:
+                sess.last_unreliable_seq_rx = seq
+                sess.unreli_recv += 1
+                sess.bytes_recv += len(payload)
+                latency = ts_diff(recv_timestamp, send_timestamp) + sess.clock_offset_ms
+                self.histograms[CH_UNRELIABLE].latency_us.record(latency * 1000)
+                ready.append((sess.addr, CH_UNRELIABLE, seq, send_timestamp, bytes(payload), 0))
+        elif ch == CH_ACK:
+            echo = ack_echo(payload)
+            if echo is not None:
+                self._clock_sample(sess, echo[0], echo[1], send_timestamp, recv_timestamp)
+            self._handle_ack(sess, seq, payload, recv_timestamp)
+        elif ch == CH_CLOCK:
+            if seq == CLOCK_PROBE:
+                self._sendto(build_packet(CH_CLOCK, CLOCK_REPLY, ECHO.pack(send_timestamp, recv_timestamp)), sess.addr)
+            elif len(payload) >= ECHO.size:
+                t1, t2 = ECHO.unpack_from(payload)
+                self._clock_sample(sess, t1, t2, send_timestamp, recv_timestamp)
+        elif ch == CH_BUNDLE:
+            for sub_ch, sub_seq, sub_payload in iter_bundle(payload):
+                if sub_ch != CH_BUNDLE:
+                    self._dispatch(sess, sub_ch, sub_seq, send_timestamp, sub_payload, recv_timestamp, ready)
+        elif ch == CH_METRIC:
+            # the client closed its GameNetAPI: ACK exactly the metric packet and forget the peer
+            self._flush_ack(sess)
+            self._sendto(build_packet(CH_ACK, (seq + 1) % SEQ_MOD, bytes(SACK_BITS // 8)), sess.addr)
+            with self.lock:
+                self._close_session_locked(sess.addr)
+
+    def _clock_sample(self, sess: PeerSession, t1: int, t2: int, t3: int, t4: int):
+        # rx thread: an exchange with the client (see gamenet_clock.py), moves its latency correction along
+        offset = sess.clock.sample(t1, t2, t3, t4)
+        if offset is not None:
+            sess.clock_offset_ms = round(offset)
+
+    def _note_ack(self, sess: PeerSession, seq: int, send_timestamp: int, recv_timestamp: int):
+        # rx thread: a reliable seq to ACK, at the end of the batch or once the ACK delay runs out
+        due = sess.sack.due
+        sess.sack.note(seq, send_timestamp, recv_timestamp)
+        if sess.sack.delay_ms == 0:
+            if not sess.ack_queued:
+                sess.ack_queued = True
+                self.ack_dirty.append(sess)
+        elif sess.sack.due != due:
+            heapq.heappush(self.rx_timers, (sess.sack.due, next(self.rx_tie), sess))
+
+    def _sync_rx(self, sess: PeerSession, seq: int):
+        if not sess.rx_synced:
+            # first reliable packet of the session. A client whose session expired while it was quiet resumes in
+            # the middle of its seq space: start the stream at its seq instead of dropping (and never ACKing)
+            # everything beyond the window of a stream that would start at 0
+            sess.rx_synced = True
+            if (seq - sess.expected_seq) % SEQ_MOD >= self.recv_window:
+                sess.expected_seq = seq
+                sess.sack.base = seq
+
+    def _handle_reliable_rx(self, sess: PeerSession, seq: int, ts_ms: int, payload: bytes, recv_timestamp: int,
+                            ready: list, ch: int = CH_RELIABLE) -> bool:
+        # rx thread; same rules as GameNetAPI._handle_reliable_rx with a dict buffer (most sessions hold nothing,
+        # a preallocated ring per peer would cost more than it saves). False: beyond the window or the reassembly
+        # budget, do not ACK.
+        self._sync_rx(sess, seq)
+        offset = (seq - sess.expected_seq) % SEQ_MOD
+        if offset >= SEQ_MOD // 2:
+            return True
+        if offset >= self.recv_window:
+            sess.reorder_dropped += 1
+            return False
+        if seq in sess.buffer:
+            return True
+        size = len(payload)
+        if ch == CH_FRAGMENT:
+            if sess.reassembly is None:
+                sess.reassembly = Reassembly(self.reassembly_budget)
+            payload = sess.reassembly.put(seq, payload, sess.expected_seq)
+            if payload is None:
+                return False
+            size -= FRAGMENT_HEADER.size
+        else:
+            payload = bytes(payload)
+        sess.reli_recv += 1
+        sess.bytes_recv += size
+        hist = self.histograms[CH_RELIABLE]
+        hist.latency_us.record((ts_diff(recv_timestamp, ts_ms) + sess.clock_offset_ms) * 1000)
+        if offset == 0 and not sess.buffer:
+            sess.expected_seq = (seq + 1) % SEQ_MOD
+            hist.delivery_delay_us.record(0)
+            self._ready_reliable(sess, seq, ts_ms, payload, ready)
+            return True
+        sess.buffer[seq] = (ts_ms, payload, recv_timestamp)
+        if offset == 0:
+            self._drain_reliable(sess, ready)
+        elif sess.gap_deadline is None:
+            self._arm_gap(sess)
+        return True
+
+    def _handle_stream_rx(self, sess: PeerSession, seq: int, ts_ms: int, payload: bytes, recv_timestamp: int,
+                          ready: list) -> bool:
+        # rx thread; as GameNetAPI._handle_stream_rx: ordered within its stream by the session's StreamSet, its seq
+        # fills its place in the reliable order without a payload. False: do not ACK (see StreamSet.put)
+        self._sync_rx(sess, seq)
+        offset = (seq - sess.expected_seq) % SEQ_MOD
+        if self.recv_window <= offset < SEQ_MOD // 2:
+            sess.reorder_dropped += 1
+            return False
+        if sess.streams is None:
+            sess.streams = StreamSet(
+                self.recv_window, self.gap_skip_timeout_ms, self.histograms[CH_RELIABLE].delivery_delay_us.record,
+            )
+        deadline = sess.streams.next_deadline()
+        msgs = []
+        accepted = sess.streams.put(seq, ts_ms, payload, recv_timestamp, msgs)
+        if accepted is None:
+            return False
+        if accepted:
+            sess.reli_recv += 1
+            sess.bytes_recv += len(payload) - STREAM_HEADER.size
+            latency = ts_diff(recv_timestamp, ts_ms) + sess.clock_offset_ms
+            self.histograms[CH_RELIABLE].latency_us.record(latency * 1000)
+        self._ready_streams(sess, msgs, ready, deadline)
+        if offset < SEQ_MOD // 2 and seq not in sess.buffer:
+            if offset == 0 and not sess.buffer:
+                sess.expected_seq = (seq + 1) % SEQ_MOD
+            else:
+                sess.buffer[seq] = (ts_ms, None, recv_timestamp)
+                if offset == 0:
+                    self._drain_reliable(sess, ready)
+                elif sess.gap_deadline is None:
+                    self._arm_gap(sess)
+        return True
+
+    def _ready_streams(self, sess: PeerSession, msgs: list, ready: list, deadline: Optional[float]):
+        # what the session's StreamSet made deliverable; its gap deadline goes on the rx timer heap if it moved
+        # from `deadline` (entries it left behind are stale, see _run_rx_timers)
+        for msg in msgs:
+            ready.append((sess.addr,) + msg)
+        new_deadline = sess.streams.next_deadline()
+        if new_deadline is not None and new_deadline != deadline:
+            heapq.heappush(self.rx_timers, (new_deadline, next(self.rx_tie), sess))
+
+    def _drain_reliable(self, sess: PeerSession, ready: list):
+        buffer = sess.buffer
+        seq = sess.expected_seq
+        now = now_ms()
+        record_delay = self.histograms[CH_RELIABLE].delivery_delay_us.record
+        while seq in buffer:
+            ts_ms, payload, arrival_ms = buffer.pop(seq)
+            if payload is not None:
+                # a stream message is delivered, and its delay recorded, by its stream
+                self._ready_reliable(sess, seq, ts_ms, payload, ready)
+                record_delay(ts_diff(now, arrival_ms) * 1000)
+            seq = (seq + 1) % SEQ_MOD
+        sess.expected_seq = seq
+        sess.gap_deadline = None
+        if buffer:
+            self._arm_gap(sess)
+
+    def _ready_reliable(self, sess: PeerSession, seq: int, ts_ms: int, payload, ready: list):
+        # a reliable message reached the delivery head. A fragment's FragmentMark delivers its message once the
+        # last fragment comes up, under the seq of the first
+        if type(payload) is not FragmentMark:
+            ready.append((sess.addr, CH_RELIABLE, seq, ts_ms, payload, 0))
+            return
+        done = sess.reassembly.complete(payload)
+        if done is not None:
+            ready.append((sess.addr, CH_RELIABLE, done[0], ts_ms, done[1], 0))
+
+    def _arm_gap(self, sess: PeerSession):
+        sess.gap_deadline = time.monotonic() + self.gap_skip_timeout_ms / 1000
+        heapq.heappush(self.rx_timers, (sess.gap_deadline, next(self.rx_tie), sess))
+
+    def _run_rx_timers(self):
+        # rx thread: fires every due ACK-delay, gap-skip and stream gap-skip deadline; an entry whose session no
+        # longer waits for that exact deadline is stale
+        timers = self.rx_timers
+        now = time.monotonic()
+        ready = []
+        while timers and timers[0][0] <= now:
+            deadline, _, sess = heapq.heappop(timers)
+            if sess.closed:
+                continue
+            if sess.sack.due == deadline:
+                self._flush_ack(sess)
+            if sess.gap_deadline == deadline and sess.buffer:
+                # skip every missing seq up to the first buffered one, then deliver what was held back
+                sess.expected_seq = min(sess.buffer, key=lambda s: (s - sess.expected_seq) % SEQ_MOD)
+                if sess.reassembly is not None:
+                    sess.reassembly.expire(sess.expected_seq)
+                self._drain_reliable(sess, ready)
+            if sess.streams is not None and sess.streams.next_deadline() == deadline:
+                msgs = []
+                sess.streams.skip_gaps(msgs)
+                self._ready_streams(sess, msgs, ready, deadline)
+        if ready:
+            with self.app_recv_cv:
+                self.app_recv_q.extend(ready)
+                self.app_recv_cv.notify()
+
+    def _flush_ack(self, sess: PeerSession):
+        if sess.sack.due is None:
+            return
+        free = max(self.recv_window - len(sess.buffer) - (sess.streams.buffered if sess.streams else 0), 0)
+        cum_seq, sack_payload = sess.sack.take(free)
+        self._sendto(build_packet(CH_ACK, cum_seq, sack_payload), sess.addr)
+        if self.tracer is not None:
+            self.tracer.record(TRACE_TX, CH_ACK, cum_seq, now_ms(), len(sack_payload), 0, 0, sess.addr)
+
+    def _handle_ack(self, sess: PeerSession, seq: int, payload: bytes, recv_timestamp: int):
+        with self.lock:
+            acked, sess.snd_una, rtt_sample = ack_pending(
+                sess.pending, seq, payload, sess.snd_una, sess.next_reliable_seq, recv_timestamp,
+                self.histograms[CH_RELIABLE], PENDING_TIMING,
+            )
+            if self.tracer is not None:
+                for s, ent, rtt in acked:
+                    self.tracer.record(TRACE_ACKED, CH_RELIABLE, s, ent.send_timestamp, len(ent.payload), ent.retries,
+                                       rtt, sess.addr)
+            if rtt_sample is not None:
+                sess.rto.sample(rtt_sample)
+            window = ack_window(payload)
+            if window is not None:
+                sess.peer_rwnd = window
+            if acked:
+                sess.cc.on_ack(len(acked))
+            while sess.backlog and self._window_open(sess):
+                self._transmit_locked(sess, *sess.backlog.popleft())
+
+    def _timer_worker(self):
+        next_sweep = time.monotonic() + SWEEP_INTERVAL_S
+        while self.running:
+            to_retx = []
+            with self.retx_cv:
+                while self.running:
+                    now = time.monotonic()
+                    heap = self.retx_heap
+                    while heap and heap[0][0] <= now:
+                        _, _, sess, seq, ent = heapq.heappop(heap)
+                        if sess.pending.get(seq) is ent:
+                            to_retx.append((sess, seq, ent))
+                    if to_retx or now >= next_sweep:
+                        break
+                    wake = next_sweep if not heap else min(heap[0][0], next_sweep)
+                    self.retx_cv.wait(wake - now)
+
+                for sess, seq, ent in to_retx:
+                    ts_ms = now_ms()
+                    # restamp a copy, the previous transmission may still be queued in the writer
+                    ent.frame = bytearray(ent.frame)
+                    restamp(ent.frame, ts_ms, ent.payload)
+                    self._submit(ent.frame, sess.addr)
+                    ent.retries += 1
+                    if self.tracer is not None:
+                        self.tracer.record(TRACE_RETX, CH_RELIABLE, seq, ts_ms, len(ent.payload), ent.retries, 0,
+                                           sess.addr)
+                    sess.retransmissions += 1
+                    sess.cc.on_loss(now, sess.rto.rto_ms / 1000)
+                    self._schedule_retx(sess, seq, ent)
+
+                if now >= next_sweep:
+                    next_sweep = now + SWEEP_INTERVAL_S
+                    idle = [addr for addr, sess in self.sessions.items() if now - sess.last_seen > self.idle_timeout_s]
+                    for addr in idle:
+                        self._close_session_locked(addr)
+
+    def session_metrics(self, addr: Tuple[str, int]) -> Optional[dict]:
+        with self.lock:
+            sess = self.sessions.get(addr)
+            if sess is None:
+                return None
+            return {
+                "reli_packets_send": sess.reli_sent,
+                "reli_packets_recv": sess.reli_recv,
+                "unreli_packets_send": sess.unreli_sent,
+                "unreli_packets_recv": sess.unreli_recv,
+                "bytes_recv": sess.bytes_recv,
+                "retransmissions": sess.retransmissions,
+                "pending_ack": len(sess.pending),
+                "send_queue_depth": len(sess.backlog),
+                "reorder_buffered": len(sess.buffer),
+                "reorder_dropped": sess.reorder_dropped,
+                "rto_ms": sess.rto.rto_ms,
+                "srtt_ms": sess.rto.srtt_ms,
+                "cwnd": sess.cc.window(),
+                "peer_rwnd": sess.peer_rwnd,
+                "clock_offset_ms": sess.clock.offset_ms,
+                "clock_drift_ppm": sess.clock.drift_ppm,
+                "owd_out_ms": sess.clock.owd_out_ms,
+                "owd_in_ms": sess.clock.owd_in_ms,
+            }
+
+    def get_percentiles(self, qs=DEFAULT_PERCENTILES) -> dict:
+        # p50/p90/p99/p99.9, max, mean and count per channel over every session; times in ms
+        report = {
+            "reliable": self.histograms[CH_RELIABLE].percentiles(qs),
+            "unreliable": self.histograms[CH_UNRELIABLE].percentiles(qs),
+        }
+        if self.locks is not None:
+            report["locks"] = self.get_lock_stats(qs)
+        return report
+
+    def get_lock_stats(self, qs=DEFAULT_PERCENTILES) -> dict:
+        # lock name -> wait/hold statistics in microseconds (see InstrumentedLock); empty unless lock_stats=True
+        if self.locks is None:
+            return {}
+        return {name: lock.stats(qs) for name, lock in self.locks.items()}
+
+    def get_metrics(self) -> dict:
+        # totals over every session since start (closed ones are folded into closed_counts) plus the session
+        # table counters; pending/queue depths are over live sessions
+        with self.lock:
+            sessions = list(self.sessions.values())
+            pending = sum(len(s.pending) for s in sessions)
+            queued = sum(len(s.backlog) for s in sessions)
+            totals = {name: count + sum(getattr(s, name) for s in sessions)
+                      for name, count in self.closed_counts.items()}
+        with self.app_recv_q_lock:
+            app_queue = len(self.app_recv_q)
+        return {
+            "sessions": len(sessions),
+            "sessions_opened": self.sessions_opened,
+            "sessions_closed": self.sessions_closed,
+            "sessions_refused": self.sessions_refused,
+            "packets_recv": self.packets_recv,
+            "reli_packets_recv": totals["reli_recv"],
+            "unreli_packets_recv": totals["unreli_recv"],
+            "retransmissions": totals["retransmissions"],
+            "reorder_dropped": totals["reorder_dropped"],
+            "pending_ack": pending,
+            "send_queue_depth": queued,
+            "app_queue_depth": app_queue,
+            "writer_queue_depth": len(self.writer.queue) if self.writer is not None else 0,
+        }
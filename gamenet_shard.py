@@ -0,0 +1,152 @@
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing.connection import wait
+from typing import Callable, Optional, Tuple, List
+
+from gamenet_codec import CH_RELIABLE, CH_UNRELIABLE
+from gamenet_metrics import ChannelHistograms, DEFAULT_PERCENTILES
+from gamenet_server import GameNetServer
+
+"""
+Sharded GameNetServer: one server process per core behind a single UDP port.
+
+Every shard is a separate process running its own GameNetServer on a socket bound with SO_REUSEPORT. The kernel
+hashes each datagram's source address to one of the sockets, so a peer always lands on the same shard and every
+shard owns its sessions outright (no shared state, no GIL contention between shards). Application logic runs
+inside the shards: handler(server, msgs) is called with each batch returned by the shard's recv() and may
+reply through server.send().
+
+Shards report their get_metrics() and latency histograms to the parent over a pipe every METRICS_INTERVAL_S;
+the parent's get_metrics() sums the counters and get_percentiles() merges the histograms. Linux only
+(SO_REUSEPORT balancing). Shards are started with the spawn method, so the handler must be a module-level
+function.
+"""
+
+METRICS_INTERVAL_S = 0.5
+READY_TIMEOUT_S = 10.0
+
+Handler = Callable[[GameNetServer, list], None]
+
+def _shard_main(index: int, local_addr: Tuple[str, int], server_kwargs: dict, handler: Optional[Handler], conn):
+    if server_kwargs.get("trace_path"):
+        # one trace file per shard: trace_path.0, trace_path.1, ...
+        server_kwargs = dict(server_kwargs, trace_path=f"{server_kwargs['trace_path']}.{index}")
+    server = GameNetServer(local_addr, reuse_port=True, **server_kwargs)
+    server.start()
+    conn.send(("ready", index, None))
+    next_report = time.monotonic() + METRICS_INTERVAL_S
+    try:
+        while not conn.poll():
+            msgs = server.recv(timeout_ms=int(METRICS_INTERVAL_S * 1000) // 5)
+            if msgs and handler is not None:
+                handler(server, msgs)
+            now = time.monotonic()
+            if now >= next_report:
+                next_report = now + METRICS_INTERVAL_S
+                conn.send(("metrics", index, (server.get_metrics(), server.histograms)))
+        conn.send(("metrics", index, (server.get_metrics(), server.histograms)))
+    finally:
+        server.close()
+        conn.close()
+
+class ShardedGameNetServer:
+    def __init__(
+        self,
+        local_addr: Tuple[str, int],
+        workers: Optional[int] = None,
+        handler: Optional[Handler] = None,
+        **server_kwargs
+    ):
+        if local_addr[1] == 0:
+            raise ValueError("sharded servers need a fixed port, every shard binds the same one")
+        self.local_addr = local_addr
+        self.workers = workers or os.cpu_count() or 1
+        self.handler = handler
+        self.server_kwargs = server_kwargs
+        self.ctx = multiprocessing.get_context("spawn")
+        self.procs: List[multiprocessing.Process] = []
+        self.conns = []
+        self.shard_metrics: List[Optional[dict]] = [None] * self.workers
+        self.shard_histograms: List[Optional[dict]] = [None] * self.workers
+        self.metrics_lock = threading.Lock()
+        self.collector = None
+        self.running = False
+
+    def start(self):
+        for i in range(self.workers):
+            parent_conn, child_conn = self.ctx.Pipe()
+            proc = self.ctx.Process(
+                target=_shard_main, args=(i, self.local_addr, self.server_kwargs, self.handler, child_conn), daemon=True
+            )
+            proc.start()
+            child_conn.close()
+            self.procs.append(proc)
+            self.conns.append(parent_conn)
+
+        # every socket must be bound before traffic arrives, or early peers all hash onto the first shards
+        deadline = time.monotonic() + READY_TIMEOUT_S
+        for i, conn in enumerate(self.conns):
+            if not conn.poll(max(deadline - time.monotonic(), 0)):
+                self.close()
+                raise RuntimeError(f"shard {i} did not start within {READY_TIMEOUT_S}s")
+            conn.recv()
+
+        self.running = True
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+
+    def close(self):
+        self.running = False
+        for conn in self.conns:
+            try:
+                conn.send("stop")
+            except (OSError, ValueError):
+                pass
+        for proc in self.procs:
+            proc.join(2 * METRICS_INTERVAL_S)
+            if proc.is_alive():
+                proc.terminate()
+        if self.collector is not None:
+            self.collector.join(2 * METRICS_INTERVAL_S)
+
+    def _collect(self):
+        # parent side: keep the latest metrics of every shard until all pipes are closed
+        conns = list(self.conns)
+        while conns:
+            for conn in wait(conns, METRICS_INTERVAL_S):
+                try:
+                    _, index, (metrics, histograms) = conn.recv()
+                except (EOFError, OSError):
+                    conns.remove(conn)
+                    continue
+                with self.metrics_lock:
+                    self.shard_metrics[index] = metrics
+                    self.shard_histograms[index] = histograms
+
+    def get_metrics(self) -> dict:
+        # sum of the latest report of every shard, plus the reports themselves under "per_shard"
+        with self.metrics_lock:
+            per_shard = [dict(m) if m is not None else {} for m in self.shard_metrics]
+        totals = {}
+        for metrics in per_shard:
+            for key, value in metrics.items():
+                totals[key] = totals.get(key, 0) + value
+        totals["shards"] = self.workers
+        totals["per_shard"] = per_shard
+        return totals
+
+    def get_percentiles(self, qs=DEFAULT_PERCENTILES) -> dict:
+        # percentiles of the shards' histograms merged together, same layout as GameNetServer.get_percentiles()
+        merged = {CH_RELIABLE: ChannelHistograms(), CH_UNRELIABLE: ChannelHistograms()}
+        with self.metrics_lock:
+            for histograms in self.shard_histograms:
+                if histograms is None:
+                    continue
+                for ch, hist in histograms.items():
+                    merged[ch].merge(hist)
+        return {
+            "reliable": merged[CH_RELIABLE].percentiles(qs),
+            "unreliable": merged[CH_UNRELIABLE].percentiles(qs),
+        }
@@ -0,0 +1,197 @@
+import re
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+from gamenet_codec import SEQ_MOD, U32
+
+"""
+Delta-compressed snapshots for the H-UDP transport (GameNetAPI.send_snapshot(), channel CH_SNAPSHOT).
+
+Game state snapshots repeat most of their bytes from one tick to the next. The sender encodes every snapshot against
+the newest snapshot the receiver has acknowledged (its baseline); the receiver rebuilds the full state from its own
+copy of that baseline. Snapshots stay unreliable and freshest-wins: a lost one is never resent, the next one is
+encoded against whatever baseline is acknowledged by then. Without a usable baseline (the first snapshots, or no
+ACK for the last SNAPSHOT_HISTORY snapshots) the sender falls back to a keyframe, the full state.
+
+CH_SNAPSHOT payload: | baseline seq (2B) | kind (1B) | body |
+  SNAP_KEYFRAME: body is the state, the baseline seq is unused
+  SNAP_DELTA:    body is codec.encode(baseline state, state)
+CH_SNAPSHOT_ACK: header seq is the newest snapshot the receiver rebuilt, no payload; never delivered to the app.
+
+Both sides keep the last SNAPSHOT_HISTORY states in slot seq % SNAPSHOT_HISTORY, and the sender only uses a
+baseline less than SNAPSHOT_HISTORY snapshots old, so the receiver still holds every baseline it is sent against.
+
+Codecs are pluggable: any object with encode(base, state) -> bytes and decode(base, delta) -> bytes, raising
+ValueError on a delta it cannot decode.
+  XorRleCodec  : XOR with the baseline, only the runs of changed bytes go out. Cheap; suits fixed layout state
+                 (a field keeps its offset from tick to tick)
+  ZlibDeltaCodec: deflate with the baseline as preset dictionary. Slower, but copes with fields that change
+                 length and shift everything behind them (text formats such as JSON)
+"""
+
+SNAP_KEYFRAME = 0
+SNAP_DELTA = 1
+SNAPSHOT_HEADER = struct.Struct("!HB")  # baseline seq, kind
+SNAPSHOT_HISTORY = 32  # divides SEQ_MOD, so slots stay consistent across seq wrap
+
+def xor_bytes(a: bytes, b: bytes) -> bytes:
+    # a XOR b, b cut or zero padded to the length of a
+    n = len(a)
+    return (int.from_bytes(a, "big") ^ int.from_bytes(bytes(b[:n]).ljust(n, b"\0"), "big")).to_bytes(n, "big")
+
+class XorRleCodec:
+    # delta: | state length (4B) | runs of | unchanged bytes skipped (2B) | changed bytes (2B) | XORed bytes | |
+    RUN = struct.Struct("!HH")
+    MAX_RUN = 0xFFFF
+    # zero gaps shorter than a run header are cheaper to send inline than to split the run at
+    CHANGED = re.compile(rb"[^\x00]+(?:\x00{1,4}[^\x00]+)*")
+
+    def encode(self, base: bytes, state: bytes) -> bytes:
+        diff = xor_bytes(state, base)
+        parts = [U32.pack(len(state))]
+        pos = 0
+        for m in self.CHANGED.finditer(diff):
+            start, end = m.span()
+            skip = start - pos
+            while skip > self.MAX_RUN:
+                parts.append(self.RUN.pack(self.MAX_RUN, 0))
+                skip -= self.MAX_RUN
+            while end - start > self.MAX_RUN:
+                parts.append(self.RUN.pack(skip, self.MAX_RUN))
+                parts.append(diff[start:start + self.MAX_RUN])
+                start += self.MAX_RUN
+                skip = 0
+            parts.append(self.RUN.pack(skip, end - start))
+            parts.append(diff[start:end])
+            pos = end
+        return b"".join(parts)
+
+    def decode(self, base: bytes, delta: bytes) -> bytes:
+        if len(delta) < U32.size:
+            raise ValueError("truncated delta")
+        n = U32.unpack_from(delta)[0]
+        diff = bytearray(n)
+        pos = 0
+        i = U32.size
+        while i < len(delta):
+            if i + self.RUN.size > len(delta):
+                raise ValueError("truncated delta")
+            skip, length = self.RUN.unpack_from(delta, i)
+            i += self.RUN.size
+            pos += skip
+            if pos + length > n or i + length > len(delta):
+                raise ValueError("delta run out of bounds")
+            diff[pos:pos + length] = delta[i:i + length]
+            i += length
+            pos += length
+        return xor_bytes(diff, base)
+
+class ZlibDeltaCodec:
+    # delta: raw deflate stream of the state, compressed with the baseline as preset dictionary
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def encode(self, base: bytes, state: bytes) -> bytes:
+        c = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=bytes(base[-32768:]))
+        return c.compress(state) + c.flush()
+
+    def decode(self, base: bytes, delta: bytes) -> bytes:
+        try:
+            d = zlib.decompressobj(-15, zdict=bytes(base[-32768:]))
+            return d.decompress(delta) + d.flush()
+        except zlib.error as e:
+            raise ValueError(f"bad delta: {e}") from None
+
+def seq_newer(a: int, b: int) -> bool:
+    # True if seq a is after seq b in modulo space (within half-range)
+    return 0 < (a - b) % SEQ_MOD < SEQ_MOD // 2
+
+class SnapshotSender:
+    # sender side: seqs, the states sent lately and the newest one the peer acknowledged. Caller serializes access.
+    def __init__(self, codec, history: int = SNAPSHOT_HISTORY):
+        self.codec = codec
+        self.history = history
+        self.states: List[Optional[Tuple[int, bytes]]] = [None] * history  # slot seq % history: (seq, state)
+        self.next_seq = 0
+        self.acked: Optional[int] = None
+        self.sent = 0
+        self.keyframes = 0
+        self.raw_bytes = 0  # full state bytes handed to encode()
+        self.wire_bytes = 0  # CH_SNAPSHOT payload bytes actually sent
+
+    def encode(self, state: bytes) -> Tuple[int, bytes]:
+        # (seq, CH_SNAPSHOT payload) of the next snapshot
+        state = bytes(state)
+        seq = self.next_seq
+        self.next_seq = (seq + 1) % SEQ_MOD
+        base_seq = self.acked
+        base = None
+        if base_seq is not None and (seq - base_seq) % SEQ_MOD < self.history:
+            slot = self.states[base_seq % self.history]
+            if slot is not None and slot[0] == base_seq:
+                base = slot[1]
+        body = self.codec.encode(base, state) if base is not None else None
+        if body is None or len(body) >= len(state):
+            # no baseline, or the delta would not be smaller than the state itself
+            payload = SNAPSHOT_HEADER.pack(0, SNAP_KEYFRAME) + state
+            self.keyframes += 1
+        else:
+            payload = SNAPSHOT_HEADER.pack(base_seq, SNAP_DELTA) + body
+        self.states[seq % self.history] = (seq, state)
+        self.sent += 1
+        self.raw_bytes += len(state)
+        self.wire_bytes += len(payload)
+        return seq, payload
+
+    def on_ack(self, seq: int):
+        # only snapshots we sent count, and a late ACK never moves the baseline back
+        if (self.next_seq - 1 - seq) % SEQ_MOD >= self.history:
+            return
+        if self.acked is None or seq_newer(seq, self.acked):
+            self.acked = seq
+
+class SnapshotReceiver:
+    # receiver side: rebuilds full states, freshest-wins. Only used by the rx thread.
+    def __init__(self, codec, history: int = SNAPSHOT_HISTORY):
+        self.codec = codec
+        self.history = history
+        self.states: List[Optional[Tuple[int, bytes]]] = [None] * history
+        self.latest: Optional[int] = None
+        self.received = 0
+        self.keyframes = 0
+        self.stale = 0  # older than the newest snapshot already rebuilt
+        self.undecodable = 0  # baseline no longer held, or a delta the codec rejected
+
+    def decode(self, seq: int, payload: bytes) -> Optional[bytes]:
+        # the full state of snapshot seq, None if it is dropped
+        if self.latest is not None and not seq_newer(seq, self.latest):
+            self.stale += 1
+            return None
+        if len(payload) < SNAPSHOT_HEADER.size:
+            self.undecodable += 1
+            return None
+        base_seq, kind = SNAPSHOT_HEADER.unpack_from(payload)
+        body = payload[SNAPSHOT_HEADER.size:]
+        if kind == SNAP_KEYFRAME:
+            state = bytes(body)
+            self.keyframes += 1
+        else:
+            slot = self.states[base_seq % self.history]
+            if kind != SNAP_DELTA or slot is None or slot[0] != base_seq:
+                self.undecodable += 1
+                return None
+            try:
+                state = self.codec.decode(slot[1], body)
+            except ValueError:
+                self.undecodable += 1
+                return None
+        self.states[seq % self.history] = (seq, state)
+        self.latest = seq
+        self.received += 1
+        return state
+
+    def reset(self):
+        # the peer's next session numbers its snapshots from 0 again
+        self.states = [None] * self.history
+        self.latest = None
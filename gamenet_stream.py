@@ -0,0 +1,116 @@
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from gamenet_codec import CH_RELIABLE, SEQ_MOD, now_ms, ts_diff
+
+"""
+Independent reliable streams (channel CH_STREAM), so a loss on one stream never holds up another.
+
+Stream messages are ordinary reliable messages on the wire: the header seq is the connection wide reliable seq,
+which ACKs, retransmissions and the send window work on as before. Ordering is what moves to the stream: every
+stream numbers its messages in its own seq space and the receiver keeps a reorder buffer and an expected seq per
+stream, so a missing message only stalls the messages of its own stream. Stream 0 is the plain reliable channel
+and keeps the connection wide order.
+
+CH_STREAM payload: | stream id (1B) | flags (1B) | stream seq (2B) | data |
+  STREAM_UNORDERED: reliable but unordered; delivered as soon as it arrives, the stream seq only catches
+                    duplicates
+
+An ordered stream skips a missing message after the gap skip timeout like the reliable channel does; a late
+arrival is still ACKed but no longer delivered. An unordered stream never waits, so it never skips.
+"""
+
+STREAM_HEADER = struct.Struct("!BBH")  # stream id, flags, stream seq
+STREAM_UNORDERED = 0x01
+MAX_STREAM = 255
+
+class StreamRx:
+    # receive side of one stream
+    __slots__ = ("expected", "buffer", "held", "gap_deadline")
+
+    def __init__(self):
+        self.expected = 0
+        # stream seq -> (app queue entry, arrival ms) waiting for its turn, or None: delivered out of order
+        # (unordered streams), kept until expected passes it so a duplicate is recognized
+        self.buffer: Dict[int, Optional[Tuple[tuple, int]]] = {}
+        self.held = 0  # entries of buffer that wait for delivery
+        self.gap_deadline: Optional[float] = None
+
+class StreamSet:
+    # receive side of all streams of one peer. Used by one thread (the rx thread).
+    def __init__(self, capacity: int, gap_skip_timeout_ms: int, record_delay: Callable[[float], None]):
+        self.capacity = capacity  # how far ahead of its expected seq a stream buffers
+        self.gap_skip_s = gap_skip_timeout_ms / 1000
+        self.record_delay = record_delay  # delivery delay histogram, in us
+        self.streams: Dict[int, StreamRx] = {}
+        self.buffered = 0  # messages held for ordering, they count against the receive window
+        self.dropped = 0
+
+    def put(self, seq: int, ts_ms: int, payload: bytes, arrival_ms: int, ready: List[tuple]) -> Optional[bool]:
+        # a CH_STREAM message with connection seq `seq`; what it makes deliverable is appended to ready as
+        # (CH_RELIABLE, seq, ts_ms, data, stream id). True: new, False: duplicate or late (ACK it again),
+        # None: malformed or beyond the buffer, do not ACK
+        if len(payload) < STREAM_HEADER.size:
+            return None
+        stream_id, flags, sseq = STREAM_HEADER.unpack_from(payload)
+        st = self.streams.get(stream_id)
+        if st is None:
+            st = self.streams[stream_id] = StreamRx()
+        offset = (sseq - st.expected) % SEQ_MOD
+        if offset >= SEQ_MOD // 2 or sseq in st.buffer:
+            return False
+        if offset >= self.capacity:
+            self.dropped += 1
+            return None
+        entry = (CH_RELIABLE, seq, ts_ms, bytes(payload[STREAM_HEADER.size:]), stream_id)
+        if offset == 0 or flags & STREAM_UNORDERED:
+            ready.append(entry)
+            self.record_delay(0)
+            if offset:
+                st.buffer[sseq] = None
+                return True
+            st.expected = (sseq + 1) % SEQ_MOD
+            self._drain(st, ready)
+            return True
+        st.buffer[sseq] = (entry, arrival_ms)
+        st.held += 1
+        self.buffered += 1
+        if st.gap_deadline is None:
+            st.gap_deadline = time.monotonic() + self.gap_skip_s
+        return True
+
+    def _drain(self, st: StreamRx, ready: List[tuple]):
+        # deliver the run at the head of an ordered stream (an unordered one only drops its markers)
+        buffer = st.buffer
+        seq = st.expected
+        if seq in buffer:
+            now = now_ms()
+            while seq in buffer:
+                held = buffer.pop(seq)
+                if held is not None:
+                    ready.append(held[0])
+                    self.record_delay(ts_diff(now, held[1]) * 1000)
+                    st.held -= 1
+                    self.buffered -= 1
+                seq = (seq + 1) % SEQ_MOD
+            st.expected = seq
+        st.gap_deadline = time.monotonic() + self.gap_skip_s if st.held else None
+
+    def skip_gaps(self, ready: List[tuple]):
+        # ordered streams whose gap timer expired give up on their missing messages up to the first buffered one
+        now = time.monotonic()
+        for st in self.streams.values():
+            if st.gap_deadline is None or now < st.gap_deadline:
+                continue
+            # only ordered streams hold messages, so everything buffered is waiting
+            st.expected = min(st.buffer, key=lambda s: (s - st.expected) % SEQ_MOD)
+            self._drain(st, ready)
+
+    def next_deadline(self) -> Optional[float]:
+        deadlines = [st.gap_deadline for st in self.streams.values() if st.gap_deadline is not None]
+        return min(deadlines) if deadlines else None
+
+    def reset(self):
+        self.streams.clear()
+        self.buffered = 0
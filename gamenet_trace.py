@@ -0,0 +1,114 @@
+import itertools
+import mmap
+import socket
+import struct
+import time
+from typing import Dict, Tuple
+
+"""
+Binary packet trace for the H-UDP transports: what used to be the commented-out print("data", "rx", ...) lines, at a
+cost that does not change the behaviour being debugged.
+
+A PacketTrace is a file of fixed-size records mapped into memory (mmap) as a ring: record() packs one record into
+the next slot and nothing else, no syscall, no allocation beyond the packed ints, no lock. When the ring is full the
+oldest records are overwritten. The file is valid while it is being written (the page cache is shared), flush()
+(called by close() of the transports) also stores the record count in the header.
+
+File layout (little-endian):
+  header, HEADER_SIZE bytes: | magic "GNTRACE1" (8B) | version (2B) | record size (2B) | capacity (4B) |
+                             | slots used, as of the last flush() (8B) | zero padding |
+  capacity records of RECORD_SIZE bytes, record i at HEADER_SIZE + (i % capacity) * RECORD_SIZE:
+    | t_ns (8B) | ts_ms (4B) | peer ip (4B) | peer port (2B) | seq (2B) | length (2B) | direction (1B) |
+    | channel (1B) | retries (2B) | rtt_ms (4B, signed) | padding (2B) |
+t_ns is time.monotonic_ns() when the record was written, ts_ms the packet's header timestamp, length the payload
+length. rtt_ms is only set on ACKED records. Slots never written are all zero (t_ns 0).
+
+trace_analyze.py turns a trace into per-flow timelines, RTT series and loss/retransmit statistics.
+"""
+
+MAGIC = b"GNTRACE1"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIQ")
+HEADER_SIZE = 64
+RECORD = struct.Struct("<QIIHHHBBHi2x")
+RECORD_SIZE = RECORD.size
+DEFAULT_TRACE_RECORDS = 1 << 20  # 32 MiB
+
+# direction
+TRACE_TX = 0  # first transmission of a message (every frame of a bundle gets a record)
+TRACE_RETX = 1  # retransmission, retries is the transmission count so far
+TRACE_RX = 2  # message received (frames of a bundle one by one), before any duplicate/window check
+TRACE_ACKED = 3  # a pending reliable message was ACKed, rtt_ms and retries as the sender saw them
+TRACE_DROP = 4  # datagram dropped on arrival (bad CRC): channel and seq as read from the damaged header
+DIRECTIONS = ("tx", "retx", "rx", "acked", "drop")
+
+class PacketTrace:
+    def __init__(self, path: str, records: int = DEFAULT_TRACE_RECORDS):
+        if records <= 0:
+            raise ValueError(f"records must be positive, got {records}")
+        self.path = path
+        self.capacity = records
+        size = HEADER_SIZE + records * RECORD_SIZE
+        with open(path, "w+b") as f:
+            f.truncate(size)
+            self.mm = mmap.mmap(f.fileno(), size)
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, RECORD_SIZE, records, 0)
+        self.written = 0
+        self.flows: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        # next(count) is atomic under the GIL, so threads recording at once never share a slot
+        self.counter = itertools.count()
+        self.record = self._recorder()
+
+    def _recorder(self):
+        # record(direction, ch, seq, ts_ms, length, retries, rtt_ms, addr), callable from any thread. A closure
+        # over locals rather than a method: attribute lookups are a good part of its cost on the packet path.
+        pack_into = RECORD.pack_into
+        mm = self.mm
+        capacity = self.capacity
+        counter = self.counter
+        flow_of = self.flows.get
+        new_flow = self._flow
+        clock = time.monotonic_ns
+
+        def record(direction: int, ch: int, seq: int, ts_ms: int, length: int, retries: int, rtt_ms: int,
+                   addr: Tuple[str, int]):
+            flow = flow_of(addr) or new_flow(addr)
+            pack_into(mm, HEADER_SIZE + next(counter) % capacity * RECORD_SIZE, clock(), ts_ms, flow[0], flow[1],
+                      seq, length, direction, ch, retries, rtt_ms)
+
+        return record
+
+    def recorder(self, addr: Tuple[str, int]):
+        # record() for a transport with a single peer: the flow is resolved once, not per packet
+        pack_into = RECORD.pack_into
+        mm = self.mm
+        capacity = self.capacity
+        counter = self.counter
+        ip, port = self.flows.get(addr) or self._flow(addr)
+        clock = time.monotonic_ns
+
+        def record(direction: int, ch: int, seq: int, ts_ms: int, length: int, retries: int, rtt_ms: int):
+            pack_into(mm, HEADER_SIZE + next(counter) % capacity * RECORD_SIZE, clock(), ts_ms, ip, port, seq, length,
+                      direction, ch, retries, rtt_ms)
+
+        return record
+
+    def _flow(self, addr: Tuple[str, int]) -> Tuple[int, int]:
+        # packed (ip, port) of a peer address, cached: resolving it per record would cost more than the record
+        try:
+            ip = struct.unpack("!I", socket.inet_aton(addr[0]))[0]
+        except OSError:
+            ip = 0
+        flow = self.flows[addr] = (ip, addr[1])
+        return flow
+
+    def flush(self):
+        # stores the number of slots used and writes the dirty pages back. Taking the count uses up a slot, which
+        # is left blank. The mapping stays usable: threads that are still running may record after the transport
+        # was closed.
+        i = next(self.counter)
+        offset = HEADER_SIZE + i % self.capacity * RECORD_SIZE
+        self.mm[offset:offset + RECORD_SIZE] = bytes(RECORD_SIZE)
+        self.written = i + 1
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, RECORD_SIZE, self.capacity, self.written)
+        self.mm.flush()
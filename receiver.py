@@ -22,7 +22,7 @@ class Receiver:
             packets = self.gamenet.recv(timeout_ms=200)
 
             for data in packets:
-                ch, seq, send_timestamp, payload, recv_timestamp, half_rtt, retries = data
+                ch, seq, send_timestamp, payload, recv_timestamp, half_rtt, retries, stream = data
 
                 if ch == CH_RELIABLE:
                     reliable_str = "reliable"
@@ -0,0 +1,209 @@
+import argparse
+import socket
+import struct
+
+import numpy as np
+
+from gamenet_codec import (
+    CH_RELIABLE, CH_UNRELIABLE, CH_ACK, CH_METRIC, CH_SNAPSHOT, CH_SNAPSHOT_ACK, CH_FRAGMENT, CH_STREAM, CH_FEC, CH_CLOCK,
+    SEQ_MOD,
+)
+from gamenet_trace import (
+    MAGIC, HEADER, HEADER_SIZE, RECORD_SIZE, DIRECTIONS,
+    TRACE_TX, TRACE_RETX, TRACE_RX, TRACE_ACKED, TRACE_DROP,
+)
+
+"""
+Offline analyzer for packet traces written by gamenet_trace.PacketTrace (GameNetAPI/GameNetServer trace_path).
+
+Loads the ring into a NumPy structured array (records in time order, slots never written skipped) and reports per
+flow (peer address):
+  - counts per direction and channel, retransmission ratio, how many reliable messages needed a retransmission and
+    the retries distribution of ACKed messages
+  - RTT series of ACKed messages: percentiles here, every sample with --rtt FILE (CSV)
+  - receive side: duplicates on the reliable channel, seq gaps (lost or overtaken) and late arrivals on the
+    unreliable channel, datagrams dropped for a bad CRC
+  - timeline: tx/retx/rx/acked per --bin-ms bin, the busiest retransmission bins here, every bin with --timeline
+    FILE (CSV)
+Everything is computed with vectorized NumPy, no per-record Python loop, so multi-million record traces take
+seconds.
+
+Usage: python trace_analyze.py TRACE [--bin-ms MS] [--flow HOST:PORT] [--rtt FILE] [--timeline FILE] [--top N]
+"""
+
+RECORD_DTYPE = np.dtype([
+    ("t_ns", "<u8"), ("ts_ms", "<u4"), ("ip", "<u4"), ("port", "<u2"), ("seq", "<u2"), ("length", "<u2"),
+    ("direction", "u1"), ("channel", "u1"), ("retries", "<u2"), ("rtt_ms", "<i4"), ("pad", "V2"),
+])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+CHANNEL_NAMES = {
+    CH_RELIABLE: "reliable", CH_UNRELIABLE: "unreliable", CH_ACK: "ack", CH_METRIC: "metric",
+    CH_SNAPSHOT: "snapshot", CH_SNAPSHOT_ACK: "snapshot_ack", CH_FRAGMENT: "fragment",
+    CH_STREAM: "stream", CH_FEC: "fec", CH_CLOCK: "clock",
+}
+PERCENTILES = (50, 90, 99, 99.9)
+
+def load(path: str) -> np.ndarray:
+    # every written record in time order (the ring may have wrapped, slot order is not time order)
+    with open(path, "rb") as f:
+        raw = f.read()
+    magic, version, record_size, capacity, used = HEADER.unpack_from(raw, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a packet trace")
+    if record_size != RECORD_SIZE:
+        raise ValueError(f"{path} has {record_size} byte records, this analyzer reads {RECORD_SIZE} byte records")
+    records = np.frombuffer(raw, RECORD_DTYPE, count=capacity, offset=HEADER_SIZE)
+    records = records[records["t_ns"] != 0]
+    return records[np.argsort(records["t_ns"], kind="stable")]
+
+def unwrap(seq: np.ndarray) -> np.ndarray:
+    # 16 bit seqs in arrival order -> int64 seqs that keep counting across wraps (steps taken mod SEQ_MOD, signed)
+    if len(seq) == 0:
+        return seq.astype(np.int64)
+    step = np.diff(seq.astype(np.int64))
+    step = (step + SEQ_MOD // 2) % SEQ_MOD - SEQ_MOD // 2
+    return seq[0] + np.concatenate(([0], np.cumsum(step)))
+
+def flow_name(ip: int, port: int) -> str:
+    return f"{socket.inet_ntoa(struct.pack('!I', ip))}:{port}"
+
+def percentiles(values: np.ndarray) -> str:
+    if len(values) == 0:
+        return "-"
+    p = np.percentile(values, PERCENTILES)
+    return "  ".join(f"p{q:g} {v:.1f}" for q, v in zip(PERCENTILES, p)) + f"  max {values.max():.1f}"
+
+def select(rec: np.ndarray, direction: int, *channels: int) -> np.ndarray:
+    mask = rec["direction"] == direction
+    if channels:
+        mask &= np.isin(rec["channel"], channels)
+    return rec[mask]
+
+def flow_stats(rec: np.ndarray) -> dict:
+    # statistics of one flow's records (time ordered)
+    reliable = (CH_RELIABLE, CH_METRIC, CH_FRAGMENT, CH_STREAM)
+    tx = select(rec, TRACE_TX, *reliable)
+    retx = select(rec, TRACE_RETX, *reliable)
+    acked = select(rec, TRACE_ACKED, *reliable)
+    rx_rel = select(rec, TRACE_RX, *reliable)
+    rx_unrel = select(rec, TRACE_RX, CH_UNRELIABLE)
+
+    stats = {"counts": {}}
+    for d, name in enumerate(DIRECTIONS):
+        by_dir = rec[rec["direction"] == d]
+        if len(by_dir):
+            chans, counts = np.unique(by_dir["channel"], return_counts=True)
+            stats["counts"][name] = {CHANNEL_NAMES.get(int(c), str(c)): int(n) for c, n in zip(chans, counts)}
+
+    stats["reliable_sent"] = len(tx)
+    stats["retransmissions"] = len(retx)
+    stats["retx_ratio"] = len(retx) / len(tx) if len(tx) else None
+    # messages retransmitted at least once: distinct seqs among the retransmissions (unwrapped over the trace)
+    stats["retransmitted_msgs"] = len(np.unique(unwrap(retx["seq"]))) if len(retx) else 0
+    stats["acked"] = len(acked)
+    stats["unacked"] = max(len(tx) - len(acked), 0)
+    stats["retries"] = np.bincount(acked["retries"]) if len(acked) else np.zeros(1, np.int64)
+    stats["rtt_ms"] = acked["rtt_ms"].astype(np.float64)
+    stats["rtt_fresh_ms"] = acked["rtt_ms"][acked["retries"] == 0].astype(np.float64)
+
+    # receive side
+    seqs = unwrap(rx_rel["seq"])
+    stats["reliable_recv"] = len(rx_rel)
+    stats["reliable_dup"] = len(seqs) - len(np.unique(seqs))
+    useqs = unwrap(rx_unrel["seq"])
+    stats["unreliable_recv"] = len(rx_unrel)
+    if len(useqs):
+        # seqs in the received range that never arrived, and arrivals behind a newer seq (dropped as stale)
+        stats["unreliable_gaps"] = int(useqs.max() - useqs.min() + 1 - len(np.unique(useqs)))
+        stats["unreliable_late"] = int(np.sum(useqs < np.maximum.accumulate(useqs)))
+    else:
+        stats["unreliable_gaps"] = stats["unreliable_late"] = 0
+    stats["crc_dropped"] = int(np.sum(rec["direction"] == TRACE_DROP))
+    return stats
+
+def timeline(rec: np.ndarray, t0: int, bin_ns: int) -> np.ndarray:
+    # (bins, directions) counts of records per time bin
+    bins = ((rec["t_ns"] - t0) // bin_ns).astype(np.int64)
+    n_bins = int(bins.max()) + 1 if len(bins) else 0
+    flat = bins * len(DIRECTIONS) + rec["direction"].astype(np.int64)
+    return np.bincount(flat, minlength=n_bins * len(DIRECTIONS)).reshape(n_bins, len(DIRECTIONS))
+
+def print_flow(name: str, stats: dict, lines: np.ndarray, bin_ms: float, top: int):
+    print(f"flow {name}")
+    for direction, counts in stats["counts"].items():
+        print(f"  {direction:<6} " + "  ".join(f"{ch} {n}" for ch, n in counts.items()))
+    ratio = "-" if stats["retx_ratio"] is None else f"{stats['retx_ratio'] * 100:.2f}%"
+    print(f"  reliable sent {stats['reliable_sent']}, retransmissions {stats['retransmissions']} ({ratio}), "
+          f"{stats['retransmitted_msgs']} messages retransmitted, ACKed {stats['acked']}, "
+          f"unACKed {stats['unacked']}")
+    retries = stats["retries"]
+    print("  retries of ACKed messages: " + "  ".join(f"{i}:{n}" for i, n in enumerate(retries) if n))
+    print(f"  RTT ms            {percentiles(stats['rtt_ms'])}")
+    print(f"  RTT ms (Karn)     {percentiles(stats['rtt_fresh_ms'])}")
+    print(f"  received reliable {stats['reliable_recv']} ({stats['reliable_dup']} duplicates), unreliable "
+          f"{stats['unreliable_recv']} ({stats['unreliable_gaps']} seq gaps, {stats['unreliable_late']} late), "
+          f"bad CRC {stats['crc_dropped']}")
+    if len(lines) and top:
+        retx = lines[:, TRACE_RETX]
+        busiest = np.argsort(retx, kind="stable")[::-1][:top]
+        busiest = busiest[retx[busiest] > 0]
+        if len(busiest):
+            print(f"  busiest retransmission bins ({bin_ms:g} ms):")
+            for b in np.sort(busiest):
+                row = lines[b]
+                print(f"    t={b * bin_ms / 1000:8.3f}s  tx {row[TRACE_TX]:>6}  retx {row[TRACE_RETX]:>6}  "
+                      f"rx {row[TRACE_RX]:>6}  acked {row[TRACE_ACKED]:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze an H-UDP packet trace")
+    parser.add_argument("trace")
+    parser.add_argument("--bin-ms", type=float, default=100.0, help="timeline bin width")
+    parser.add_argument("--flow", help="only this peer, HOST:PORT")
+    parser.add_argument("--rtt", help="write every RTT sample as CSV (t_s, flow, seq, rtt_ms, retries)")
+    parser.add_argument("--timeline", help="write the per-bin counts as CSV (t_s, flow, tx, retx, rx, acked, drop)")
+    parser.add_argument("--top", type=int, default=5, help="busiest retransmission bins to print per flow")
+    args = parser.parse_args()
+
+    rec = load(args.trace)
+    if len(rec) == 0:
+        print("empty trace")
+        return
+    t0 = int(rec["t_ns"][0])
+    bin_ns = int(args.bin_ms * 1e6)
+    span_s = (int(rec["t_ns"][-1]) - t0) / 1e9
+    print(f"{len(rec)} records over {span_s:.3f} s")
+
+    flows, inverse = np.unique(rec["ip"].astype(np.uint64) << 16 | rec["port"], return_inverse=True)
+    rtt_rows = []
+    timeline_rows = []
+    for i, key in enumerate(flows.tolist()):
+        name = flow_name(key >> 16, key & 0xFFFF)
+        if args.flow and name != args.flow:
+            continue
+        frec = rec[inverse == i]
+        lines = timeline(frec, t0, bin_ns)
+        print_flow(name, flow_stats(frec), lines, args.bin_ms, args.top)
+        if args.rtt:
+            acked = frec[frec["direction"] == TRACE_ACKED]
+            rtt_rows.append((name, acked))
+        if args.timeline:
+            timeline_rows.append((name, lines))
+
+    if args.rtt:
+        with open(args.rtt, "w") as f:
+            f.write("t_s,flow,seq,rtt_ms,retries\n")
+            for name, acked in rtt_rows:
+                columns = ((acked["t_ns"] - t0) / 1e9, acked["seq"], acked["rtt_ms"], acked["retries"])
+                np.savetxt(f, np.column_stack(columns), fmt=f"%.6f,{name},%d,%d,%d")
+    if args.timeline:
+        with open(args.timeline, "w") as f:
+            f.write("t_s,flow," + ",".join(DIRECTIONS) + "\n")
+            for name, lines in timeline_rows:
+                t = np.arange(len(lines)) * args.bin_ms / 1000
+                fmt = f"%.3f,{name}," + ",".join(["%d"] * len(DIRECTIONS))
+                np.savetxt(f, np.column_stack((t, lines)), fmt=fmt)
+
+
+if __name__ == "__main__":
+    main()
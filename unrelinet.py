@@ -1,53 +1,47 @@
-import socket
-import sys
-import random
-import threading
-import time
-from typing import Tuple
+import argparse
 
+from gamenet_netem import Link, UdpProxy
 
-def forward_packet(data: bytes, s: socket.socket, client_address: Tuple[str, int], server_port: int, p_loss: float):
+"""
+Unreliable network between sender and receiver: a UDP proxy that forwards datagrams from LISTEN-PORT to
+SERVER-PORT and the replies back, applying loss (both ways), 0-40ms of random delay per direction and,
+optionally, corruption, duplication, reordering and a bandwidth cap. Single threaded; see gamenet_netem.py.
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description="Unreliable UDP proxy")
+    parser.add_argument("p_loss", type=float, help="loss probability per datagram and direction")
+    parser.add_argument("listen_port", type=int)
+    parser.add_argument("server_port", type=int)
+    parser.add_argument("--corrupt", type=float, default=0.0, help="probability of flipping one bit")
+    parser.add_argument("--duplicate", type=float, default=0.0, help="probability of sending a datagram twice")
+    parser.add_argument("--reorder", type=float, default=0.0, help="probability of holding a datagram back")
+    parser.add_argument("--reorder-ms", type=float, default=20.0)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="fixed one-way delay")
+    parser.add_argument("--jitter-ms", type=float, default=40.0, help="random extra delay, uniform in [0, jitter)")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0.0, help="bottleneck rate, 0 for unlimited")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    def link(seed):
+        return Link(
+            loss=args.p_loss, delay_ms=args.delay_ms, jitter_ms=args.jitter_ms, reorder=args.reorder,
+            reorder_ms=args.reorder_ms, duplicate=args.duplicate, corrupt=args.corrupt,
+            bandwidth_bps=args.bandwidth_kbps * 1000, seed=seed,
+        )
+
+    proxy = UdpProxy(
+        ("127.0.0.1", args.listen_port), ("127.0.0.1", args.server_port),
+        link(args.seed), link(None if args.seed is None else args.seed + 1),
+    )
     try:
-        server_addr = ("127.0.0.1", server_port)
-        time.sleep(random.randrange(0, 40)/1000)  # at most 40ms of delay
-        ss = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        ss.sendto(data, server_addr)
-        ss.settimeout(0.05)
-        data, addr = ss.recvfrom(65536)
-        if random.random() < p_loss:
-            return
-        time.sleep(random.randrange(0, 40)/1000)  # at most 40ms of delay
-        s.sendto(data, client_address)
-    except TimeoutError:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
         pass
     finally:
-        ss.close()
-
-def help():
-    print("Usage: python unrelinet.py <P-LOSS> <LISTEN-PORT> <SERVER-PORT>")
-
-
-def start_server(p_loss, listen_port, server_port):
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.bind(("127.0.0.1", listen_port))
-
-    while True:
-        data, address = s.recvfrom(65536)
-        if random.random() < p_loss:
-            continue
-        handler_thread = threading.Thread(target=forward_packet, args=(data, s, address, server_port, p_loss))
-        handler_thread.start()
-
-
-def main():
-    args = sys.argv
-    if len(args) < 4:
-        help()
-        exit(0)
-    p_loss = float(args[1])
-    listen_port = int(args[2])
-    server_port = int(args[3])
-    start_server(p_loss, listen_port, server_port)
+        proxy.close()
+        print(f"forward {proxy.forward.stats()}")
+        print(f"backward {proxy.backward.stats()}")
 
 
 if __name__ == "__main__":